@@ -0,0 +1,368 @@
+"""
+Неблокирующая очередь отправки алертов в Telegram
+Скан только кладёт алерт в очередь, отправкой занимается фоновый поток:
+приоритет по величине спреда, лимиты Bot API, повторы с учётом retry_after
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from event_log import events
+from telegram_notifier import TelegramNotifier
+import metrics
+import config
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """Сколько секунд ждать до появления токена (0 - можно отправлять)"""
+        now = self.clock()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill(self.clock())
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """Сервер ответил 429 - не отправлять до истечения retry_after"""
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+        self.tokens = 0
+
+
+class AlertDispatcher:
+    def __init__(self, notifier: TelegramNotifier, max_queue: Optional[int] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.notifier = notifier
+        self.max_queue = max_queue or config.ALERT_QUEUE_SIZE
+        self.clock = clock
+
+        # Алерт - (-|спред|, seq, not_before, attempts, enqueued_at, payload, alert_data, method, on_done)
+        # Куча на каждый чат: сначала самые большие спреды; чат без токенов или на паузе 429 не держит остальные
+        self._chats: Dict[str, List[tuple]] = {}
+        self._delayed: List[Tuple[float, int, tuple]] = []  # (not_before, seq, алерт) - повторы ждут своего времени
+        self._size = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.is_running = False
+        # В asyncio-режиме enqueue будит задачу отправки через событие цикла
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+        self.global_bucket = TokenBucket(config.TELEGRAM_GLOBAL_RATE, config.TELEGRAM_GLOBAL_RATE, clock)
+        self.chat_buckets: Dict[str, TokenBucket] = {}
+
+        # Метрики
+        self.enqueued = 0
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self.retries = 0
+        self.send_latency = deque(maxlen=1000)  # Время HTTP-запроса, сек
+        self.delivery_latency = deque(maxlen=1000)  # От постановки в очередь до доставки, сек
+
+    @property
+    def queue_depth(self) -> int:
+        return self._size
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        key = str(chat_id)
+        bucket = self.chat_buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(config.TELEGRAM_CHAT_RATE, config.TELEGRAM_CHAT_BURST, self.clock)
+            self.chat_buckets[key] = bucket
+        return bucket
+
+    def enqueue(self, alert_data: Dict, payload: Optional[Dict] = None, method: str = 'sendMessage',
+                on_done: Optional[Callable[[Optional[Dict]], None]] = None) -> bool:
+        """
+        Поставить алерт в очередь, не дожидаясь отправки. False - алерт выброшен
+        method - метод Bot API (sendMessage, editMessageText)
+        on_done - вызывается из потока отправки с result ответа (None - не доставлен)
+        """
+        if payload is None:
+            payload = self.notifier.build_payload(alert_data)
+        item = (-abs(alert_data['spread_percent']), next(self._seq), 0.0, 0, self.clock(), payload, alert_data,
+                method, on_done)
+
+        evicted = None
+        with self._cond:
+            if self._size >= self.max_queue:
+                # Очередь полна: выбрасываем наименьший спред (новый или уже стоящий в очереди)
+                self.dropped += 1
+                weakest = self._evict_weakest(item)
+                evicted = item if weakest is None else weakest
+
+            if evicted is not item:
+                self._push(item)
+                self.enqueued += 1
+                self._cond.notify()
+        if evicted is not None:
+            self._done(evicted, None)
+        if evicted is item:
+            return False
+        self._notify_async()
+        return True
+
+    def _push(self, item: tuple):
+        """Положить алерт в кучу его чата (вызывать под self._cond)"""
+        heapq.heappush(self._chats.setdefault(str(item[5]['chat_id']), []), item)
+        self._size += 1
+        metrics.ALERT_QUEUE_DEPTH.set(self._size)
+
+    def _evict_weakest(self, item: tuple) -> Optional[tuple]:
+        """
+        Убрать из очереди алерт с наименьшим спредом, если он слабее item (вызывать под self._cond)
+        Возвращает убранный алерт; None - слабее всех сам item
+        """
+        heaps = list(self._chats.values()) + [self._delayed]
+        weakest = None
+        for heap in heaps:
+            for pos, entry in enumerate(heap):
+                queued = entry[2] if heap is self._delayed else entry
+                if weakest is None or queued[:2] > weakest[2][:2]:
+                    weakest = (heap, pos, queued)
+        if weakest is None or item[:2] >= weakest[2][:2]:
+            return None
+        heap, pos, queued = weakest
+        heap[pos] = heap[-1]
+        heap.pop()
+        heapq.heapify(heap)
+        if not heap and heap is not self._delayed:
+            del self._chats[str(queued[5]['chat_id'])]
+        self._size -= 1
+        return queued
+
+    @staticmethod
+    def _done(item: tuple, result: Optional[Dict]):
+        on_done = item[8]
+        if on_done is not None:
+            on_done(result)
+
+    def _notify_async(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _poll(self) -> Tuple[Optional[tuple], Optional[float]]:
+        """
+        Достать готовый к отправке алерт без ожидания (вызывать под self._cond)
+        Возвращает (алерт, None) или (None, сколько ждать; None - очередь пуста)
+        """
+        now = self.clock()
+        delayed = self._delayed
+        while delayed and delayed[0][0] <= now:
+            # Время повтора пришло - алерт возвращается в кучу своего чата
+            heapq.heappush(self._chats.setdefault(str(delayed[0][2][5]['chat_id']), []), heapq.heappop(delayed)[2])
+        if not self._size:
+            return None, None
+
+        # Из чатов с доступным токеном - алерт с наибольшим спредом
+        best, wait = None, delayed[0][0] - now if delayed else None
+        for chat_id, heap in self._chats.items():
+            chat_wait = self._chat_bucket(chat_id).wait_time()
+            if chat_wait > 0:
+                wait = chat_wait if wait is None else min(wait, chat_wait)
+            elif best is None or heap[0][:2] < self._chats[best][0][:2]:
+                best = chat_id
+        if best is None:
+            return None, wait
+        global_wait = self.global_bucket.wait_time()
+        if global_wait > 0:
+            return None, global_wait
+
+        heap = self._chats[best]
+        item = heapq.heappop(heap)
+        if not heap:
+            del self._chats[best]
+        self._size -= 1
+        metrics.ALERT_QUEUE_DEPTH.set(self._size)
+        self.global_bucket.consume()
+        self._chat_bucket(best).consume()
+        return item, None
+
+    def _next_item(self) -> Optional[tuple]:
+        """Достать следующий готовый к отправке алерт (ждёт лимитов и retry_after)"""
+        with self._cond:
+            while self.is_running:
+                item, wait = self._poll()
+                if item is not None:
+                    return item
+                self._cond.wait(wait)
+        return None
+
+    def _retry(self, item: tuple, delay: float):
+        priority, seq, _, attempts, enqueued_at, payload, alert_data, method, on_done = item
+        if attempts + 1 >= config.TELEGRAM_MAX_RETRIES:
+            self.failed += 1
+            events.emit('alert_gave_up', symbol=alert_data['symbol'], chat_id=payload['chat_id'], attempts=attempts + 1)
+            self._done(item, None)
+            return
+        self.retries += 1
+        not_before = self.clock() + delay
+        with self._cond:
+            heapq.heappush(self._delayed, (not_before, seq, (priority, seq, not_before, attempts + 1, enqueued_at,
+                                                             payload, alert_data, method, on_done)))
+            self._size += 1
+            metrics.ALERT_QUEUE_DEPTH.set(self._size)
+            self._cond.notify()
+        self._notify_async()
+
+    def send_item(self, item: tuple):
+        """Отправить один алерт; при 429/5xx/сетевой ошибке - вернуть в очередь"""
+        _, _, _, attempts, enqueued_at, payload, alert_data, method, _ = item
+        started = self.clock()
+        try:
+            response = self.notifier.post(payload, method)
+        except requests.exceptions.RequestException as e:
+            events.emit('alert_retry', symbol=alert_data['symbol'], chat_id=payload['chat_id'], status=None, error=str(e))
+            self._retry(item, 2 ** attempts)
+            return
+        finally:
+            self.send_latency.append(self.clock() - started)
+
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.json().get('parameters', {}).get('retry_after', 1))
+            except ValueError:
+                retry_after = 1.0
+            events.emit('alert_throttled', symbol=alert_data['symbol'], chat_id=payload['chat_id'], retry_after=retry_after)
+            self._chat_bucket(payload['chat_id']).pause(retry_after)
+            self._retry(item, retry_after)
+            return
+
+        if response.status_code >= 500:
+            events.emit('alert_retry', symbol=alert_data['symbol'], chat_id=payload['chat_id'],
+                        status=response.status_code, error=None)
+            self._retry(item, 2 ** attempts)
+            return
+
+        if response.status_code != 200:
+            self.failed += 1
+            events.emit('alert_rejected', symbol=alert_data['symbol'], chat_id=payload['chat_id'],
+                        status=response.status_code, detail=response.text)
+            self._done(item, None)
+            return
+
+        self.sent += 1
+        self.delivery_latency.append(self.clock() - enqueued_at)
+        if 'exchange_ts' in alert_data:
+            metrics.TICK_TO_ALERT_SECONDS.observe(time.time() - alert_data['exchange_ts'] / 1000)
+        events.emit('alert_sent', symbol=alert_data['symbol'], chat_id=payload['chat_id'], method=method,
+                    attempts=attempts + 1, latency=self.delivery_latency[-1])
+        if item[8] is not None:
+            try:
+                result = response.json().get('result')
+            except ValueError:
+                result = None
+            self._done(item, result if isinstance(result, dict) else {})
+
+    def _worker(self):
+        while self.is_running:
+            item = self._next_item()
+            if item is None:
+                break
+            try:
+                self.send_item(item)
+            except Exception as e:
+                self.failed += 1
+                events.emit('alert_error', error=repr(e))
+                self._done(item, None)
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._worker, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+
+    async def run_async(self):
+        """
+        Отправка как задача asyncio (вместо фонового потока)
+        HTTP-запрос уходит в пул потоков, цикл событий не блокируется
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.is_running = True
+        try:
+            while self.is_running:
+                self._wakeup.clear()
+                with self._cond:
+                    item, wait = self._poll()
+                if item is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                try:
+                    await asyncio.to_thread(self.send_item, item)
+                except Exception as e:
+                    self.failed += 1
+                    events.emit('alert_error', error=repr(e))
+                    self._done(item, None)
+        finally:
+            self.is_running = False
+            self._loop = None
+
+    async def drain(self, timeout: float = 5.0):
+        """Дать задаче отправки дослать очередь перед остановкой"""
+        deadline = time.monotonic() + timeout
+        while self._size and self.is_running and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    def stop(self, timeout: float = 5.0):
+        """Остановить поток; даём до timeout секунд дослать очередь"""
+        deadline = time.monotonic() + timeout
+        while self._size and time.monotonic() < deadline:
+            time.sleep(0.05)
+        with self._cond:
+            self.is_running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    @staticmethod
+    def _percentile(samples, q: float) -> float:
+        if not samples:
+            return 0.0
+        ordered = sorted(samples.copy())  # copy() атомарен - поток отправки может дописывать
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def metrics(self) -> Dict:
+        """Снимок метрик очереди (задержки в миллисекундах)"""
+        return {
+            'queue_depth': self.queue_depth,
+            'enqueued': self.enqueued,
+            'sent': self.sent,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'retries': self.retries,
+            'send_p50_ms': self._percentile(self.send_latency, 0.5) * 1000,
+            'send_p95_ms': self._percentile(self.send_latency, 0.95) * 1000,
+            'delivery_p95_ms': self._percentile(self.delivery_latency, 0.95) * 1000,
+        }
@@ -0,0 +1,160 @@
+"""
+Жизненный цикл алертов в Telegram: одно сообщение на событие вместо серии почти одинаковых
+Алерты одного скана для подписчика уходят одним сообщением (дайджест), повторные алерты
+по паре с открытым сообщением правят его через editMessageText (не чаще ALERT_EDIT_INTERVAL),
+а когда спред возвращается, сообщение закрывается финальной правкой "спред вернулся"
+"""
+import threading
+import time
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+
+
+class AlertMessage:
+    """Отправленное (или ждущее отправки) сообщение с алертами одной подписки"""
+
+    __slots__ = ('key', 'chat_id', 'topic_id', 'min_spread', 'alerts', 'resolved', 'message_id',
+                 'created_at', 'edited_at', 'dirty', 'in_flight', 'closed')
+
+    def __init__(self, subscription, alerts: List[Dict], now: float):
+        self.key = subscription.key
+        self.chat_id = subscription.chat_id
+        self.topic_id = subscription.topic_id
+        self.min_spread = subscription.min_spread
+        self.alerts: Dict[str, Dict] = {a['symbol']: a for a in alerts}  # Последний алерт по каждой паре
+        self.resolved: Dict[str, float] = {}  # Пары, чей спред вернулся -> спред на момент закрытия
+        self.message_id: Optional[int] = None  # Известен после ответа на sendMessage
+        self.created_at = now
+        self.edited_at = now
+        self.dirty = False  # Есть изменения, ещё не отправленные правкой
+        self.in_flight = True  # sendMessage/editMessageText в очереди отправки
+        self.closed = False
+
+    def leading(self) -> Dict:
+        """Алерт с наибольшим |спредом| - по нему приоритет в очереди отправки"""
+        return max(self.alerts.values(), key=lambda a: abs(a['spread_percent']))
+
+
+class AlertLifecycle:
+    def __init__(self, notifier, dispatcher, edit_interval: Optional[float] = None,
+                 resolve_ratio: Optional[float] = None, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        edit_interval - не чаще одной правки сообщения за столько секунд (обновления копятся)
+        resolve_ratio - пара закрыта, когда |спред| < порог подписки * resolve_ratio
+        ttl - сообщение старше этого больше не правится, следующий алерт уйдёт новым
+        """
+        self.notifier = notifier
+        self.dispatcher = dispatcher
+        self.edit_interval = config.ALERT_EDIT_INTERVAL if edit_interval is None else edit_interval
+        self.resolve_ratio = config.ALERT_RESOLVE_RATIO if resolve_ratio is None else resolve_ratio
+        self.ttl = config.ALERT_MESSAGE_TTL if ttl is None else ttl
+        self.clock = clock
+
+        self._open: Dict[Tuple[str, str], AlertMessage] = {}  # (ключ подписки, symbol) -> сообщение
+        self._messages: List[AlertMessage] = []
+        # Ответы Bot API приходят из потока отправки
+        self._lock = threading.Lock()
+
+        self.messages_sent = 0  # sendMessage
+        self.edits_sent = 0  # editMessageText
+        self.coalesced = 0  # Алертов, ушедших правкой существующего сообщения
+        self.resolved = 0
+
+    def publish(self, subscription, alerts: List[Dict]):
+        """Алерты одного скана для подписки: новые пары - одним сообщением, открытые - правкой"""
+        now = self.clock()
+        fresh = []
+        with self._lock:
+            for alert_data in alerts:
+                message = self._open.get((subscription.key, alert_data['symbol']))
+                if message is None or alert_data['symbol'] in message.resolved:
+                    fresh.append(alert_data)
+                    continue
+                message.alerts[alert_data['symbol']] = alert_data
+                message.dirty = True
+                self.coalesced += 1
+
+            if not fresh:
+                return
+            message = AlertMessage(subscription, fresh, now)
+            for alert_data in fresh:
+                self._open[(message.key, alert_data['symbol'])] = message
+            self._messages.append(message)
+            self.messages_sent += 1
+
+        payload = self.notifier.build_payload(message.leading(), message.chat_id, message.topic_id,
+                                              self.notifier.format_digest(fresh))
+        self.dispatcher.enqueue(message.leading(), payload, on_done=partial(self._delivered, message))
+
+    def tick(self, spread_of: Callable[[str], Optional[float]]):
+        """
+        Каждый скан: отметить пары, чей спред вернулся, и отправить накопленные правки
+        spread_of - текущий спред пары (None - пары больше нет)
+        """
+        now = self.clock()
+        edits = []
+        with self._lock:
+            for message in list(self._messages):
+                for symbol in message.alerts:
+                    if symbol in message.resolved:
+                        continue
+                    spread = spread_of(symbol)
+                    if spread is None or abs(spread) < message.min_spread * self.resolve_ratio:
+                        message.resolved[symbol] = spread or 0.0
+                        message.dirty = True
+                        self.resolved += 1
+
+                if message.in_flight or message.message_id is None:
+                    continue
+                if now - message.created_at >= self.ttl or (
+                        not message.dirty and len(message.resolved) == len(message.alerts)):
+                    # Всё закрыто финальной правкой (или сообщение устарело) - следующий алерт уйдёт новым
+                    self._close(message)
+                elif message.dirty and now - message.edited_at >= self.edit_interval:
+                    message.dirty = False
+                    message.in_flight = True
+                    edits.append(message)
+
+        for message in edits:
+            self.edits_sent += 1
+            payload = {
+                'chat_id': message.chat_id,
+                'message_id': message.message_id,
+                'text': self.notifier.format_digest(list(message.alerts.values()), message.resolved),
+                'parse_mode': 'HTML'
+            }
+            self.dispatcher.enqueue(message.leading(), payload, method='editMessageText',
+                                    on_done=partial(self._delivered, message))
+
+    def _delivered(self, message: AlertMessage, result: Optional[Dict]):
+        """Ответ Bot API (из потока отправки). None - сообщение не доставлено: больше его не правим"""
+        with self._lock:
+            message.in_flight = False
+            message.edited_at = self.clock()
+            if result is None:
+                self._close(message)
+            elif message.message_id is None:
+                message.message_id = result.get('message_id')
+                if message.message_id is None:
+                    self._close(message)
+
+    def _close(self, message: AlertMessage):
+        if message.closed:
+            return
+        message.closed = True
+        self._messages.remove(message)
+        for symbol in message.alerts:
+            if self._open.get((message.key, symbol)) is message:
+                del self._open[(message.key, symbol)]
+
+    def stats(self) -> Dict:
+        return {
+            'open': len(self._messages),
+            'messages': self.messages_sent,
+            'edits': self.edits_sent,
+            'coalesced': self.coalesced,
+            'resolved': self.resolved,
+        }
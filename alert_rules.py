@@ -0,0 +1,490 @@
+"""
+Правила алертов по любым полям тикера: "last vs index > 3% and amount > 1m"
+Правила из ALERT_RULES_PATH разбираются один раз и компилируются в одну функцию над колонками
+снимка: общие подвыражения всех правил считаются по разу, каждое правило - несколько операций
+numpy над всеми парами сразу. Файл перечитывается на ходу, когда меняется (без остановки скана)
+
+Язык:
+    поля        last fair index bid ask funding change volume amount hold high low spread
+                (или имена MEXC: lastPrice, indexPrice, volume24, ...)
+    биржи       binance bybit okx (price_sources.VENUE_SOURCES) - last той же пары на другой бирже (VENUES)
+    a vs b      отклонение a от b в процентах: (a - b) / b * 100
+    числа       3%  (проценты - те же единицы, что у vs, funding и change), 1.5k 2m 1b
+    операции    + - * /  > >= < <= == !=  and or not  abs() min() max()
+"""
+import json
+import math
+import os
+import re
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from alert_state import AlertStateStore
+from event_log import events
+from price_sources import VENUE_SOURCES
+import config
+
+# Псевдоним -> (поле тикера MEXC, множитель): ставки funding/change переводятся в проценты
+FIELDS: Dict[str, Tuple[str, float]] = {
+    'last': ('lastPrice', 1.0),
+    'fair': ('fairPrice', 1.0),
+    'index': ('indexPrice', 1.0),
+    'bid': ('bid1', 1.0),
+    'ask': ('ask1', 1.0),
+    'funding': ('fundingRate', 100.0),
+    'change': ('riseFallRate', 100.0),
+    'volume': ('volume24', 1.0),  # Объём за 24 ч в контрактах
+    'amount': ('amount24', 1.0),  # Оборот за 24 ч в USDT
+    'hold': ('holdVol', 1.0),
+    'high': ('high24Price', 1.0),
+    'low': ('lower24Price', 1.0),
+}
+FIELDS.update({mexc: (mexc, 1.0) for mexc, _ in list(FIELDS.values())})
+# Цена пары на других биржах (price_sources.py): колонка - имя биржи, а не поле тикера MEXC
+VENUE_FIELDS = frozenset(VENUE_SOURCES)
+FIELDS.update({venue: (venue, 1.0) for venue in VENUE_FIELDS})
+
+_SUFFIXES = {'%': 1.0, 'k': 1e3, 'm': 1e6, 'b': 1e9}
+_FUNCTIONS = {'abs': 1, 'min': 2, 'max': 2}
+_COMPARE = ('>=', '<=', '==', '!=', '>', '<')
+_TOKEN_RE = re.compile(r"""
+    (?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)(?P<suffix>[%kKmMbB](?![A-Za-z0-9_]))?
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op>>=|<=|==|!=|[-+*/()<>,])
+    )""", re.VERBOSE)
+
+
+class RuleError(ValueError):
+    """Ошибка в тексте правила (с позицией) или в файле правил"""
+
+
+def _tokenize(text: str) -> List[Tuple[str, object, int]]:
+    """Токены (вид, значение, позиция); вид - number, name или op"""
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        if text[pos].isspace():
+            pos += 1
+            continue
+        match = _TOKEN_RE.match(text, pos)
+        if match is None:
+            raise RuleError(f"непонятный символ в позиции {pos + 1}: {text[pos:pos + 10]!r}")
+        start = pos
+        if match.group('number') is not None:
+            suffix = (match.group('suffix') or '%').lower()
+            tokens.append(('number', float(match.group('number')) * _SUFFIXES[suffix], start))
+        elif match.group('name') is not None:
+            tokens.append(('name', match.group('name'), start))
+        else:
+            tokens.append(('op', match.group('op'), start))
+        pos = match.end()
+    tokens.append(('end', None, len(text)))
+    return tokens
+
+
+class _Parser:
+    """
+    Рекурсивный спуск; узел - кортеж, одинаковые подвыражения дают равные кортежи (для CSE)
+    Приоритет: or < and < not < сравнение < vs < + - < * / < унарный минус
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = _tokenize(text)
+        self.pos = 0
+        self.fields = set()  # Поля MEXC, на которые ссылается правило
+
+    def peek(self, kind: str, value=None) -> bool:
+        token = self.tokens[self.pos]
+        if token[0] != kind:
+            return False
+        if value is None:
+            return True
+        if kind == 'name':
+            return token[1].lower() == value
+        return token[1] == value
+
+    def take(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, value: str):
+        if not self.peek('op', value):
+            self.fail(f"ожидалось '{value}'")
+        self.take()
+
+    def fail(self, message: str):
+        position = self.tokens[self.pos][2]
+        raise RuleError(f"{message} в позиции {position + 1}: {self.text!r}")
+
+    def parse(self):
+        node, kind = self.parse_or()
+        if not self.peek('end'):
+            self.fail("лишний текст")
+        if kind != 'bool':
+            raise RuleError(f"правило должно быть условием (сравнение, and/or): {self.text!r}")
+        return node
+
+    def logical(self, node, kind):
+        if kind != 'bool':
+            self.fail("and/or/not применяются к условиям")
+        return node
+
+    def parse_or(self):
+        node, kind = self.parse_and()
+        while self.peek('name', 'or'):
+            self.take()
+            left = self.logical(node, kind)
+            right, right_kind = self.parse_and()
+            node, kind = ('or', left, self.logical(right, right_kind)), 'bool'
+        return node, kind
+
+    def parse_and(self):
+        node, kind = self.parse_not()
+        while self.peek('name', 'and'):
+            self.take()
+            left = self.logical(node, kind)
+            right, right_kind = self.parse_not()
+            node, kind = ('and', left, self.logical(right, right_kind)), 'bool'
+        return node, kind
+
+    def parse_not(self):
+        if self.peek('name', 'not'):
+            self.take()
+            node, kind = self.parse_not()
+            return ('not', self.logical(node, kind)), 'bool'
+        return self.parse_compare()
+
+    def numeric(self, node, kind):
+        if kind != 'num':
+            self.fail("ожидалось число или поле")
+        return node
+
+    def parse_compare(self):
+        node, kind = self.parse_vs()
+        for op in _COMPARE:
+            if self.peek('op', op):
+                self.take()
+                left = self.numeric(node, kind)
+                right, right_kind = self.parse_vs()
+                return ('cmp', op, left, self.numeric(right, right_kind)), 'bool'
+        return node, kind
+
+    def parse_vs(self):
+        node, kind = self.parse_sum()
+        if self.peek('name', 'vs'):
+            self.take()
+            left = self.numeric(node, kind)
+            right, right_kind = self.parse_sum()
+            return ('vs', left, self.numeric(right, right_kind)), 'num'
+        return node, kind
+
+    def parse_sum(self):
+        node, kind = self.parse_product()
+        while self.peek('op', '+') or self.peek('op', '-'):
+            op = self.take()[1]
+            left = self.numeric(node, kind)
+            right, right_kind = self.parse_product()
+            node, kind = ('bin', op, left, self.numeric(right, right_kind)), 'num'
+        return node, kind
+
+    def parse_product(self):
+        node, kind = self.parse_unary()
+        while self.peek('op', '*') or self.peek('op', '/'):
+            op = self.take()[1]
+            left = self.numeric(node, kind)
+            right, right_kind = self.parse_unary()
+            node, kind = ('bin', op, left, self.numeric(right, right_kind)), 'num'
+        return node, kind
+
+    def parse_unary(self):
+        if self.peek('op', '-'):
+            self.take()
+            node, kind = self.parse_unary()
+            node = self.numeric(node, kind)
+            return (('num', -node[1]) if node[0] == 'num' else ('neg', node)), 'num'
+        return self.parse_atom()
+
+    def parse_atom(self):
+        kind, value, _ = self.tokens[self.pos]
+        if kind == 'number':
+            if not math.isfinite(value):
+                # 1e999 -> inf: в исходнике evaluate стал бы неизвестным именем
+                self.fail("число вне диапазона float")
+            self.take()
+            return ('num', value), 'num'
+        if self.peek('op', '('):
+            self.take()
+            node, node_kind = self.parse_or()
+            self.expect(')')
+            return node, node_kind
+        if kind != 'name':
+            self.fail("ожидалось число, поле или '('")
+
+        self.take()
+        name = value.lower()
+        if name in _FUNCTIONS and self.peek('op', '('):
+            self.take()
+            args = []
+            while True:
+                node, node_kind = self.parse_vs()
+                args.append(self.numeric(node, node_kind))
+                if not self.peek('op', ','):
+                    break
+                self.take()
+            self.expect(')')
+            if len(args) != _FUNCTIONS[name]:
+                self.fail(f"{name}() принимает {_FUNCTIONS[name]} аргумент(а)")
+            return ('call', name, *args), 'num'
+        if name == 'spread':
+            self.fields.update(('lastPrice', 'fairPrice'))
+            return ('vs', ('col', 'lastPrice', 1.0), ('col', 'fairPrice', 1.0)), 'num'
+        field = FIELDS.get(value) or FIELDS.get(name)
+        if field is None:
+            self.pos -= 1
+            self.fail(f"неизвестное поле '{value}'")
+        self.fields.add(field[0])
+        return ('col',) + field, 'num'
+
+
+def parse_rule(text: str) -> Tuple[tuple, frozenset]:
+    """Разобрать условие: (дерево, поля MEXC). RuleError - ошибка в тексте"""
+    parser = _Parser(text)
+    return parser.parse(), frozenset(parser.fields)
+
+
+class AlertRule:
+    __slots__ = ('name', 'when', 'cooldown', 'tree', 'fields')
+
+    def __init__(self, name: str, when: str, cooldown: Optional[float] = None):
+        """
+        name - имя правила в алерте и журнале
+        when - условие на языке правил
+        cooldown - пауза между алертами правила по одной паре (по умолчанию ALERT_COOLDOWN)
+        """
+        self.name = str(name)
+        self.when = str(when)
+        self.cooldown = config.ALERT_COOLDOWN if cooldown is None else float(cooldown)
+        self.tree, self.fields = parse_rule(self.when)
+
+
+_OPERATORS = {'+': '+', '-': '-', '*': '*', '/': '/', 'and': '&', 'or': '|'}
+
+
+class RuleSet:
+    """Набор правил, скомпилированный в одну функцию: колонки снимка -> маски правил"""
+
+    def __init__(self, rules: Sequence[AlertRule]):
+        names = [rule.name for rule in rules]
+        duplicates = {name for name in names if names.count(name) > 1}
+        if duplicates:
+            raise RuleError(f"повторяются имена правил: {', '.join(sorted(duplicates))}")
+        self.rules = list(rules)
+        self.fields = frozenset().union(*(rule.fields for rule in self.rules))
+        self.source, self._evaluate = self._compile()
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _compile(self):
+        """
+        Исходник функции evaluate(c): по строке на узел, одинаковые узлы всех правил - одна
+        переменная. Текст собирается только из разобранного дерева (имена полей и числа)
+        """
+        lines = []
+        names: Dict[tuple, str] = {}
+
+        def emit(node) -> str:
+            name = names.get(node)
+            if name is not None:
+                return name
+            kind = node[0]
+            if kind == 'num':
+                return repr(node[1])
+            if kind == 'col':
+                expr = f"c[{node[1]!r}]" if node[2] == 1.0 else f"c[{node[1]!r}] * {node[2]!r}"
+            elif kind == 'vs':
+                left, right = emit(node[1]), emit(node[2])
+                expr = f"({left} - {right}) / {right} * 100.0"
+            elif kind == 'bin':
+                expr = f"{emit(node[2])} {_OPERATORS[node[1]]} {emit(node[3])}"
+            elif kind == 'cmp':
+                expr = f"{emit(node[2])} {node[1]} {emit(node[3])}"
+                if node[2][0] == 'num' and node[3][0] == 'num':
+                    expr = f"np.bool_({expr})"  # Условие без полей: ~ и & должны работать как с маской
+            elif kind in ('and', 'or'):
+                expr = f"{emit(node[1])} {_OPERATORS[kind]} {emit(node[2])}"
+            elif kind == 'not':
+                expr = f"~{emit(node[1])}"
+            elif kind == 'neg':
+                expr = f"-{emit(node[1])}"
+            else:
+                function = {'abs': 'np.abs', 'min': 'np.minimum', 'max': 'np.maximum'}[node[1]]
+                expr = f"{function}({', '.join(emit(arg) for arg in node[2:])})"
+            name = names[node] = f"t{len(names)}"
+            lines.append(f"    {name} = {expr}")
+            return name
+
+        results = [emit(rule.tree) for rule in self.rules]
+        source = "def evaluate(c):\n" + "\n".join(lines) + f"\n    return ({''.join(r + ', ' for r in results)})\n"
+        namespace = {'np': np}
+        exec(compile(source, '<alert_rules>', 'exec'), namespace)
+        return source, namespace['evaluate']
+
+    def evaluate(self, columns: Dict[str, np.ndarray], size: int) -> List[np.ndarray]:
+        """Маски всех правил за один вызов; NaN (поля нет) в сравнениях даёт False"""
+        with np.errstate(all='ignore'):
+            masks = self._evaluate(columns)
+        return [np.broadcast_to(mask, size) for mask in masks]
+
+
+def load_rules(path: str) -> List[AlertRule]:
+    """
+    Прочитать файл правил: [{"name": ..., "when": ..., "cooldown": ...}, ...]
+    RuleError - ошибка в файле (набор правил целиком не применяется)
+    """
+    with open(path, encoding='utf-8') as f:
+        try:
+            rows = json.load(f)
+        except json.JSONDecodeError as e:
+            raise RuleError(f"{path}: {e}") from None
+    rules = []
+    for number, row in enumerate(rows, 1):
+        try:
+            rules.append(AlertRule(**row))
+        except (TypeError, RuleError) as e:
+            raise RuleError(f"{path}, правило {number} ({row.get('name', '?') if isinstance(row, dict) else row}): {e}") from None
+    return rules
+
+
+class RuleEngine:
+    def __init__(self, path: Optional[str] = None, check_interval: Optional[float] = None,
+                 max_per_scan: Optional[int] = None, builtin: Sequence[AlertRule] = ()):
+        """
+        path - файл правил (JSON), перечитывается при изменении
+        builtin - правила из настроек (межбиржевой спред), действуют вместе с правилами файла
+        check_interval - как часто проверять время изменения файла (сек)
+        max_per_scan - больше алертов одного правила за скан не уходит (остальные - в следующих сканах)
+        """
+        self.path = config.ALERT_RULES_PATH if path is None else path
+        self.check_interval = config.ALERT_RULES_CHECK_INTERVAL if check_interval is None else check_interval
+        self.max_per_scan = config.ALERT_RULES_MAX_PER_SCAN if max_per_scan is None else max_per_scan
+
+        self.builtin = list(builtin)
+        self._state: Dict[str, AlertStateStore] = {}  # Имя правила -> cooldown по индексам SymbolTable
+        self.use([])
+        self._mtime: Optional[int] = None
+        self._checked_at = -np.inf
+        self.reloads = 0
+        self.errors = 0
+
+    @property
+    def fields(self) -> frozenset:
+        """Поля тикера, нужные правилам (кроме last/fair и бирж) - их извлекает декодер"""
+        return self.ruleset.fields - {'lastPrice', 'fairPrice'} - VENUE_FIELDS
+
+    @property
+    def venues(self) -> frozenset:
+        """Биржи, с которыми сравнивают правила"""
+        return self.ruleset.fields & VENUE_FIELDS
+
+    def use(self, rules: Sequence[AlertRule]):
+        """Применить правила файла (вместе со встроенными); cooldown правил с тем же именем сохраняется"""
+        ruleset = RuleSet(self.builtin + list(rules))
+        state = {}
+        for rule in ruleset.rules:
+            store = self._state.get(rule.name)
+            if store is None:
+                store = AlertStateStore(cooldown=rule.cooldown)
+            store.cooldown = rule.cooldown
+            state[rule.name] = store
+        self.ruleset = ruleset
+        self._state = state
+
+    def maybe_reload(self, now: Optional[float] = None) -> bool:
+        """
+        Перечитать файл, если он изменился (не чаще check_interval). True - набор правил сменился
+        Ошибка в файле не останавливает скан: остаются прежние правила
+        """
+        if not self.path:
+            return False
+        now = time.monotonic() if now is None else now
+        if now - self._checked_at < self.check_interval:
+            return False
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        if mtime is None:
+            if len(self.ruleset) == len(self.builtin):
+                return False
+            self.use([])
+        else:
+            try:
+                self.use(load_rules(self.path))
+            except (OSError, RuleError) as e:
+                self.errors += 1
+                events.emit('rules_error', path=self.path, error=str(e))
+                return False
+        self.reloads += 1
+        events.emit('rules_loaded', path=self.path, rules=len(self.ruleset),
+                    names=[rule.name for rule in self.ruleset.rules], fields=sorted(self.fields))
+        return True
+
+    def check(self, snapshot, names: Sequence[str], now: Optional[float] = None) -> List[Dict]:
+        """
+        Все правила над снимком; алерты пар, у которых правило выполнено и cooldown правила прошёл
+        names - имена пар по индексам SymbolTable снимка
+        """
+        ruleset = self.ruleset
+        size = len(snapshot)
+        if not ruleset.rules or size == 0:
+            return []
+        if now is None:
+            now = time.time()
+
+        columns = {name: snapshot.column(name) for name in ruleset.fields}
+        masks = ruleset.evaluate(columns, size)
+        alerts = []
+        for rule, mask in zip(ruleset.rules, masks):
+            hits = np.flatnonzero(mask)
+            if hits.size == 0:
+                continue
+            state = self._state[rule.name]
+            state.ensure_capacity(len(names))
+            state.expire(now)
+            hit_idx = snapshot.idx[hits]
+            hits = hits[(now - state.time[hit_idx]) >= rule.cooldown][:self.max_per_scan]
+            if hits.size == 0:
+                continue
+
+            with np.errstate(all='ignore'):
+                spread = (snapshot.last[hits] - snapshot.fair[hits]) / snapshot.fair[hits] * 100
+            state.mark(snapshot.idx[hits], now, spread)
+            values = {field: columns[field][hits] for field in sorted(rule.fields)}
+            for i, pos in enumerate(hits.tolist()):
+                spread_percent = float(spread[i])
+                alert_data = {
+                    'symbol': names[snapshot.idx[pos]],
+                    'rule': rule.name,
+                    'when': rule.when,
+                    'last_price': float(snapshot.last[pos]),
+                    'fair_price': float(snapshot.fair[pos]),
+                    'spread_percent': spread_percent,
+                    'direction': 'выше' if spread_percent > 0 else 'ниже',
+                    'values': {field: float(column[i]) for field, column in values.items()},
+                }
+                if not np.isnan(snapshot.exchange_ts[pos]):
+                    alert_data['exchange_ts'] = float(snapshot.exchange_ts[pos])
+                alerts.append(alert_data)
+        return alerts
@@ -0,0 +1,96 @@
+"""
+Состояние cooldown алертов: время и спред последнего алерта по индексам SymbolTable
+Записи живут в массивах, срок истечения - в куче: по окончании ALERT_COOLDOWN запись
+сбрасывается, поэтому число активных cooldown считается за O(1), а память не растёт
+"""
+import heapq
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+import config
+
+
+class AlertStateStore:
+    def __init__(self, cooldown: Optional[float] = None, capacity: int = 1024):
+        """
+        cooldown - сколько секунд запись держится после алерта
+        capacity - начальный размер массивов (растут удвоением)
+        """
+        self.cooldown = config.ALERT_COOLDOWN if cooldown is None else cooldown
+        self.capacity = 0
+
+        self.time = np.full(0, -np.inf)  # Время последнего алерта (-inf - cooldown нет)
+        self.spread = np.zeros(0)  # Спред последнего алерта (со знаком)
+        self.expires = np.full(0, -np.inf)  # Когда запись истекает
+
+        # Куча (expires_at, idx); после повторного алерта старая пара остаётся и пропускается при извлечении
+        self._heap: List[Tuple[float, int]] = []
+        self.active = 0
+
+        self.ensure_capacity(capacity)
+
+    def __len__(self) -> int:
+        """Число активных cooldown (после последнего expire)"""
+        return self.active
+
+    def ensure_capacity(self, size: int):
+        """Расширить массивы под новые символы"""
+        if size <= self.capacity:
+            return
+        new_capacity = max(size, self.capacity * 2)
+
+        def grow(array, fill):
+            grown = np.full(new_capacity, fill, dtype=array.dtype)
+            grown[:self.capacity] = array
+            return grown
+
+        self.time = grow(self.time, -np.inf)
+        self.spread = grow(self.spread, 0.0)
+        self.expires = grow(self.expires, -np.inf)
+        self.capacity = new_capacity
+
+    def get(self, idx: int) -> Optional[Tuple[float, float]]:
+        """(время, спред) последнего алерта пары или None, если cooldown нет"""
+        if idx >= self.capacity or self.time[idx] == -np.inf:
+            return None
+        return float(self.time[idx]), float(self.spread[idx])
+
+    def mark(self, idx: np.ndarray, now: float, spread: np.ndarray):
+        """Записать алерты пар idx (idx - массив или одно число)"""
+        idx = np.atleast_1d(idx)
+        if idx.size == 0:
+            return
+        self.ensure_capacity(int(idx.max()) + 1)
+
+        self.active += int(np.count_nonzero(self.time[idx] == -np.inf))
+        expires_at = now + self.cooldown
+        self.time[idx] = now
+        self.spread[idx] = spread
+        self.expires[idx] = expires_at
+        for i in idx.tolist():
+            heapq.heappush(self._heap, (expires_at, i))
+
+    def expire(self, now: float) -> int:
+        """Сбросить записи, чей cooldown закончился к now. Возвращает, сколько сброшено"""
+        heap = self._heap
+        expired = 0
+        while heap and heap[0][0] <= now:
+            expires_at, idx = heapq.heappop(heap)
+            if self.expires[idx] != expires_at:
+                continue  # Устаревшая пара: был повторный алерт или remove
+            self._reset(idx)
+            expired += 1
+        return expired
+
+    def remove(self, idx: np.ndarray):
+        """Удалить записи пар (делистинг); их пары в куче станут устаревшими"""
+        for i in np.atleast_1d(idx).tolist():
+            if i < self.capacity and self.time[i] != -np.inf:
+                self._reset(i)
+
+    def _reset(self, idx: int):
+        self.time[idx] = -np.inf
+        self.spread[idx] = 0.0
+        self.expires[idx] = -np.inf
+        self.active -= 1
@@ -0,0 +1,1106 @@
+"""
+Бенчмарки горячего пути монитора (без живого API)
+
+Запуск:
+    python benchmark.py            # все бенчмарки
+    python benchmark.py batch      # только выбранные
+    BENCH_SCALE=0.01 python benchmark.py   # уменьшенные размеры и повторы (быстрая проверка)
+"""
+import gc
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from spread_analyzer import SpreadAnalyzer
+import config
+
+# Множитель размеров, повторов и длительностей бенчмарков
+SCALE = float(os.getenv('BENCH_SCALE', '1'))
+
+
+def scaled(count, minimum=1):
+    """Размер с учётом SCALE, не меньше minimum"""
+    return max(minimum, int(count * SCALE))
+
+
+def make_price_data(count: int, seed: int = 42):
+    """Синтетический снимок: спреды в основном небольшие, ~1% пар выше порога"""
+    rng = random.Random(seed)
+    data = []
+    for i in range(count):
+        fair = rng.uniform(0.001, 50000)
+        spread = rng.uniform(10, 30) if rng.random() < 0.01 else rng.uniform(-2, 2)
+        data.append({
+            'symbol': f"SYM{i}_USDT",
+            'last_price': fair * (1 + spread / 100),
+            'fair_price': fair
+        })
+    return data
+
+
+def timeit(func, repeat: int = 20) -> float:
+    """Медианное время вызова в миллисекундах"""
+    samples = []
+    for _ in range(scaled(repeat)):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def bench_batch():
+    """Поштучный анализ словарей (старый путь scan_all_pairs) против analyze_batch"""
+    print("=" * 60)
+    print("БЕНЧМАРК: SpreadAnalyzer.analyze vs analyze_batch")
+    print("=" * 60)
+
+    for count in map(scaled, (500, 5000, 20000, 50000)):
+        data = make_price_data(count)
+        symbols = [d['symbol'] for d in data]
+        last = [d['last_price'] for d in data]
+        fair = [d['fair_price'] for d in data]
+
+        per_dict = SpreadAnalyzer()
+        batch = SpreadAnalyzer()
+        # Первый проход отправляет все "алерты" - дальше меряем установившийся режим (cooldown)
+        for d in data:
+            per_dict.analyze(d)
+        batch.analyze_batch(symbols, last, fair)
+
+        def run_per_dict():
+            max_spread = 0
+            for price_data in data:
+                per_dict.analyze(price_data)
+                spread = abs(((price_data['last_price'] - price_data['fair_price']) / price_data['fair_price']) * 100)
+                if spread > max_spread:
+                    max_spread = spread
+
+        def run_batch():
+            batch.analyze_batch(symbols, last, fair)
+
+        t_dict = timeit(run_per_dict)
+        t_batch = timeit(run_batch)
+        print(f"{count:6d} пар | по словарям: {t_dict:8.2f} мс | пакетно: {t_batch:7.2f} мс | x{t_dict / t_batch:5.1f}")
+
+
+def bench_delta():
+    """Снимок, где меняется часть пар, против снимка, где меняются все"""
+    import numpy as np
+
+    print("=" * 60)
+    print("БЕНЧМАРК: analyze_batch при разной доле изменившихся пар")
+    print("=" * 60)
+
+    rng = np.random.default_rng(3)
+    for count in map(scaled, (5000, 50000)):
+        symbols = [f"SYM{i}_USDT" for i in range(count)]
+        fair = rng.uniform(0.001, 50000, count)
+        last = fair * (1 + rng.uniform(-0.02, 0.02, count))
+        for ratio in (1.0, 0.2, 0.05, 0.0):
+            analyzer = SpreadAnalyzer()
+            analyzer.verbose = False
+            analyzer.analyze_batch(symbols, last, fair)
+            snapshots = []
+            for _ in range(20):
+                moved = rng.random(count) < ratio
+                snapshots.append(np.where(moved, last * (1 + rng.uniform(-1e-4, 1e-4, count)), last))
+            frames = iter(snapshots * 2)
+
+            t_scan = timeit(lambda: analyzer.analyze_batch(symbols, next(frames), fair), repeat=20)
+            print(f"{count:6d} пар | изменилось {ratio * 100:5.1f}% ({analyzer.last_changed:5d}) | {t_scan:7.3f} мс на скан")
+
+
+def bench_top():
+    """/top N: частичный отбор argpartition против полной сортировки всех пар"""
+    import numpy as np
+
+    print("=" * 60)
+    print("БЕНЧМАРК: /top по накопленной статистике")
+    print("=" * 60)
+
+    rng = np.random.default_rng(5)
+    for count in map(scaled, (5000, 50000)):
+        symbols = [f"SYM{i}_USDT" for i in range(count)]
+        fair = rng.uniform(0.001, 50000, count)
+        analyzer = SpreadAnalyzer()
+        analyzer.verbose = False
+        now = time.time()
+        for step in range(20):
+            analyzer.analyze_batch(symbols, fair * (1 + rng.normal(0, 0.01, count)), fair, now=now + step)
+
+        def full_sort():
+            order = np.argsort(-np.abs(analyzer._spread[:count]))[:10]
+            return [analyzer.symbol_stats(symbols[i]) for i in order.tolist()]
+
+        t_sort = timeit(full_sort, repeat=50)
+        t_top = timeit(lambda: analyzer.top(10), repeat=50)
+        t_z = timeit(lambda: analyzer.top(10, 'z'), repeat=50)
+        t_symbol = timeit(lambda: analyzer.symbol_stats(symbols[count // 2]), repeat=50)
+        print(f"{count:6d} пар | сортировка {t_sort:.3f} мс | top(10) {t_top:.3f} мс | top(10, z) {t_z:.3f} мс | "
+              f"symbol {t_symbol * 1000:.0f} мкс")
+
+
+def bench_subscriptions():
+    """Поиск подписчиков алерта: индекс по порогу и символу против обхода всех подписок"""
+    from subscriptions import Subscription, SubscriptionRegistry
+
+    print("=" * 60)
+    print("БЕНЧМАРК: SubscriptionRegistry.route vs обход всех подписок")
+    print("=" * 60)
+
+    rng = random.Random(5)
+    symbols = [f"SYM{i}_USDT" for i in range(2000)]
+    for count in map(scaled, (100, 1000, 10000)):
+        registry = SubscriptionRegistry(path='')
+        for i in range(count):
+            allow = rng.sample(symbols, 3) if rng.random() < 0.3 else ()
+            registry.upsert(Subscription(i, min_spread=rng.uniform(5, 50), side=rng.choice(('long', 'short', 'both')),
+                                         allow=allow, cooldown=1.0))
+        subscriptions = list(registry.subscriptions.values())
+        alerts = [(rng.choice(symbols), rng.choice((-1, 1)) * rng.uniform(10, 15)) for _ in range(scaled(1000))]
+
+        def run_index():
+            for symbol, spread in alerts:
+                registry.route(symbol, spread, now=0.0)
+
+        def run_loop():
+            for symbol, spread in alerts:
+                side = 'short' if spread > 0 else 'long'
+                for s in subscriptions:
+                    if (abs(spread) >= s.min_spread and s.side in (side, 'both') and (not s.allow or symbol in s.allow)
+                            and symbol not in s.deny and s.ready(symbol, spread, 0.0)):
+                        s.mark(symbol, spread, 0.0)
+
+        # Первый проход до замеров: подписки ещё вне cooldown, k - среднее число получателей алерта
+        matched = sum(len(registry.route(symbol, spread, now=0.0)) for symbol, spread in alerts) / len(alerts)
+        t_index = timeit(run_index, repeat=5) / len(alerts) * 1000
+        t_loop = timeit(run_loop, repeat=5) / len(alerts) * 1000
+        print(f"{count:6d} подписок (k={matched:5.0f}) | индекс: {t_index:6.1f} мкс | обход: {t_loop:7.1f} мкс на алерт | x{t_loop / t_index:4.1f}")
+
+
+def bench_coalesce():
+    """Сжатие (squeeze): вызовы Bot API на событие - отдельное сообщение на каждые +5% против правок"""
+    import numpy as np
+    from alert_dispatcher import AlertDispatcher
+    from alert_lifecycle import AlertLifecycle
+    from mock_servers import MockTelegramServer
+    from subscriptions import Subscription
+    from telegram_notifier import TelegramNotifier
+
+    print("=" * 60)
+    print("БЕНЧМАРК: жизненный цикл алертов при росте спреда")
+    print("=" * 60)
+
+    server = MockTelegramServer(chat_limit=10 ** 6, global_limit=10 ** 6)
+    server.start()
+    config.TELEGRAM_API_URL = server.url
+    config.TELEGRAM_BOT_TOKEN = config.TELEGRAM_BOT_TOKEN or "bench"
+    config.TELEGRAM_GLOBAL_RATE = config.TELEGRAM_CHAT_RATE = config.TELEGRAM_CHAT_BURST = 1000
+    notifier = TelegramNotifier()
+    subscription = Subscription('-100')
+
+    # 5 пар разгоняются с 11% до ~41% за 60 сканов и возвращаются; остальные 995 - шум
+    rng = np.random.default_rng(11)
+    symbols = [f"SQZ{i}_USDT" for i in range(5)] + [f"SYM{i}_USDT" for i in range(995)]
+    fair = rng.uniform(1, 1000, len(symbols))
+    noise = rng.uniform(-2, 2, len(symbols))
+
+    for label, lifecycle_mode in (("сообщение на алерт", False), ("жизненный цикл", True)):
+        analyzer = SpreadAnalyzer()
+        analyzer.verbose = False
+        dispatcher = AlertDispatcher(notifier)
+        dispatcher.start()
+        lifecycle = AlertLifecycle(notifier, dispatcher, edit_interval=0.5) if lifecycle_mode else None
+        before = len(server.messages)
+        fired = 0
+        for step in range(80):
+            spread = noise.copy()
+            if step < 60:
+                spread[:5] = 11 + step * 0.5 + np.arange(5) * 0.3
+            alerts, _, _ = analyzer.analyze_batch(symbols, fair * (1 + spread / 100), fair)
+            fired += len(alerts)
+            if lifecycle:
+                if alerts:
+                    lifecycle.publish(subscription, alerts)
+                lifecycle.tick(analyzer.current_spread)
+            else:
+                for alert in alerts:
+                    dispatcher.enqueue(alert, notifier.build_payload(alert, subscription.chat_id))
+            time.sleep(0.05 * SCALE)
+        dispatcher.stop()
+
+        calls = server.messages[before:]
+        sends = sum(1 for m in calls if m['method'] == 'sendMessage')
+        edits = len(calls) - sends
+        print(f"{label:18s}: алертов {fired:3d} | sendMessage {sends:3d} + editMessageText {edits:3d} = "
+              f"{len(calls):3d} вызовов API")
+    server.stop()
+
+
+def bench_confirm():
+    """Подтверждение кандидатов по отдельным парам: по очереди против параллельного раунда с дедлайном"""
+    from candidate_confirmer import CandidateConfirmer
+    from mock_servers import MockMEXCServer
+
+    print("=" * 60)
+    print("БЕНЧМАРК: подтверждение кандидатов перед алертом")
+    print("=" * 60)
+
+    # Задержка ответа ~ round-trip до биржи; половина кандидатов - устаревший lastPrice
+    rtt = 0.05
+    server = MockMEXCServer(contracts=200, latency=rtt, seed=4)
+    candidates = server.symbols[:8]
+    server.stale = set(candidates[1::2])
+    server.set_prices({s: 15.0 for s in candidates})
+    server.start()
+    confirmer = CandidateConfirmer(base_url=server.url, timeout=1.0)
+    confirmer.warm()
+    time.sleep(2 * rtt)
+
+    def alerts_for(count):
+        return [{'symbol': s, 'last_price': 1.15, 'fair_price': 1.0, 'spread_percent': 15.0, 'direction': 'выше'}
+                for s in candidates[:count]]
+
+    def sequential(count):
+        for alert_data in alerts_for(count):
+            confirmer._get('/api/v1/contract/ticker', {'symbol': alert_data['symbol']})
+            confirmer._get(f"/api/v1/contract/fair_price/{alert_data['symbol']}")
+
+    print(f"round-trip заглушки {rtt * 1000:.0f} мс, два запроса на пару")
+    for count in (1, 4, 8):
+        t_sequential = timeit(lambda: sequential(count), repeat=5)
+        t_concurrent = timeit(lambda: confirmer.confirm(alerts_for(count), 10.0), repeat=5)
+        confirmed, rejected = confirmer.confirm(alerts_for(count), 10.0)
+        print(f"{count} канд.: по очереди {t_sequential:6.1f} мс | параллельно {t_concurrent:6.1f} мс | "
+              f"подтверждено {len(confirmed)}, отклонено {len(rejected)}")
+
+    # Биржа не успевает к дедлайну: скан ждёт не дольше CONFIRM_TIMEOUT
+    server.latency = 0.5
+    slow = CandidateConfirmer(base_url=server.url, timeout=0.2)
+    started = time.perf_counter()
+    confirmed, rejected = slow.confirm(alerts_for(8), 10.0)
+    print(f"Ответ 500 мс, дедлайн 200 мс: {(time.perf_counter() - started) * 1000:.0f} мс, "
+          f"без ответа {slow.unanswered} (повтор через {config.CONFIRM_RETRY_DELAY} сек)")
+    confirmer.close()
+    slow.close()
+    server.stop()
+
+
+def bench_dispatch():
+    """Блокирующая отправка 30 алертов против постановки в очередь (мок Bot API с задержкой 50 мс)"""
+    from alert_dispatcher import AlertDispatcher
+    from mock_servers import MockTelegramServer
+    from telegram_notifier import TelegramNotifier
+
+    print("=" * 60)
+    print("БЕНЧМАРК: send_alert_sync vs AlertDispatcher.enqueue")
+    print("=" * 60)
+
+    server = MockTelegramServer(chat_limit=1000, latency=0.05)
+    server.start()
+    config.TELEGRAM_API_URL = server.url
+    config.TELEGRAM_BOT_TOKEN = config.TELEGRAM_BOT_TOKEN or "bench"
+    config.TELEGRAM_CHAT_RATE = 1000
+    config.TELEGRAM_CHAT_BURST = 1000
+    notifier = TelegramNotifier()
+
+    alerts = [{'symbol': f"SYM{i}_USDT", 'last_price': 1.1, 'fair_price': 1.0,
+               'spread_percent': 10.0 + i, 'direction': 'выше'} for i in range(scaled(30))]
+
+    started = time.perf_counter()
+    for alert in alerts:
+        notifier.send_alert_sync(alert)
+    t_sync = (time.perf_counter() - started) * 1000
+
+    dispatcher = AlertDispatcher(notifier)
+    dispatcher.start()
+    started = time.perf_counter()
+    for alert in alerts:
+        dispatcher.enqueue(alert)
+    t_enqueue = (time.perf_counter() - started) * 1000
+    dispatcher.stop(timeout=30)
+    server.stop()
+
+    metrics = dispatcher.metrics()
+    print(f"Блокирующая отправка: {t_sync:8.1f} мс на скан")
+    print(f"Постановка в очередь: {t_enqueue:8.3f} мс на скан")
+    print(f"Доставлено: {metrics['sent']} | send p50/p95: {metrics['send_p50_ms']:.0f}/{metrics['send_p95_ms']:.0f} мс")
+
+
+def make_ticker_payload(count: int, seed: int = 7) -> bytes:
+    """Синтетический ответ /api/v1/contract/ticker с полным набором полей MEXC"""
+    rng = random.Random(seed)
+    tickers = []
+    for i in range(count):
+        fair = round(rng.uniform(0.0001, 50000), 6)
+        last = round(fair * (1 + rng.uniform(-0.02, 0.02)), 6)
+        tickers.append({
+            'contractId': i, 'symbol': f"SYM{i}_USDT", 'lastPrice': last,
+            'bid1': last * 0.999, 'ask1': last * 1.001, 'volume24': rng.randint(0, 10 ** 7),
+            'amount24': rng.uniform(0, 10 ** 8), 'holdVol': rng.randint(0, 10 ** 6),
+            'lower24Price': last * 0.9, 'high24Price': last * 1.1, 'riseFallRate': rng.uniform(-0.1, 0.1),
+            'riseFallValue': rng.uniform(-1, 1), 'indexPrice': fair, 'fairPrice': fair,
+            'fundingRate': rng.uniform(-0.001, 0.001), 'maxBidPrice': last * 1.1, 'minAskPrice': last * 0.9,
+            'timestamp': 1700000000000 + i, 'riseFallRates': {'zone': 'UTC+8', 'r': 0.01, 'v': 0.1},
+            'riseFallRatesOfTimezone': [0.01, 0.02, 0.03]
+        })
+    return json.dumps({'success': True, 'code': 0, 'data': tickers}).encode()
+
+
+def measure(func, repeat: int = 10):
+    """(медиана мс, пик аллокаций КБ, сборок мусора gen0 за repeat вызовов)"""
+    median = timeit(func, repeat)
+    gc_before = gc.get_stats()[0]['collections']
+    for _ in range(scaled(repeat)):
+        func()
+    collections = gc.get_stats()[0]['collections'] - gc_before
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    return median, peak, collections
+
+
+def bench_decode():
+    """json.loads + словари (get_all_tickers/get_all_price_data) против TickerDecoder"""
+    from mexc_client import MEXCClient
+    from symbol_table import SymbolTable
+    from ticker_decoder import TickerDecoder
+
+    print("=" * 60)
+    print("БЕНЧМАРК: разбор ответа тикеров")
+    print("=" * 60)
+
+    payloads = []
+    recorded = os.getenv('BENCH_TICKER_PAYLOAD')  # Путь к сохранённому ответу биржи (~800 контрактов)
+    if recorded:
+        with open(recorded, 'rb') as f:
+            payloads.append(("записанный", f.read()))
+    else:
+        payloads.append(("~800 (синт.)", make_ticker_payload(800)))
+    big = scaled(20000)
+    payloads.append((f"{big // 1000}k (синт.)" if big >= 1000 else f"{big} (синт.)", make_ticker_payload(big)))
+
+    for name, raw in payloads:
+        decoder = TickerDecoder(SymbolTable())
+        decoder.decode(raw)
+
+        def run_dicts():
+            response = json.loads(raw)
+            tickers = {t['symbol']: t for t in response['data'] if t.get('symbol')}
+            return [p for p in (MEXCClient.to_price_data(s, t) for s, t in tickers.items()) if p]
+
+        def run_decoder():
+            return decoder.decode(raw)
+
+        t_dict, mem_dict, gc_dict = measure(run_dicts)
+        t_dec, mem_dec, gc_dec = measure(run_decoder)
+        print(f"{name:14s} {len(raw) / 1024:8.0f} КБ")
+        print(f"   словари:  {t_dict:8.2f} мс | пик {mem_dict:9.0f} КБ | gc0 {gc_dict}")
+        print(f"   декодер:  {t_dec:8.2f} мс | пик {mem_dec:9.0f} КБ | gc0 {gc_dec} | fallback {decoder.fallbacks}")
+
+
+RULE_TEXTS = [
+    "last vs index > 3%",
+    "abs(last vs index) > 3% and amount > 1m",
+    "abs(spread) >= 10",
+    "abs(funding) > 0.05% and volume > 100k",
+    "ask vs bid > 0.5% and amount > 10m",
+    "(bid + ask) / 2 vs index < -2%",
+    "change > 8% and hold > 100k",
+    "high vs low > 15% and abs(last vs index) > 1%",
+    "last vs high > -0.5% and change > 5%",
+    "funding < -0.08% and last vs index < -1%",
+]
+
+
+def bench_rules():
+    """Десять правил по полям тикера: одна скомпилированная функция против правил по отдельности и цикла по парам"""
+    import numpy as np
+    from alert_rules import AlertRule, RuleSet
+    from symbol_table import SymbolTable
+    from ticker_decoder import TickerDecoder
+
+    print("=" * 60)
+    print("БЕНЧМАРК: правила алертов по полям тикера (10 правил)")
+    print("=" * 60)
+
+    rules = [AlertRule(f"rule{i}", when) for i, when in enumerate(RULE_TEXTS)]
+    ruleset = RuleSet(rules)
+    separate = [RuleSet([rule]) for rule in rules]
+    print(f"Поля: {', '.join(sorted(ruleset.fields))}")
+
+    for count in map(scaled, (5000, 50000)):
+        raw = make_ticker_payload(count)
+        decoder = TickerDecoder(SymbolTable())
+        decoder.decode(raw)
+        t_decode = timeit(lambda: decoder.decode(raw), repeat=5)
+        decoder.fields = ruleset.fields
+        snapshot = decoder.decode(raw)
+        t_decode_fields = timeit(lambda: decoder.decode(raw), repeat=5)
+
+        size = len(snapshot)
+        columns = {name: snapshot.column(name) for name in ruleset.fields}
+        t_compiled = timeit(lambda: ruleset.evaluate(columns, size))
+        t_separate = timeit(lambda: [r.evaluate(columns, size) for r in separate])
+        t_single = timeit(lambda: separate[2].evaluate(columns, size))
+
+        # Те же правила поштучно: по вызову на пару (скалярные значения вместо колонок)
+        rows = [{name: values[i] for name, values in columns.items()} for i in range(size)]
+        evaluate = ruleset._evaluate
+
+        def per_pair():
+            with np.errstate(all='ignore'):
+                return [evaluate(row) for row in rows]
+
+        t_loop = timeit(per_pair, repeat=1)
+        hits = [int(np.count_nonzero(mask)) for mask in ruleset.evaluate(columns, size)]
+        assert hits == [int(np.count_nonzero(r.evaluate(columns, size)[0])) for r in separate]
+        print(f"{count:6d} пар: декодер {t_decode:6.1f} мс -> {t_decode_fields:6.1f} мс с полями правил")
+        print(f"   правила: вместе {t_compiled:6.2f} мс | по отдельности {t_separate:6.2f} мс | "
+              f"одно правило {t_single:5.2f} мс | по парам {t_loop:8.1f} мс | срабатываний {sum(hits)}")
+
+
+def bench_venues():
+    """Скан MEXC + трёх бирж на заглушках: по очереди против параллельно с общим дедлайном"""
+    import numpy as np
+    from alert_rules import AlertRule, RuleSet
+    from hedged_transport import HedgedTransport
+    from mexc_client import MEXCClient
+    from mock_servers import MockMEXCServer, MockVenueServer
+    from price_sources import VENUE_SOURCES, VenuePrices
+    from symbol_table import SymbolTable
+
+    print("=" * 60)
+    print("БЕНЧМАРК: несколько бирж в одном скане")
+    print("=" * 60)
+
+    contracts = scaled(2000, 10)
+    mexc_server = MockMEXCServer(contracts=contracts, latency=0.1)
+    mexc_server.start()
+    table = SymbolTable()
+    mexc = MEXCClient(table, transport=HedgedTransport([mexc_server.url]))
+    snapshot = mexc.fetch()
+    prices = dict(zip((table.names[i] for i in snapshot.idx.tolist()), snapshot.last.tolist()))
+    # Та же пара дешевле на Binance на 5%; на Bybit - под именем с множителем 1000
+    shifted = dict(prices, SYM3_USDT=prices['SYM3_USDT'] * 0.95)
+    multiplied = {s: p for s, p in prices.items() if s != 'SYM7_USDT'}
+    multiplied['1000SYM7_USDT'] = prices['SYM7_USDT'] * 1000
+    latencies = {'binance': 0.08, 'bybit': 0.15, 'okx': 0.25}
+    servers = {'binance': MockVenueServer('binance', shifted, latency=latencies['binance']),
+               'bybit': MockVenueServer('bybit', multiplied, latency=latencies['bybit']),
+               'okx': MockVenueServer('okx', prices, latency=latencies['okx'])}
+    for server in servers.values():
+        server.start()
+    sources = [VENUE_SOURCES[name](table, server.url) for name, server in servers.items()]
+    venues = VenuePrices(sources, table, deadline=1.0)
+
+    def sequential():
+        mexc.fetch()
+        for source in sources:
+            source.fetch()
+
+    def concurrent():
+        started = time.perf_counter()
+        venues.submit()
+        mexc.fetch()
+        venues.collect(started)
+
+    print("Задержки: MEXC 100 мс, " + ", ".join(f"{k} {v * 1000:.0f} мс" for k, v in latencies.items()))
+    t_sequential = timeit(sequential, repeat=5)
+    t_concurrent = timeit(concurrent, repeat=5)
+    print(f"{contracts} пар: по очереди {t_sequential:6.0f} мс | параллельно {t_concurrent:6.0f} мс "
+          f"(самая медленная биржа {max(latencies.values()) * 1000:.0f} мс)")
+
+    columns = venues.columns(snapshot.idx)
+    found = {name: int(np.count_nonzero(~np.isnan(column))) for name, column in columns.items()}
+    ruleset = RuleSet([AlertRule(f"{name}_spread", f"abs(last vs {name}) >= 2%") for name in venues.names])
+    masks = ruleset.evaluate(dict(columns, lastPrice=snapshot.last), len(snapshot))
+    hits = {rule.name: [table.names[snapshot.idx[i]] for i in np.flatnonzero(mask)] for rule, mask in zip(ruleset.rules, masks)}
+    sym7 = columns['bybit'][np.flatnonzero(snapshot.idx == table.index['SYM7_USDT'])[0]]
+    print(f"Сопоставлено пар: {found} | 1000SYM7USDT -> SYM7_USDT: {sym7:.6g} (MEXC {prices['SYM7_USDT']:.6g})")
+    print(f"Межбиржевой спред >= 2%: {hits}")
+
+    # Биржа отвечает 2 с: скан ждёт только дедлайн, её ответ применится в следующем скане
+    servers['okx'].latency = 2.0
+    venues.deadline = 0.5
+    venues.updated_at['okx'] = -np.inf
+    started = time.perf_counter()
+    concurrent()
+    print(f"OKX 2000 мс, дедлайн 500 мс: скан {(time.perf_counter() - started) * 1000:.0f} мс, "
+          f"не успели {venues.late}, okx {'есть' if np.isfinite(venues.updated_at['okx']) else 'нет'} в спредах")
+    time.sleep(2.0)
+    started = time.perf_counter()
+    concurrent()
+    print(f"Следующий скан: {(time.perf_counter() - started) * 1000:.0f} мс, "
+          f"okx {'есть' if np.isfinite(venues.updated_at['okx']) else 'нет'} в спредах")
+
+    # Выравнивание и спреды на 50k пар: выборка по индексам + одна скомпилированная функция
+    size = scaled(50000)
+    big = SymbolTable()
+    big_idx = big.indices([f"SYM{i}_USDT" for i in range(size)])
+    rng = np.random.default_rng(3)
+    big_last = rng.uniform(0.01, 100, size)
+    big_venues = VenuePrices([], big)
+    for name in ('binance', 'bybit', 'okx'):
+        big_venues.last[name] = big_last * rng.uniform(0.97, 1.03, size)
+        big_venues.updated_at[name] = time.time()
+    t_align = timeit(lambda: ruleset.evaluate(dict(big_venues.columns(big_idx), lastPrice=big_last), size))
+    print(f"{size} пар, 3 биржи: выравнивание и спреды {t_align:.2f} мс")
+
+    venues.close()
+    mexc.transport.close()
+    for server in servers.values():
+        server.stop()
+    mexc_server.stop()
+
+
+def bench_stream():
+    """Загрузка тикеров через медленный канал: целиком и потом разбор против потокового разбора (gzip и без)"""
+    from hedged_transport import HedgedTransport
+    from mexc_client import MEXCClient
+    from mock_servers import MockMEXCServer
+    from spread_analyzer import SpreadAnalyzer
+    from symbol_table import SymbolTable
+
+    print("=" * 60)
+    print("БЕНЧМАРК: потоковый разбор ответа тикеров")
+    print("=" * 60)
+
+    contracts = scaled(3000, 20)
+    early = 'SYM10_USDT'  # Пара в начале ответа со спредом выше порога
+    server = MockMEXCServer(contracts=contracts, latency=0.02, bandwidth=1_000_000)
+    server.set_prices({early: 15.0})
+    server.start()
+    raw_size = len(server._ticker)
+    gzip_size = len(server.gzipped(server._ticker))
+    print(f"{contracts} пар: ответ {raw_size / 1024:.0f} КБ, gzip {gzip_size / 1024:.0f} КБ; "
+          f"канал {server.bandwidth / 1e6:.0f} МБ/с, задержка {server.latency * 1000:.0f} мс")
+
+    def run(stream: bool, compress: bool, repeat: int = 5):
+        server.compress = compress
+        first, alert, total = [], [], []
+        for _ in range(scaled(repeat)):
+            table = SymbolTable()
+            client = MEXCClient(table, transport=HedgedTransport([server.url]))
+            analyzer = SpreadAnalyzer(min_spread_percent=10.0, symbol_table=table)
+            marks = {}
+
+            def on_batch(part):
+                now = time.perf_counter()
+                marks.setdefault('first', now)
+                alerts, _, _ = analyzer.analyze_batch(None, part.last, part.fair, idx=part.idx)
+                if any(a['symbol'] == early for a in alerts):
+                    marks.setdefault('alert', time.perf_counter())
+
+            started = time.perf_counter()
+            if stream:
+                snapshot = client.stream_price_snapshot(on_batch)
+            else:
+                snapshot = client.get_price_snapshot()
+                on_batch(snapshot)
+            finished = time.perf_counter()
+            assert snapshot is not None and len(snapshot) == contracts
+            first.append(marks['first'] - started)
+            alert.append(marks['alert'] - started)
+            total.append(finished - started)
+            client.transport.close()
+        ms = lambda values: sorted(values)[len(values) // 2] * 1000
+        return ms(first), ms(alert), ms(total)
+
+    for compress in (False, True):
+        label = "gzip" if compress else "без сжатия"
+        buffered = run(False, compress)
+        streamed = run(True, compress)
+        print(f"{label:>10}: целиком - первые пары {buffered[0]:5.0f} мс, алерт {early} {buffered[1]:5.0f} мс, "
+              f"скан {buffered[2]:5.0f} мс")
+        print(f"{'':>10}  потоком  - первые пары {streamed[0]:5.0f} мс, алерт {early} {streamed[1]:5.0f} мс, "
+              f"скан {streamed[2]:5.0f} мс")
+
+    # Канал не ограничен: цена потокового разбора - лишние проходы regex по кускам
+    server.bandwidth = 0
+    server.latency = 0.0
+    buffered = run(False, True, repeat=10)
+    streamed = run(True, True, repeat=10)
+    print(f"Без ограничения канала (gzip): целиком {buffered[2]:.1f} мс | потоком {streamed[2]:.1f} мс")
+    server.stop()
+
+
+def bench_replay():
+    """Запись часа снимков по 800 пар и replay/sweep через mmap"""
+    import tempfile
+    import numpy as np
+    from snapshot_recorder import SnapshotRecorder, replay, sweep
+    from symbol_table import SymbolTable
+    from ticker_decoder import TickerSnapshot
+
+    print("=" * 60)
+    seconds = scaled(3600)
+    print(f"БЕНЧМАРК: запись и replay снимков ({seconds} x 800 пар)")
+    print("=" * 60)
+
+    rng = np.random.default_rng(1)
+    table = SymbolTable()
+    idx = table.indices([f"SYM{i}_USDT" for i in range(800)])
+    fair = rng.uniform(0.001, 50000, 800)
+
+    path = os.path.join(tempfile.mkdtemp(), "snapshots.bin")
+    recorder = SnapshotRecorder(path, table)
+    started = time.perf_counter()
+    for second in range(seconds):
+        last = fair * (1 + rng.normal(0, 0.01, 800))
+        last[rng.integers(0, 800, 2)] *= 1.15  # Редкие выбросы выше порога
+        recorder.append(TickerSnapshot(idx, last, fair, 1700000000.0 + second))
+    recorder.close()
+    t_record = time.perf_counter() - started
+    size_mb = os.path.getsize(path) / 1024 / 1024
+
+    started = time.perf_counter()
+    alerts = replay(path)
+    t_replay = time.perf_counter() - started
+
+    grid = [{'min_spread_percent': m, 'alert_cooldown': c} for m in (5, 10, 15) for c in (60, 300)]
+    started = time.perf_counter()
+    results = sweep(path, grid)
+    t_sweep = time.perf_counter() - started
+
+    print(f"Запись: {t_record:.2f} сек | файл {size_mb:.1f} МБ ({size_mb * 1024 * 1024 / seconds / 800:.1f} байт на точку)")
+    print(f"Replay: {t_replay:.2f} сек, алертов {len(alerts)} (x{seconds / t_replay:.0f} быстрее реального времени)")
+    print(f"Sweep {len(grid)} наборов: {t_sweep:.2f} сек | алертов: {[len(r) for r in results]}")
+
+
+def bench_metrics():
+    """Стоимость записи одного события в гистограмму/счётчик"""
+    from metrics import Histogram, Counter
+
+    print("=" * 60)
+    print("БЕНЧМАРК: запись метрик")
+    print("=" * 60)
+
+    histogram = Histogram('bench_seconds', 'bench')
+    counter = Counter('bench', 'bench')
+    values = [random.random() * 0.1 for _ in range(scaled(100000))]
+
+    started = time.perf_counter()
+    for value in values:
+        histogram.observe(value)
+    t_hist = (time.perf_counter() - started) / len(values) * 1e9
+
+    started = time.perf_counter()
+    for _ in values:
+        counter.inc()
+    t_counter = (time.perf_counter() - started) / len(values) * 1e9
+
+    started = time.perf_counter()
+    for _ in values:
+        time.perf_counter()
+    t_clock = (time.perf_counter() - started) / len(values) * 1e9
+
+    print(f"Histogram.observe: {t_hist:6.0f} нс | Counter.inc: {t_counter:6.0f} нс | perf_counter(): {t_clock:6.0f} нс")
+
+
+def bench_log():
+    """Вывод скана с алертами: print в pipe (как под systemd/docker) против журнала событий"""
+    import io
+    import tempfile
+    import threading
+    from event_log import EventLog
+
+    print("=" * 60)
+    print("БЕНЧМАРК: print против журнала событий")
+    print("=" * 60)
+
+    # Медленный читатель pipe: stdout под journald/docker без буферизации строк не бесплатен
+    read_fd, write_fd = os.pipe()
+
+    def reader():
+        with os.fdopen(read_fd, 'rb') as pipe:
+            while pipe.read(4096):
+                time.sleep(0.0005)
+
+    threading.Thread(target=reader, daemon=True).start()
+    piped = io.TextIOWrapper(os.fdopen(write_fd, 'wb'), encoding='utf-8', line_buffering=True)
+
+    alerts = [{'symbol': f"SYM{i}_USDT", 'last_price': 1.1 + i, 'fair_price': 1.0 + i,
+               'spread_percent': 10.0 + i, 'direction': 'выше'} for i in range(10)]
+
+    def scan_print():
+        for alert in alerts:
+            print(f"\n{'='*70}", file=piped)
+            print(f"🚨 СПРЕД ОБНАРУЖЕН: {alert['symbol']}", file=piped)
+            print(f"{'='*70}", file=piped)
+            print(f"💰 Последняя цена:    {alert['last_price']:12.6f}", file=piped)
+            print(f"⚖️  Справедливая цена: {alert['fair_price']:12.6f}", file=piped)
+            print(f"📈 Разница:           {alert['spread_percent']:+6.2f}% ({alert['direction']} справедливой)", file=piped)
+            print(f"⏰ Время обнаружения: 12:00:00", file=piped)
+            print(f"{'='*70}\n", file=piped)
+        print(f"[12:00:00] Скан #1: ✅ 800 пар (изменилось 120) | 🔔 АЛЕРТОВ: 10 | Всего: 10", file=piped)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = EventLog(os.path.join(tmp, 'events.jsonl'), max_bytes=64 * 1024, backups=2,
+                       console=True, stream=piped)
+        log.start()
+
+        def scan_events():
+            for alert in alerts:
+                log.emit('spread_alert', **alert)
+            log.emit('scan', scan=1, pairs=800, changed=120, alerts=10, total=10,
+                     max_spread=19.0, max_pair='SYM9_USDT', hz=1.0, target_hz=1.0)
+
+        t_print = timeit(scan_print, repeat=200)
+        t_events = timeit(scan_events, repeat=200)
+        log.stop()
+        files = sorted(os.listdir(tmp))
+        print(f"Скан с 10 алертами: print {t_print:.3f} мс | журнал {t_events:.3f} мс | x{t_print / t_events:.0f}")
+
+        quiet = EventLog(os.path.join(tmp, 'quiet.jsonl'), console=False)
+        count = scaled(100000)
+        started = time.perf_counter()
+        for i in range(count):
+            quiet.emit('scan', scan=i, pairs=800, changed=120, alerts=0, total=0,
+                       max_spread=1.5, max_pair='SYM1_USDT', hz=1.0, target_hz=1.0)
+        t_emit = (time.perf_counter() - started) / count * 1e9
+        started = time.perf_counter()
+        quiet.stop()
+        t_flush = (time.perf_counter() - started) / count * 1e6
+        print(f"emit: {t_emit:.0f} нс в потоке скана | фоновая запись JSON: {t_flush:.1f} мкс на событие")
+        print(f"Ротация по {log.max_bytes // 1024} КБ: {', '.join(files)}")
+    piped.close()
+
+
+def bench_hedge():
+    """Один хост против хеджирования на два (заглушки с хвостом задержек и отказами)"""
+    from hedged_transport import HedgedTransport
+    from mock_servers import MockMEXCServer
+
+    print("=" * 60)
+    print("БЕНЧМАРК: запрос тикеров с одного хоста и с хеджированием")
+    print("=" * 60)
+
+    def run(transport, count=scaled(200, 20)):
+        samples, errors = [], 0
+        for _ in range(count):
+            started = time.perf_counter()
+            try:
+                if transport.get('/api/v1/contract/ticker').status_code != 200:
+                    errors += 1
+            except Exception:
+                errors += 1
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        return samples[len(samples) // 2], samples[int(len(samples) * 0.95)], samples[int(len(samples) * 0.99)], errors
+
+    scenarios = (
+        ("хвост 5% по 400 мс", dict(latency=0.01, slow_rate=0.05, slow_latency=0.4), dict(latency=0.01, slow_rate=0.05, slow_latency=0.4)),
+        ("основной: 20% ошибок 503", dict(latency=0.01, fail_rate=0.2), dict(latency=0.015)),
+    )
+    for title, primary_args, secondary_args in scenarios:
+        primary = MockMEXCServer(contracts=200, seed=1, **primary_args)
+        secondary = MockMEXCServer(contracts=200, seed=2, **secondary_args)
+        primary.start()
+        secondary.start()
+
+        single = HedgedTransport([primary.url])
+        hedged = HedgedTransport([primary.url, secondary.url])
+        print(title)
+        for name, transport in (("один хост", single), ("хедж", hedged)):
+            p50, p95, p99, errors = run(transport)
+            print(f"  {name:10s} | p50 {p50:6.1f} мс | p95 {p95:6.1f} мс | p99 {p99:6.1f} мс | ошибок {errors}")
+            transport.close()
+        print(f"  хеджей: {hedged.hedges}, выиграл второй хост: {hedged.hedge_wins}, переходов после ошибки: {hedged.failovers}")
+        primary.stop()
+        secondary.stop()
+
+
+_JOURNAL_WRITER = """
+import sys, time
+sys.path.insert(0, {root!r})
+from state_journal import StateJournal
+journal = StateJournal({path!r}, compact_interval=0.05)
+journal.retention = 0.5
+scan = journal.restore().scan_counter
+while True:
+    scan += 1
+    now = time.time()
+    journal.record_scan(scan, scan * 10, [(f"SYM{{i}}_USDT", now, 12.5) for i in range(200)],
+                        [("-100:", f"SYM{{i}}_USDT", now, 12.5) for i in range(200)], now)
+    print(scan, flush=True)
+"""
+
+
+def bench_journal():
+    """Стоимость записи журнала на скан, время восстановления и kill -9 посреди записи"""
+    import signal
+    import subprocess
+    import tempfile
+    from state_journal import StateJournal
+
+    print("=" * 60)
+    print("БЕНЧМАРК: журнал состояния SQLite WAL")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = StateJournal(os.path.join(tmp, 'state.db'))
+        now = time.time()
+        scan = iter(range(10 ** 6))
+        t_empty = timeit(lambda: journal.record_scan(next(scan), 0, now=now), repeat=200)
+        alerts = [(f"SYM{i}_USDT", now, 12.5) for i in range(10)]
+        t_alerts = timeit(lambda: journal.record_scan(next(scan), 0, alerts, now=now), repeat=200)
+        journal.record_scan(next(scan), 0, [(f"SYM{i}_USDT", now, 12.5) for i in range(scaled(50000))], now=now)
+        journal.close()
+
+        started = time.perf_counter()
+        restored = StateJournal(os.path.join(tmp, 'state.db')).restore()
+        t_restore = (time.perf_counter() - started) * 1000
+        print(f"Запись скана: без алертов {t_empty:.3f} мс | 10 алертов {t_alerts:.3f} мс")
+        print(f"Восстановление {len(restored.cooldowns)} cooldown: {t_restore:.1f} мс")
+
+        # Процесс пишет журнал без пауз и убивается SIGKILL в случайный момент
+        path = os.path.join(tmp, 'crash.db')
+        code = _JOURNAL_WRITER.format(root=os.path.dirname(os.path.abspath(__file__)), path=path)
+        rng = random.Random(9)
+        failures, attempts = 0, scaled(20)
+        for attempt in range(attempts):
+            child = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE, text=True)
+            child.stdout.readline()  # Дождаться первой записи
+            time.sleep(rng.uniform(0.01, 0.2))
+            child.send_signal(signal.SIGKILL)
+            printed = [int(line) for line in child.stdout.read().split()]
+            child.wait()
+
+            journal = StateJournal(path)
+            state = journal.restore()
+            integrity = journal._db.execute("PRAGMA integrity_check").fetchone()[0]
+            journal.close()
+            # Закоммиченный скан мог не успеть напечататься - допускаем +1
+            last_printed = printed[-1] if printed else state.scan_counter
+            ok = integrity == 'ok' and state.scan_counter in (last_printed, last_printed + 1) \
+                and state.total_alerts == state.scan_counter * 10
+            failures += not ok
+        print(f"kill -9 посреди записи: {attempts - failures}/{attempts} восстановлений без потерь закоммиченного")
+
+
+def bench_startup():
+    """Время до первого скана: холодный старт (запрос /contract/detail) против старта по кэшу"""
+    import contextlib
+    import io
+    import tempfile
+    from mock_servers import MockMEXCServer
+
+    print("=" * 60)
+    print("БЕНЧМАРК: холодный и тёплый старт до первого скана")
+    print("=" * 60)
+
+    # Задержка ответа ~ как у живого API из другого региона
+    server = MockMEXCServer(contracts=2000, latency=0.3)
+    server.start()
+    config.MEXC_BASE_URL = server.url
+    config.MEXC_FUTURES_URL = ''
+    config.TELEGRAM_BOT_TOKEN = config.TELEGRAM_BOT_TOKEN or "bench"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.CONTRACT_CACHE_PATH = os.path.join(tmp, 'contracts.json')
+        from main import PriceSpreadMonitor
+
+        results = {}
+        for mode in ('холодный', 'тёплый'):
+            with contextlib.redirect_stdout(io.StringIO()):
+                monitor = PriceSpreadMonitor()
+                started = time.perf_counter()
+                monitor.load_symbols()
+                monitor.scan_all_pairs()
+                results[mode] = (time.perf_counter() - started) * 1000
+                monitor.dispatcher.stop(timeout=0)
+            print(f"{mode:9s} старт: {results[mode]:7.0f} мс до первого скана | пар: {len(monitor.symbols)}")
+    server.stop()
+    print(f"Ускорение: x{results['холодный'] / results['тёплый']:.1f} | запросов detail: "
+          f"{server.requests.get('/api/v1/contract/detail', 0)}")
+
+
+def _slow_consumer(snapshot, analyzer):
+    """Читатель с работой на чистом Python (как /top по всем парам): держит GIL своего процесса"""
+    analyzer.analyze_batch(None, snapshot.last, snapshot.fair, idx=snapshot.idx)
+    names = analyzer.symbols.names
+    for _ in range(3):
+        rows = sorted(((names[i], last / fair - 1) for i, last, fair in
+                       zip(snapshot.idx.tolist(), snapshot.last.tolist(), snapshot.fair.tolist()) if fair),
+                      key=lambda row: -abs(row[1]))
+    return json.dumps(rows[:50])
+
+
+def _bus_reader(name, stop, ready, niceness=0):
+    """Процесс-читатель шины с медленной обработкой; niceness - приоритет ниже получателя"""
+    from snapshot_bus import SnapshotBus
+    from symbol_table import SymbolTable
+
+    if niceness:
+        os.nice(niceness)
+    bus = SnapshotBus.attach(name, timeout=10)
+    table = SymbolTable()
+    analyzer = SpreadAnalyzer(symbol_table=table)
+    generation = bus.generation
+    ready.release()
+    while not stop.is_set():
+        frame = bus.wait(generation, timeout=0.5)
+        if frame is not None:
+            generation = frame.generation
+            snapshot = bus.to_snapshot(frame, table)
+            if snapshot is not None:
+                _slow_consumer(snapshot, analyzer)
+    bus.close()
+
+
+def _monolith(url, consumers, duration, interval, conn):
+    """Всё в одном процессе: запросы в главном потоке, читатели - потоки с той же работой"""
+    import threading
+    from mexc_client import MEXCClient
+
+    config.MEXC_BASE_URL, config.MEXC_FUTURES_URL = url, ''
+    client = MEXCClient()
+    latest = [None]
+    stop = threading.Event()
+
+    def reader():
+        analyzer = SpreadAnalyzer(symbol_table=client.symbol_table)
+        seen = None
+        while not stop.is_set():
+            snapshot = latest[0]
+            if snapshot is None or snapshot is seen:
+                time.sleep(0.002)
+                continue
+            seen = snapshot
+            _slow_consumer(snapshot, analyzer)
+
+    for _ in range(consumers):
+        threading.Thread(target=reader, daemon=True).start()
+    samples = []
+    started = next_at = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        fetch_started = time.perf_counter()
+        latest[0] = client.get_price_snapshot()
+        samples.append(time.perf_counter() - fetch_started)
+        next_at += interval
+        time.sleep(max(0.0, next_at - time.perf_counter()))
+    stop.set()
+    conn.send(samples)
+
+
+def bench_bus():
+    """Получение и читатели в одном процессе против процесса-получателя и шины в разделяемой памяти"""
+    import multiprocessing
+    import pickle
+    from mock_servers import MockMEXCServer
+    from snapshot_bus import SnapshotBus, start_fetcher
+    from symbol_table import SymbolTable
+    from ticker_decoder import TickerSnapshot
+
+    print("=" * 60)
+    print("БЕНЧМАРК: шина снимков в разделяемой памяти")
+    print("=" * 60)
+
+    # Стоимость передачи снимка читателю: публикация + чтение (копия слота с проверкой seqlock) против pickle (Queue/Pipe)
+    count = scaled(50000)
+    table = SymbolTable()
+    data = make_price_data(count)
+    snapshot = TickerSnapshot.from_price_data(data, table)
+    name = f"bench_bus_{os.getpid()}"
+    bus = SnapshotBus.create(name, capacity=count)
+    reader = SnapshotBus.attach(name)
+    reader_table = SymbolTable()
+    t_publish = timeit(lambda: bus.publish(snapshot, table.names), repeat=50)
+    t_read = timeit(lambda: reader.to_snapshot(reader.latest(), reader_table), repeat=50)
+    columns = (snapshot.idx, snapshot.last, snapshot.fair, snapshot.exchange_ts)
+    t_pickle = timeit(lambda: pickle.loads(pickle.dumps(columns, protocol=pickle.HIGHEST_PROTOCOL)), repeat=50)
+    reader.close()
+    bus.close()
+    print(f"{count} пар: публикация {t_publish:.3f} мс | чтение читателем {t_read:.3f} мс "
+          f"| pickle каждому читателю {t_pickle:.3f} мс")
+
+    # Задержка запроса тикеров, пока читатели заняты медленной обработкой на чистом Python
+    contracts, duration, interval = scaled(20000), max(2.0, 8.0 * SCALE), 0.25
+    server = MockMEXCServer(contracts=contracts, seed=3)
+    server.start()
+    config.MEXC_BASE_URL, config.MEXC_FUTURES_URL = server.url, ''
+    config.SCAN_INTERVAL, config.PACING_POLICY = interval, 'fixed'
+    config.EVENT_LOG_PATH, config.EVENT_LOG_CONSOLE = '', False
+    context = multiprocessing.get_context('spawn')
+
+    def percentiles(samples):
+        samples = sorted(samples)
+        return samples[len(samples) // 2] * 1000, samples[int(len(samples) * 0.99)] * 1000
+
+    # На одном ядре процессы не работают параллельно - читатели шины получают nice 10, получатель важнее
+    print(f"{contracts} пар, запрос каждые {interval} сек, читатель ~ сортировка всех пар на Python, "
+          f"ядер: {os.cpu_count()}")
+    for consumers in (0, 1, 4):
+        conn, child_conn = context.Pipe()
+        process = context.Process(target=_monolith, args=(server.url, consumers, duration, interval, child_conn))
+        before = server.requests.get('/api/v1/contract/ticker', 0)
+        process.start()
+        samples = conn.recv()
+        process.join()
+        requests_one = server.requests.get('/api/v1/contract/ticker', 0) - before
+        p50, p99 = percentiles(samples)
+        print(f"  один процесс, читателей {consumers}: запрос p50 {p50:6.1f} мс | p99 {p99:6.1f} мс | "
+              f"запросов {requests_one}")
+
+        name = f"bench_bus_{os.getpid()}_{consumers}"
+        fetcher, stop_fetcher = start_fetcher(name)
+        stop, ready = context.Event(), context.Semaphore(0)
+        readers = [context.Process(target=_bus_reader, args=(name, stop, ready, 10)) for _ in range(consumers)]
+        for process in readers:
+            process.start()
+        for _ in readers:
+            ready.acquire()  # Импорты и подключение читателей не попадают в замер
+        bus = SnapshotBus.attach(name, timeout=10)
+        before = server.requests.get('/api/v1/contract/ticker', 0)
+        samples, generation = [], bus.generation
+        started = time.perf_counter()
+        while time.perf_counter() - started < duration:
+            frame = bus.wait(generation, timeout=1.0)
+            if frame is not None:
+                generation = frame.generation
+                samples.append(frame.fetch_seconds)
+        requests_bus = server.requests.get('/api/v1/contract/ticker', 0) - before
+        stop.set()
+        stop_fetcher.set()
+        for process in readers + [fetcher]:
+            process.join(timeout=10)
+        bus.close()
+        p50, p99 = percentiles(samples)
+        print(f"  шина,         читателей {consumers}: запрос p50 {p50:6.1f} мс | p99 {p99:6.1f} мс | "
+              f"запросов {requests_bus}")
+    server.stop()
+
+
+BENCHMARKS = {
+    'batch': bench_batch,
+    'delta': bench_delta,
+    'top': bench_top,
+    'subscriptions': bench_subscriptions,
+    'dispatch': bench_dispatch,
+    'confirm': bench_confirm,
+    'bus': bench_bus,
+    'coalesce': bench_coalesce,
+    'decode': bench_decode,
+    'rules': bench_rules,
+    'replay': bench_replay,
+    'metrics': bench_metrics,
+    'log': bench_log,
+    'startup': bench_startup,
+    'hedge': bench_hedge,
+    'venues': bench_venues,
+    'stream': bench_stream,
+    'journal': bench_journal,
+}
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(BENCHMARKS)
+    for name in selected:
+        BENCHMARKS[name]()
+        print()
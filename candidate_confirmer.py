@@ -0,0 +1,156 @@
+"""
+Подтверждение кандидатов в алерты по эндпоинтам отдельной пары перед отправкой
+У тонких контрактов массовый /contract/ticker отдаёт устаревший lastPrice - одиночный выброс
+превращается в ложный алерт. Кандидаты скана перепроверяются все сразу: /contract/ticker?symbol=
+и /contract/fair_price/{symbol} параллельно в ограниченном пуле на keep-alive соединениях,
+с общим дедлайном - подтверждение добавляет не больше одного round-trip, сколько бы пар ни сработало
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from event_log import events
+import metrics
+import config
+
+
+class CandidateConfirmer:
+    def __init__(self, base_url: Optional[str] = None, workers: Optional[int] = None,
+                 timeout: Optional[float] = None, max_candidates: Optional[int] = None,
+                 on_timeout: Optional[str] = None):
+        """
+        workers - потоков и keep-alive соединений (на пару - два запроса)
+        timeout - общий дедлайн подтверждения скана (сек)
+        max_candidates - больше пар за скан не перепроверяется (по убыванию |спреда|)
+        on_timeout - что делать с парой без ответа к дедлайну: "drop" (повтор позже) или "send"
+        """
+        self.base_url = (base_url or config.MEXC_BASE_URL).rstrip('/')
+        self.workers = config.CONFIRM_WORKERS if workers is None else workers
+        self.timeout = config.CONFIRM_TIMEOUT if timeout is None else timeout
+        self.max_candidates = config.CONFIRM_MAX_CANDIDATES if max_candidates is None else max_candidates
+        self.on_timeout = config.CONFIRM_ON_TIMEOUT if on_timeout is None else on_timeout
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="confirm")
+
+        self.confirmed = 0
+        self.rejected = 0
+        self.unanswered = 0  # Не успели к дедлайну или ошибка запроса
+
+    def _get(self, path: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """data из ответа MEXC или None (ошибка, не 200, success=false)"""
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        if response.status_code != 200:
+            return None
+        body = response.json()
+        return body.get('data') if body.get('success') else None
+
+    def warm(self):
+        """Открыть соединения заранее: первое подтверждение не платит за TCP/TLS рукопожатие"""
+        def ping():
+            try:
+                self.session.get(f"{self.base_url}/api/v1/contract/ping", timeout=self.timeout).content
+            except requests.exceptions.RequestException:
+                pass
+
+        for _ in range(min(self.workers, 2 * self.max_candidates)):
+            self._pool.submit(ping)
+
+    @staticmethod
+    def recheck(alert_data: Dict, ticker: Dict, fair_data: Dict) -> Optional[Tuple[float, float, float]]:
+        """
+        Свежие (last, fair, спред %) пары, None - данных нет
+        Спред берётся по худшей из цен last и исполнимой стороны стакана (bid1 для last выше fair,
+        ask1 для ниже): устаревший lastPrice без сделок стаканом не подтверждается
+        """
+        try:
+            last = float(ticker['lastPrice'])
+            fair = float(fair_data.get('fairPrice') or ticker['fairPrice'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        if last <= 0 or fair <= 0:
+            return None
+        spread = (last - fair) / fair * 100
+        book = ticker.get('bid1') if alert_data['spread_percent'] > 0 else ticker.get('ask1')
+        if book:
+            book_spread = (float(book) - fair) / fair * 100
+            spread = min(spread, book_spread, key=abs)
+        return last, fair, spread
+
+    def confirm(self, alerts: List[Dict], min_spread: float) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Перепроверить алерты скана. Возвращает (подтверждённые со свежими ценами, отклонённые)
+        Подтверждён - |свежий спред| не ниже min_spread и того же знака, что в массовом тикере
+        """
+        if not alerts:
+            return [], []
+        started = time.perf_counter()
+        ordered = sorted(alerts, key=lambda a: -abs(a['spread_percent']))
+        checked, overflow = ordered[:self.max_candidates], ordered[self.max_candidates:]
+
+        requests_by_symbol = {}
+        for alert_data in checked:
+            symbol = alert_data['symbol']
+            requests_by_symbol[symbol] = (
+                self._pool.submit(self._get, '/api/v1/contract/ticker', {'symbol': symbol}),
+                self._pool.submit(self._get, f'/api/v1/contract/fair_price/{symbol}'),
+            )
+        # Один общий дедлайн на все пары: задержка скана не растёт с числом кандидатов
+        done, _ = wait([f for pair in requests_by_symbol.values() for f in pair], timeout=self.timeout)
+
+        confirmed, rejected = [], []
+        for alert_data in checked:
+            ticker_future, fair_future = requests_by_symbol[alert_data['symbol']]
+            fresh = None
+            if ticker_future in done and fair_future in done \
+                    and ticker_future.exception() is None and fair_future.exception() is None \
+                    and ticker_future.result() and fair_future.result():
+                fresh = self.recheck(alert_data, ticker_future.result(), fair_future.result())
+            else:
+                # Не дождавшиеся запросы дочитаются в пуле, результат не нужен
+                ticker_future.cancel()
+                fair_future.cancel()
+
+            if fresh is None:
+                self._unanswered(alert_data, confirmed, rejected)
+                continue
+            last, fair, spread = fresh
+            if abs(spread) >= min_spread and (spread > 0) == (alert_data['spread_percent'] > 0):
+                alert_data.update(last_price=last, fair_price=fair, spread_percent=spread,
+                                  direction='выше' if spread > 0 else 'ниже')
+                confirmed.append(alert_data)
+                self.confirmed += 1
+            else:
+                events.emit('alert_unconfirmed', symbol=alert_data['symbol'], reason='stale',
+                            spread_percent=alert_data['spread_percent'], fresh_spread=spread)
+                rejected.append(alert_data)
+                self.rejected += 1
+                metrics.CONFIRM_REJECTED.inc()
+
+        for alert_data in overflow:
+            self._unanswered(alert_data, confirmed, rejected)
+        metrics.CONFIRM_SECONDS.observe(time.perf_counter() - started)
+        return confirmed, rejected
+
+    def _unanswered(self, alert_data: Dict, confirmed: List[Dict], rejected: List[Dict]):
+        self.unanswered += 1
+        metrics.CONFIRM_UNANSWERED.inc()
+        if self.on_timeout == 'send':
+            confirmed.append(alert_data)
+            return
+        events.emit('alert_unconfirmed', symbol=alert_data['symbol'], reason='timeout',
+                    spread_percent=alert_data['spread_percent'], fresh_spread=None)
+        rejected.append(alert_data)
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        self.session.close()
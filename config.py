@@ -15,15 +15,139 @@ TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = "-1003582014728"
 TELEGRAM_TOPIC_ID = "4"
 
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org')
+
 # MEXC API настройки
 MEXC_BASE_URL = "https://contract.mexc.com"
 MEXC_FUTURES_URL = "https://futures.mexc.com"
+MEXC_WS_URL = "wss://contract.mexc.com/edge"
 
 # Параметры мониторинга
 MIN_SPREAD_PERCENT = 10.0  # Минимальный процент разницы для уведомления
 SCAN_INTERVAL = 1  # Интервал между сканированиями в секундах (быстро, но без спама API)
 ALERT_COOLDOWN = 300  # Пауза между повторными алертами для одной пары (5 минут, или +5% спред)
+ALERT_ESCALATION_PERCENT = 5.0  # Повторный алерт в cooldown, если спред вырос на столько процентов
+
+# Подтверждение кандидатов по эндпоинтам отдельной пары (/contract/ticker?symbol=, /contract/fair_price)
+CONFIRM_CANDIDATES = os.getenv('CONFIRM_CANDIDATES', '1') == '1'  # Перепроверять алерты перед отправкой
+CONFIRM_TIMEOUT = 1.0  # Общий дедлайн подтверждения скана (сек)
+CONFIRM_WORKERS = 16  # Параллельных запросов и keep-alive соединений (два запроса на пару)
+CONFIRM_MAX_CANDIDATES = 8  # Больше пар за скан не перепроверяется (по убыванию спреда)
+CONFIRM_ON_TIMEOUT = 'drop'  # Пара без ответа к дедлайну: "drop" - повтор позже, "send" - отправить как есть
+CONFIRM_RETRY_DELAY = 10  # Не подтвердившаяся пара перепроверяется не раньше (или при росте спреда на ALERT_ESCALATION_PERCENT)
+
+# Правила алертов по полям тикера (index, funding, volume, bid/ask...): файл JSON, перечитывается на ходу
+ALERT_RULES_PATH = os.getenv('ALERT_RULES_PATH', 'alert_rules.json')  # Пусто или нет файла - только спред
+ALERT_RULES_CHECK_INTERVAL = 2  # Как часто проверять, изменился ли файл правил (сек)
+ALERT_RULES_MAX_PER_SCAN = 10  # Больше алертов одного правила за скан не уходит (остальные - следующими сканами)
+
+# Цены той же пары на других биржах: межбиржевой спред (режим rest, правила "last vs binance > 2%")
+VENUES = [v.strip() for v in os.getenv('VENUES', '').split(',') if v.strip()]  # binance, bybit, okx; пусто - только MEXC
+VENUE_URLS = {}  # Имя биржи -> адрес API, если нужен не публичный (заглушка, прокси)
+VENUE_SYMBOL_OVERRIDES = {}  # Имя биржи -> {символ биржи: символ MEXC}, когда имена расходятся
+VENUE_DEADLINE = 0.8  # Общий дедлайн скана для бирж (сек от начала скана); не успевшая применится в следующем
+VENUE_MAX_AGE = 5  # Цены биржи старше этого в спредах не участвуют (сек)
+CROSS_VENUE_MIN_SPREAD = 2.0  # Встроенное правило "abs(last vs биржа) >= N%" на каждую биржу (0 - только правила из файла)
+CROSS_VENUE_COOLDOWN = 300  # Пауза между межбиржевыми алертами по одной паре (сек)
+
+# Фильтры устойчивости спреда (отсекают одиночные "выбросы" цены)
+ALERT_MIN_CONSECUTIVE_SCANS = 1  # Спред выше порога столько сканов подряд (1 - алерт с первого скана)
+ALERT_MIN_DURATION = 0  # Спред выше порога не меньше стольких секунд (0 - выключено)
+ALERT_USE_EWMA = False  # Требовать, чтобы и сглаженный (EWMA) спред был выше порога
+SPREAD_EWMA_ALPHA = 0.3  # Вес новой точки в EWMA спреда
+HISTORY_WINDOW = 60  # Сколько последних точек (timestamp, last, fair) хранить на пару
+
+# Темп сканирования: "fixed" - ровно SCAN_INTERVAL, "adaptive" - быстрее у порога, медленнее при 429/5xx
+PACING_POLICY = os.getenv('PACING_POLICY', 'adaptive')
+PACING_FAST_INTERVAL = 0.5  # Интервал, пока есть спреды около порога (сек)
+PACING_NEAR_RATIO = 0.8  # "Около порога" = макс. спред >= MIN_SPREAD_PERCENT * 0.8
+PACING_MAX_INTERVAL = 30  # Максимальный интервал при отступе из-за ошибок биржи (сек)
 
 # Параметры запросов
 REQUEST_TIMEOUT = 10  # Таймаут для HTTP запросов
-MAX_RETRIES = 3  # Максимальное количество попыток при ошибке
+# Хеджирование запросов к MEXC_BASE_URL / MEXC_FUTURES_URL
+HEDGE_QUANTILE = 0.9  # Дублировать запрос, если ответа нет дольше этого квантиля задержек хоста
+HEDGE_EWMA_FACTOR = 3  # Пока замеров меньше 20: дублировать через EWMA задержки x это число
+HEDGE_DEFAULT_DELAY = 0.5  # Через сколько дублировать запрос, пока нет ни одного замера (сек)
+HEDGE_MIN_DELAY = 0.05  # Не дублировать раньше этого, даже если квантиль меньше (сек)
+HEDGE_LATENCY_ALPHA = 0.2  # Вес нового замера в EWMA задержки хоста
+HEDGE_POOL_SIZE = 2  # Keep-alive соединений на хост
+CIRCUIT_FAILURES = 3  # Ошибок подряд, после которых хост выключается
+CIRCUIT_COOLDOWN = 30  # На сколько выключается хост (сек)
+# Потоковый разбор ответа тикеров (режим rest): пары анализируются по мере загрузки, а не после неё
+STREAM_PARSE = os.getenv('STREAM_PARSE', '1') == '1'
+STREAM_PARSE_CHUNK_SIZE = 32 * 1024  # Размер куска при чтении ответа (байт): меньше - раньше первые пары, больше - меньше проходов regex
+
+# Рантайм: "async" - один цикл asyncio (сканирование + отправка + команды бота), "sync" - простой цикл без бота
+RUNTIME = os.getenv('RUNTIME', 'async')
+TELEGRAM_BOT_COMMANDS = os.getenv('TELEGRAM_BOT_COMMANDS', '1') == '1'  # Обслуживать /start /status /stats
+
+# Режим получения данных: "rest" - опрос /api/v1/contract/ticker, "ws" - push-канал тикеров,
+# "bus" - снимки из разделяемой памяти, опрос биржи в отдельном процессе (snapshot_bus.py)
+INGESTION_MODE = os.getenv('INGESTION_MODE', 'rest')
+
+# Шина снимков в разделяемой памяти (INGESTION_MODE=bus)
+SNAPSHOT_BUS_NAME = os.getenv('SNAPSHOT_BUS_NAME', 'mexc_snapshots')  # Имя сегмента shared_memory
+SNAPSHOT_BUS_EXTERNAL = os.getenv('SNAPSHOT_BUS_EXTERNAL', '0') == '1'  # Получатель запущен отдельно (python snapshot_bus.py fetch)
+SNAPSHOT_BUS_CAPACITY = 100000  # Максимум пар в снимке
+SNAPSHOT_BUS_SLOTS = 4  # Слотов в кольце: столько снимков читатель может отстать, пока его представления целы
+SNAPSHOT_BUS_NAMES_BYTES = 4 * 1024 * 1024  # Блок имён пар (только дозапись)
+SNAPSHOT_BUS_POLL_INTERVAL = 0.002  # Как часто читатель проверяет поколение шины (сек)
+
+# Параметры WebSocket потока
+STREAM_PING_INTERVAL = 15  # Интервал ping для удержания соединения (сек)
+STREAM_GAP_THRESHOLD = 3.0  # Пауза между push дольше этого считается пропуском (сек) -> ресинхронизация через REST
+STREAM_STALE_TIMEOUT = 10.0  # Нет сообщений дольше этого - поток "протух", переподключаемся (сек)
+STREAM_RECONNECT_MAX_DELAY = 30  # Максимальная задержка между переподключениями (сек)
+STREAM_RECORD_PATH = os.getenv('STREAM_RECORD_PATH')  # Файл для записи сырых кадров (для replay-сервера)
+
+# Очередь отправки алертов в Telegram
+ALERT_QUEUE_SIZE = 100  # Максимум алертов в очереди; при переполнении выбрасывается наименьший спред
+TELEGRAM_GLOBAL_RATE = 30  # Лимит Bot API: сообщений в секунду на бота
+TELEGRAM_CHAT_RATE = 20 / 60  # Лимит на один групповой чат: 20 сообщений в минуту
+TELEGRAM_CHAT_BURST = 3  # Сколько сообщений в чат можно отправить подряд без ожидания
+TELEGRAM_MAX_RETRIES = 3  # Повторные попытки при 429/5xx/сетевой ошибке
+TELEGRAM_POOL_SIZE = 4  # Keep-alive соединений к api.telegram.org
+
+# Жизненный цикл алертов: дайджест на скан, правка открытого сообщения вместо нового, "спред вернулся"
+ALERT_LIFECYCLE = os.getenv('ALERT_LIFECYCLE', '1') == '1'
+ALERT_EDIT_INTERVAL = 5  # Не чаще одной правки сообщения за столько секунд (обновления копятся)
+ALERT_RESOLVE_RATIO = 0.5  # Пара закрыта, когда |спред| < порог подписки * ALERT_RESOLVE_RATIO
+ALERT_MESSAGE_TTL = 3600  # Сообщение старше этого не правится - следующий алерт уйдёт новым (сек)
+
+# Запись снимков тикеров для replay/подбора параметров (python snapshot_recorder.py sweep ...)
+SNAPSHOT_RECORD_PATH = os.getenv('SNAPSHOT_RECORD_PATH')  # Пусто - запись выключена
+
+# Кэш списка контрактов: быстрый старт без ожидания /contract/detail, обновление в фоне
+CONTRACT_CACHE_PATH = os.getenv('CONTRACT_CACHE_PATH', 'contracts_cache.json')  # Пусто - без кэша
+CONTRACT_REFRESH_INTERVAL = 600  # Как часто перечитывать список контрактов (сек)
+
+# Подписки чатов/тем на алерты (пороги, стороны, списки пар); при первом запуске - TELEGRAM_CHAT_ID
+SUBSCRIPTIONS_PATH = os.getenv('SUBSCRIPTIONS_PATH', 'subscriptions.json')
+# Кто может менять подписки командами: админы (user id) из любого чата и любой участник разрешённых чатов
+TELEGRAM_ADMIN_IDS = {int(v) for v in os.getenv('TELEGRAM_ADMIN_IDS', '').split(',') if v.strip()}
+TELEGRAM_ALLOWED_CHATS = {int(v) for v in (os.getenv('TELEGRAM_ALLOWED_CHATS') or TELEGRAM_CHAT_ID or '').split(',')
+                          if v.strip()}  # По умолчанию - TELEGRAM_CHAT_ID
+# Пороги подписок из команд не ниже этих: самый мягкий порог подписки становится порогом анализатора
+SUBSCRIPTION_MIN_SPREAD = 1.0  # %
+SUBSCRIPTION_MIN_COOLDOWN = 10  # сек
+
+# Журнал состояния (cooldown и счётчики) для перезапуска без повторных алертов; пусто - выключен
+STATE_JOURNAL_PATH = os.getenv('STATE_JOURNAL_PATH', 'state_journal.db')
+JOURNAL_COMPACT_INTERVAL = 3600  # Как часто чистить истёкшие записи и усекать WAL (сек)
+
+# Команды /top и /symbol
+TOP_DEFAULT = 10  # Сколько пар показывает /top без аргумента
+TOP_MAX = 50  # Больше не помещается в одно сообщение Telegram
+
+# Журнал событий скана и отправки (JSON-lines); пусто - только консоль
+EVENT_LOG_PATH = os.getenv('EVENT_LOG_PATH', 'events.jsonl')
+EVENT_LOG_MAX_BYTES = 50 * 1024 * 1024  # Размер файла, после которого он ротируется
+EVENT_LOG_BACKUPS = 5  # Сколько старых файлов хранить (events.jsonl.1 ... .5)
+EVENT_LOG_CONSOLE = os.getenv('EVENT_LOG_CONSOLE', '1') == '1'  # Дублировать события в консоль в читаемом виде
+EVENT_LOG_FLUSH_INTERVAL = 0.2  # Как часто фоновый поток сбрасывает накопленные события (сек)
+EVENT_LOG_QUEUE_SIZE = 100000  # Максимум событий в очереди; при переполнении теряются самые старые
+
+# Метрики в формате Prometheus (0 - эндпоинт выключен)
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
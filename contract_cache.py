@@ -0,0 +1,94 @@
+"""
+Кэш описаний контрактов MEXC на диске
+Старт идёт сразу по кэшу, свежий список /contract/detail подтягивается в фоне,
+а разница (новые листинги / делистинги) применяется к состоянию монитора на месте
+"""
+import json
+import os
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import config
+
+# Состояния контракта MEXC: 0 - торгуется, 1 - поставка, 2 - завершён, 3 - снят, 4 - пауза
+INACTIVE_STATES = (2, 3)
+
+
+class ContractInfo(NamedTuple):
+    symbol: str
+    tick_size: float  # Шаг цены (priceUnit)
+    state: int
+    listed_at: int  # Время открытия торгов (ms, 0 - неизвестно)
+
+    @classmethod
+    def from_api(cls, contract: Dict) -> 'ContractInfo':
+        return cls(
+            symbol=contract['symbol'],
+            tick_size=float(contract.get('priceUnit') or 0),
+            state=int(contract.get('state') or 0),
+            listed_at=int(contract.get('openingTime') or contract.get('createTime') or 0)
+        )
+
+    @property
+    def active(self) -> bool:
+        return self.state not in INACTIVE_STATES
+
+
+class ContractCache:
+    def __init__(self, path: Optional[str] = None):
+        self.path = config.CONTRACT_CACHE_PATH if path is None else path
+        self.contracts: Dict[str, ContractInfo] = {}
+        self.saved_at = 0.0
+
+    @property
+    def symbols(self) -> List[str]:
+        """Торгуемые символы в порядке кэша"""
+        return [c.symbol for c in self.contracts.values() if c.active]
+
+    @property
+    def age(self) -> float:
+        """Сколько секунд назад кэш обновлялся (inf - ещё ни разу)"""
+        return time.time() - self.saved_at if self.saved_at else float('inf')
+
+    def load(self) -> bool:
+        """Прочитать кэш с диска. False - кэша нет или он повреждён"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            contracts = [ContractInfo(*row) for row in data['contracts']]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠️ Кэш контрактов {self.path} не прочитан: {e}")
+            return False
+        self.contracts = {c.symbol: c for c in contracts}
+        self.saved_at = float(data.get('saved_at', 0))
+        return bool(self.contracts)
+
+    def save(self):
+        """Записать кэш атомарно (временный файл + replace): обрыв записи не портит старый кэш"""
+        if not self.path:
+            return
+        data = {'saved_at': self.saved_at, 'contracts': [list(c) for c in self.contracts.values()]}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+
+    def update(self, details: Iterable[Dict]) -> Tuple[List[str], List[str]]:
+        """
+        Заменить содержимое свежим ответом /contract/detail
+        Возвращает (добавленные, удалённые) торгуемые символы относительно прежнего списка
+        """
+        previous = set(self.symbols)
+        self.contracts = {}
+        for contract in details:
+            info = ContractInfo.from_api(contract)
+            self.contracts[info.symbol] = info
+        self.saved_at = time.time()
+
+        current = self.symbols
+        current_set = set(current)
+        added = [s for s in current if s not in previous]
+        removed = sorted(previous - current_set)
+        return added, removed
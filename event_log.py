@@ -0,0 +1,205 @@
+"""
+Журнал событий скана и отправки алертов: структурированные записи вместо print
+Событие - кортеж (время, имя, поля) в deque: без форматирования и ввода-вывода в потоке скана.
+Фоновый поток забирает записи пачками, пишет JSON-lines с ротацией по размеру
+и, если включено, печатает их в консоль в прежнем виде
+"""
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, TextIO, Tuple
+
+import config
+
+Record = Tuple[float, str, Dict]
+
+
+def _clock(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%H:%M:%S")
+
+
+def _scan(ts: float, f: Dict) -> Optional[str]:
+    head = f"[{_clock(ts)}] Скан #{f['scan']}: ✅ {f['pairs']} пар (изменилось {f['changed']}) | "
+    if f['alerts']:
+        return head + f"🔔 АЛЕРТОВ: {f['alerts']} | Всего: {f['total']}"
+    # Без алертов в консоль идёт только каждое 10-е сканирование (в файл - все)
+    if f['scan'] % 10 == 0:
+        return head + f"Макс спред: {f['max_spread']:.2f}% ({f['max_pair']}) | {f['hz']:.2f}/{f['target_hz']:.2f} Гц"
+    return None
+
+
+def _spread_alert(ts: float, f: Dict) -> str:
+    line = '=' * 70
+    return (f"\n{line}\n"
+            f"🚨 СПРЕД ОБНАРУЖЕН: {f['symbol']}\n"
+            f"{line}\n"
+            f"💰 Последняя цена:    {f['last_price']:12.6f}\n"
+            f"⚖️  Справедливая цена: {f['fair_price']:12.6f}\n"
+            f"📈 Разница:           {f['spread_percent']:+6.2f}% ({f['direction']} справедливой)\n"
+            f"⏰ Время обнаружения: {_clock(ts)}\n"
+            f"{line}\n")
+
+
+def _alert_retry(ts: float, f: Dict) -> str:
+    if f['status'] is None:
+        return f"⚠️ Ошибка отправки в Telegram ({f['symbol']}): {f['error']}"
+    return f"⚠️ Telegram {f['status']} ({f['symbol']}), повтор"
+
+
+# Имя события -> строка для консоли (None - событие в консоль не выводится)
+CONSOLE_FORMATS: Dict[str, Callable[[float, Dict], Optional[str]]] = {
+    'scan': _scan,
+    'scan_failed': lambda ts, f: f"[{_clock(ts)}] ❌ Ошибка получения данных",
+    'scan_error': lambda ts, f: f"[{_clock(ts)}] ❌ Ошибка сканирования ({f['stage']}): {f['error']}",
+    'spread_alert': _spread_alert,
+    'spread_escalated': lambda ts, f: (f"   💡 {f['symbol']}: Спред вырос на {f['current'] - f['previous']:.2f}% "
+                                       f"(было {f['previous']:.2f}%, стало {f['current']:.2f}%)"),
+    'alert_unconfirmed': lambda ts, f: (
+        f"🚫 {f['symbol']}: спред {f['spread_percent']:+.2f}% не подтвердился "
+        + (f"(по паре {f['fresh_spread']:+.2f}%)" if f['fresh_spread'] is not None else "(нет ответа к дедлайну)")),
+    'rule_alert': lambda ts, f: (f"📐 {f['symbol']}: правило {f['rule']} ({f['when']}) | "
+                                 + ", ".join(f"{k}={v:.6g}" for k, v in f['values'].items())),
+    'rules_loaded': lambda ts, f: (f"📐 Правила алертов ({f['path']}): {f['rules']} - {', '.join(f['names']) or 'нет'}"
+                                   + (f" | поля: {', '.join(f['fields'])}" if f['fields'] else "")),
+    'rules_error': lambda ts, f: f"❌ Правила алертов не применены, остаются прежние: {f['error']}",
+    'alert_sent': lambda ts, f: (f"✏️ Алерт обновлён для {f['symbol']}" if f.get('method') == 'editMessageText'
+                                 else f"✅ Алерт отправлен для {f['symbol']}"),
+    'alert_retry': _alert_retry,
+    'alert_throttled': lambda ts, f: f"⏳ Telegram 429: пауза {f['retry_after']:.0f} сек для чата {f['chat_id']}",
+    'alert_gave_up': lambda ts, f: f"❌ Алерт {f['symbol']} не отправлен после {f['attempts']} попыток",
+    'alert_rejected': lambda ts, f: f"❌ Ошибка отправки в Telegram: {f['status']}\n🔍 Детали ошибки: {f['detail']}",
+    'alert_error': lambda ts, f: f"❌ Неожиданная ошибка отправки: {f['error']}",
+    'request_rate_limited': lambda ts, f: f"⚠️ MEXC 429: превышен лимит запросов (Retry-After: {f['retry_after']})",
+    'request_failed': lambda ts, f: f"⚠️ Ошибка запроса {f['endpoint']}: {f['error']}",
+    'bus_overrun': lambda ts, f: (f"⚠️ Снимок #{f['generation']} перезаписан во время чтения и пропущен "
+                                  f"(читатель отстал на {f['slots']} интервалов получателя)"),
+    'host_disabled': lambda ts, f: (f"🔌 {f['url']}: {f['failures']} ошибок подряд, "
+                                    f"хост выключен на {f['cooldown']} сек"),
+}
+
+
+def format_console(record: Record) -> Optional[str]:
+    ts, event, fields = record
+    formatter = CONSOLE_FORMATS.get(event)
+    if formatter is None:
+        return f"[{_clock(ts)}] {event} " + ' '.join(f"{k}={v}" for k, v in fields.items())
+    return formatter(ts, fields)
+
+
+class EventLog:
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None,
+                 backups: Optional[int] = None, console: Optional[bool] = None,
+                 flush_interval: Optional[float] = None, queue_size: Optional[int] = None,
+                 stream: Optional[TextIO] = None):
+        """
+        path - файл JSON-lines (пусто - только консоль)
+        max_bytes/backups - ротация: events.jsonl -> events.jsonl.1 ... .backups
+        console - печатать события в консоль в читаемом виде
+        queue_size - максимум записей в очереди; при переполнении теряются самые старые
+        """
+        self.path = config.EVENT_LOG_PATH if path is None else path
+        self.max_bytes = config.EVENT_LOG_MAX_BYTES if max_bytes is None else max_bytes
+        self.backups = config.EVENT_LOG_BACKUPS if backups is None else backups
+        self.console = config.EVENT_LOG_CONSOLE if console is None else console
+        self.flush_interval = config.EVENT_LOG_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.stream = stream
+
+        # append/popleft у deque атомарны - поток скана не берёт блокировку
+        self._queue: deque = deque(maxlen=config.EVENT_LOG_QUEUE_SIZE if queue_size is None else queue_size)
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._file = None
+        self._size = 0
+        self.is_running = False
+        self.written = 0
+
+    def emit(self, event: str, **fields):
+        """Записать событие (из любого потока). Сериализация и вывод - в фоновом потоке"""
+        self._queue.append((time.time(), event, fields))
+
+    def start(self):
+        if self.is_running:
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._writer, name="event-log", daemon=True)
+        self._thread.start()
+
+    def _writer(self):
+        while self.is_running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                sys.stderr.write(f"❌ Ошибка записи журнала событий: {e}\n")
+
+    def _drain(self) -> List[Record]:
+        queue = self._queue
+        records = []
+        try:
+            while True:
+                records.append(queue.popleft())
+        except IndexError:
+            return records
+
+    def flush(self):
+        """Записать всё накопленное одной пачкой"""
+        with self._flush_lock:
+            records = self._drain()
+            if not records:
+                return
+            if self.path:
+                lines = ''.join(
+                    json.dumps({'ts': round(ts, 3), 'event': event, **fields}, ensure_ascii=False, default=str) + '\n'
+                    for ts, event, fields in records)
+                self._write(lines)
+            if self.console:
+                text = [line for line in map(format_console, records) if line is not None]
+                if text:
+                    stream = self.stream or sys.stdout
+                    stream.write('\n'.join(text) + '\n')
+                    stream.flush()
+            self.written += len(records)
+
+    def _write(self, lines: str):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+            self._size = self._file.tell()
+        self._file.write(lines)
+        self._file.flush()
+        self._size += len(lines.encode('utf-8'))
+        if self.max_bytes and self._size >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        """events.jsonl -> .1, .1 -> .2, ...; самый старый файл удаляется"""
+        self._file.close()
+        self._file = None
+        if self.backups > 0:
+            for i in range(self.backups - 1, 0, -1):
+                if os.path.exists(f"{self.path}.{i}"):
+                    os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def stop(self, timeout: float = 2.0):
+        """Остановить поток и дописать очередь"""
+        self.is_running = False
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# Общий журнал процесса: модули пишут в него, main/runtime запускают и останавливают
+events = EventLog()
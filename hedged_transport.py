@@ -0,0 +1,248 @@
+"""
+HTTP транспорт к нескольким хостам MEXC с хеджированием запросов
+Запрос уходит на самый быстрый хост; если заголовков ответа нет дольше квантиля HEDGE_QUANTILE его задержек, дублируется
+на следующий - берётся первый успешный ответ, второй закрывается, не дочитывая тело. Ошибка одного хоста
+сразу переводит запрос на другой (без sleep), а хост с серией ошибок выключается на время
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from event_log import events
+import metrics
+import config
+
+
+class Endpoint:
+    """Один хост: своя сессия keep-alive, статистика задержек и состояние circuit breaker"""
+
+    __slots__ = ('url', 'session', 'latency_ewma', 'samples', 'failures', 'open_until', 'requests', 'wins',
+                 'inflight')
+
+    def __init__(self, url: str, pool_size: int):
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+            'Accept-Encoding': 'gzip, deflate'  # Сжатый ответ тикеров в разы короче по сети
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.latency_ewma: Optional[float] = None
+        self.samples = deque(maxlen=200)  # Последние задержки успешных ответов, сек
+        self.failures = 0  # Ошибок подряд
+        self.open_until = 0.0  # Circuit breaker: до этого времени хост не используется
+        self.requests = 0
+        self.wins = 0  # Сколько раз ответ этого хоста был принят
+        self.inflight = 0  # Запросов в пуле (вместе с проигравшими, которые ещё ждут заголовков)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < 20:
+            return None
+        ordered = sorted(self.samples.copy())
+        return ordered[int(q * (len(ordered) - 1))]
+
+    def p95(self) -> Optional[float]:
+        return self.quantile(0.95)
+
+    def record_success(self, elapsed: float, alpha: float):
+        self.samples.append(elapsed)
+        self.latency_ewma = elapsed if self.latency_ewma is None else alpha * elapsed + (1 - alpha) * self.latency_ewma
+        self.failures = 0
+        self.open_until = 0.0
+
+
+class HedgedTransport:
+    def __init__(self, urls: Optional[Sequence[str]] = None, timeout: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        urls - хосты в порядке предпочтения (по умолчанию MEXC_BASE_URL и MEXC_FUTURES_URL)
+        """
+        if urls is None:
+            urls = [config.MEXC_BASE_URL, config.MEXC_FUTURES_URL]
+        unique = list(dict.fromkeys(u for u in urls if u))
+        self.endpoints = [Endpoint(url, config.HEDGE_POOL_SIZE) for url in unique]
+        self.timeout = config.REQUEST_TIMEOUT if timeout is None else timeout
+        self.clock = clock
+        self._lock = threading.Lock()
+        # Потоков - по числу соединений каждого хоста: хост, завис до таймаута, занимает только свою долю пула
+        # (хедж на хост, у которого заняты все HEDGE_POOL_SIZE, не запускается - см. _available)
+        self._pool = ThreadPoolExecutor(max_workers=config.HEDGE_POOL_SIZE * len(self.endpoints),
+                                        thread_name_prefix="mexc-http")
+
+        self.hedges = 0  # Сколько раз запрос продублирован на второй хост
+        self.hedge_wins = 0  # ...и второй хост ответил первым
+        self.failovers = 0  # Переход на другой хост после ошибки
+
+    def _available(self) -> List[Endpoint]:
+        """Хосты без открытого circuit breaker и со свободным соединением, быстрые первыми; если таких нет - все"""
+        now = self.clock()
+        with self._lock:
+            ready = [e for e in self.endpoints if e.open_until <= now and e.inflight < config.HEDGE_POOL_SIZE] \
+                or list(self.endpoints)
+        # Хост без статистики пробуется первым, дальше - по EWMA задержки
+        return sorted(ready, key=lambda e: e.latency_ewma if e.latency_ewma is not None else 0.0)
+
+    def hedge_delay(self, endpoint: Endpoint) -> float:
+        """
+        Через сколько дублировать запрос: квантиль HEDGE_QUANTILE задержек хоста; пока замеров мало -
+        EWMA x HEDGE_EWMA_FACTOR (не больше HEDGE_DEFAULT_DELAY), без замеров - HEDGE_DEFAULT_DELAY
+        Квантиль ниже доли медленного хвоста: при хвосте в 5% p95 - уже сам хвост,
+        и хедж уходил бы, когда медленный ответ почти пришёл
+        """
+        delay = endpoint.quantile(config.HEDGE_QUANTILE)
+        if delay is None and endpoint.latency_ewma is not None:
+            delay = min(endpoint.latency_ewma * config.HEDGE_EWMA_FACTOR, config.HEDGE_DEFAULT_DELAY)
+        return max(config.HEDGE_MIN_DELAY, delay if delay is not None else config.HEDGE_DEFAULT_DELAY)
+
+    def _fetch(self, endpoint: Endpoint, path: str, params: Optional[Dict]) -> requests.Response:
+        """
+        Запрос до заголовков (тело читается только у принятого ответа)
+        Успех хоста - только 2xx/3xx: 4xx ответил сам хост, но задержку и circuit breaker не трогает
+        """
+        started = self.clock()
+        try:
+            response = endpoint.session.get(f"{endpoint.url}{path}", params=params, timeout=self.timeout,
+                                            stream=True)
+        except requests.exceptions.RequestException:
+            self._record_failure(endpoint)
+            raise
+        if response.status_code >= 500:
+            self._record_failure(endpoint)
+        elif response.status_code < 400:
+            with self._lock:
+                endpoint.record_success(self.clock() - started, config.HEDGE_LATENCY_ALPHA)
+        return response
+
+    def _release(self, endpoint: Endpoint):
+        """Запрос больше не занимает пул: завершился или отменён, не дождавшись потока"""
+        with self._lock:
+            endpoint.inflight -= 1
+
+    def _record_failure(self, endpoint: Endpoint):
+        with self._lock:
+            endpoint.failures += 1
+            if endpoint.failures >= config.CIRCUIT_FAILURES:
+                if endpoint.open_until <= self.clock():
+                    events.emit('host_disabled', url=endpoint.url, failures=endpoint.failures,
+                                cooldown=config.CIRCUIT_COOLDOWN)
+                endpoint.open_until = self.clock() + config.CIRCUIT_COOLDOWN
+
+    @staticmethod
+    def _succeeded(future: Future) -> bool:
+        return future.exception() is None and future.result().status_code < 500
+
+    @staticmethod
+    def _discard(future: Future):
+        """Проигравший запрос: тело никто не читает - соединение закрывается сразу, поток пула свободен"""
+        if not future.cancelled() and future.exception() is None:
+            future.result().close()
+
+    def _accept(self, future: Future, endpoint: Endpoint, stream: bool) -> requests.Response:
+        """Принятый ответ; без stream тело дочитывается здесь (обрыв посреди тела - ошибка хоста)"""
+        response = future.result()
+        if not stream:
+            try:
+                response.content
+            except requests.exceptions.RequestException:
+                self._record_failure(endpoint)
+                raise
+        return response
+
+    def get(self, path: str, params: Optional[Dict] = None, stream: bool = False) -> requests.Response:
+        """
+        GET с хеджированием. Возвращает первый ответ без 5xx (429 тоже ответ - решает вызывающий)
+        Если не ответил ни один хост - последний ответ 5xx или исключение последней попытки
+        stream=True - ответ возвращается сразу после заголовков, тело читает вызывающий (и закрывает ответ)
+        Хедж и задержки хоста считаются до заголовков; тело читается только у принятого ответа
+        """
+        order = self._available()
+        pending: Dict[Future, Endpoint] = {}
+        last: Optional[Future] = None
+        last_endpoint: Optional[Endpoint] = None
+
+        def launch():
+            endpoint = order.pop(0)
+            with self._lock:
+                endpoint.requests += 1
+                endpoint.inflight += 1
+            future = self._pool.submit(self._fetch, endpoint, path, params)
+            # inflight возвращается в колбэке: проигравший, отменённый ещё в очереди пула, _fetch не запускает
+            future.add_done_callback(lambda _: self._release(endpoint))
+            pending[future] = endpoint
+
+        launch()
+        while pending:
+            # Пока есть запасной хост - ждём основной не дольше hedge_delay, потом хеджируем
+            primary = next(iter(pending.values()))
+            timeout = self.hedge_delay(primary) if order else None
+            done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                self.hedges += 1
+                metrics.REQUEST_HEDGES.inc()
+                launch()
+                continue
+
+            for future in done:
+                endpoint = pending.pop(future)
+                if self._succeeded(future):
+                    with self._lock:
+                        endpoint.wins += 1
+                    if endpoint is not primary:
+                        self.hedge_wins += 1
+                    # Проигравший ещё ждёт заголовков - закроется, как только дождётся (тело не читается)
+                    for loser in pending:
+                        loser.cancel()
+                        loser.add_done_callback(self._discard)
+                    for other in done - {future}:
+                        self._discard(other)
+                    if last is not None:
+                        self._discard(last)
+                    return self._accept(future, endpoint, stream)
+                if last is not None:
+                    self._discard(last)
+                last, last_endpoint = future, endpoint
+
+            if not pending and order:
+                # Ошибка без ожидания: сразу следующий хост
+                self.failovers += 1
+                metrics.REQUEST_RETRIES.inc()
+                launch()
+
+        return self._accept(last, last_endpoint, stream)
+
+    def warm(self, path: str = "/api/v1/contract/ping"):
+        """Открыть keep-alive соединения ко всем хостам заранее (в фоне, ошибки не важны)"""
+        def ping(endpoint: Endpoint):
+            try:
+                endpoint.session.get(f"{endpoint.url}{path}", timeout=self.timeout).content
+            except requests.exceptions.RequestException:
+                pass
+
+        for endpoint in self.endpoints:
+            self._pool.submit(ping, endpoint)
+
+    def stats(self) -> List[Dict]:
+        """Статистика по хостам (задержки в миллисекундах)"""
+        now = self.clock()
+        return [{
+            'url': e.url,
+            'ewma_ms': (e.latency_ewma or 0.0) * 1000,
+            'p95_ms': (e.p95() or 0.0) * 1000,
+            'requests': e.requests,
+            'wins': e.wins,
+            'open': e.open_until > now,
+        } for e in self.endpoints]
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        for endpoint in self.endpoints:
+            endpoint.session.close()
@@ -0,0 +1,305 @@
+"""
+Нагрузочный тест монитора на локальных заглушках MEXC и Telegram (без живого API)
+
+Заглушки работают в отдельном процессе и по сценарию вбрасывают всплески спреда;
+монитор в этом процессе запускается как в проде (PriceSpreadMonitor.run), поэтому
+CPU и RSS в отчёте - только монитора. Тик->алерт считается от публикации снимка
+со всплеском до приёма сообщения заглушкой Bot API
+
+Запуск:
+    python load_test.py                                  # 1k, 5k, 20k, 50k контрактов
+    python load_test.py --contracts 5000 --duration 60
+    python load_test.py --save baseline.json             # сохранить результат
+    python load_test.py --compare baseline.json          # сравнить с сохранённым
+    python load_test.py --ingestion bus                  # опрос биржи в процессе-получателе (CPU/RSS без него)
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Tuple
+
+import config
+
+SYMBOL_PATTERN = re.compile(r'<u>([^<]+)</u>')
+
+
+def burst_schedule(symbols: List[str], args: argparse.Namespace) -> List[Tuple[float, List[str], float, List[str]]]:
+    """
+    Всплески (секунда от старта, пары, спред %, устаревшие пары): каждая пара участвует не больше одного раза
+    Устаревшие пары показывают спред только в массовом тикере - по отдельной паре его нет (ложный алерт)
+    """
+    rng = random.Random(args.seed)
+    starts = []
+    at = args.burst_every
+    while at + args.burst_hold <= args.duration:
+        starts.append(at)
+        at += args.burst_every
+    per_burst = args.burst_size + args.stale_size
+    pool = rng.sample(symbols, min(len(symbols), per_burst * len(starts)))
+    schedule = []
+    for n, at in enumerate(starts):
+        chosen = pool[n * per_burst:(n + 1) * per_burst]
+        sign = 1 if rng.random() < 0.5 else -1
+        schedule.append((at, chosen[:args.burst_size], sign * args.burst_spread, chosen[args.burst_size:]))
+    return schedule
+
+
+def serve_mocks(conn, options: Dict):
+    """Процесс заглушек: поднять серверы, отдать адреса, по команде проиграть сценарий"""
+    from mock_servers import MockMEXCServer, MockTelegramServer
+
+    args = argparse.Namespace(**options)
+    mexc = MockMEXCServer(contracts=args.contracts, seed=args.seed, bandwidth=args.bandwidth * 1e6)
+    telegram = MockTelegramServer()
+    mexc.start()
+    telegram.start()
+    conn.send((mexc.url, telegram.url))
+
+    conn.recv()  # Монитор загрузил пары - старт сценария
+    schedule = burst_schedule(mexc.symbols, args)
+    mexc.stale = {s for *_, stale in schedule for s in stale}
+    injected: Dict[str, float] = {}
+    ticks = 0
+    started = time.time()
+    next_tick = started
+    while time.time() - started < args.duration:
+        elapsed = time.time() - started
+        spreads = {s: spread for at, chosen, spread, stale in schedule if at <= elapsed < at + args.burst_hold
+                   for s in chosen + stale}
+        mexc.set_prices(spreads, churn=args.churn)
+        for symbol in spreads:
+            if symbol not in mexc.stale:
+                injected.setdefault(symbol, mexc.updated_at)
+        ticks += 1
+        next_tick += args.tick
+        time.sleep(max(0.0, next_tick - time.time()))
+
+    conn.recv()  # Монитор остановлен - отдать результаты
+    conn.send({
+        'injected': injected,
+        'messages': [(m['method'], m.get('text', ''), m['received_at']) for m in telegram.messages],
+        'rejected': telegram.rejected,
+        'ticks': ticks,
+        'requests': mexc.requests.get('/api/v1/contract/ticker', 0),
+        'stale': sorted(mexc.stale),
+    })
+    mexc.stop()
+    telegram.stop()
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса (Linux /proc; иначе пик из getrusage)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_scenario(args: argparse.Namespace) -> Dict:
+    """Один прогон: заглушки в дочернем процессе, монитор - в этом"""
+    context = multiprocessing.get_context('spawn')
+    conn, child_conn = context.Pipe()
+    mocks = context.Process(target=serve_mocks, args=(child_conn, vars(args)), daemon=True)
+    mocks.start()
+    mexc_url, telegram_url = conn.recv()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.MEXC_BASE_URL = mexc_url
+        config.MEXC_FUTURES_URL = ''
+        config.TELEGRAM_API_URL = telegram_url
+        config.TELEGRAM_BOT_TOKEN = 'load-test'
+        config.TELEGRAM_CHAT_ID = '-100'
+        config.TELEGRAM_TOPIC_ID = ''
+        config.INGESTION_MODE = args.ingestion
+        config.SNAPSHOT_BUS_NAME = f"load_test_{os.getpid()}"
+        config.SNAPSHOT_BUS_EXTERNAL = False
+        config.SCAN_INTERVAL = args.interval
+        config.PACING_POLICY = 'fixed'
+        config.METRICS_PORT = 0
+        config.SNAPSHOT_RECORD_PATH = None
+        config.CONTRACT_CACHE_PATH = os.path.join(tmp, 'contracts.json')
+        config.SUBSCRIPTIONS_PATH = os.path.join(tmp, 'subscriptions.json')
+        config.STATE_JOURNAL_PATH = os.path.join(tmp, 'state_journal.db')
+        config.EVENT_LOG_PATH = os.path.join(tmp, 'events.jsonl')
+        config.EVENT_LOG_CONSOLE = False
+        config.ALERT_RULES_PATH = args.rules or ''  # Не подхватывать alert_rules.json из рабочей папки
+        config.STREAM_PARSE = not args.buffered
+        from event_log import events
+        events.path, events.console = config.EVENT_LOG_PATH, False
+        from main import PriceSpreadMonitor
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            monitor = PriceSpreadMonitor()
+            runner = threading.Thread(target=monitor.run, name="monitor", daemon=True)
+            runner.start()
+            while not monitor.is_running:
+                if not runner.is_alive():
+                    raise RuntimeError(f"Монитор не запустился:\n{output.getvalue()}")
+                time.sleep(0.05)
+
+            conn.send('go')
+            scans_before = monitor.scan_counter
+            cpu_before = time.process_time()
+            started = time.perf_counter()
+            rss_peak = rss_mb()
+            # Сценарий + запас, чтобы последние алерты успели дойти
+            deadline = started + args.duration + args.grace
+            while time.perf_counter() < deadline:
+                time.sleep(0.5)
+                rss_peak = max(rss_peak, rss_mb())
+            wall = time.perf_counter() - started
+            cpu = time.process_time() - cpu_before
+            scans = monitor.scan_counter - scans_before
+
+            monitor.is_running = False
+            runner.join(timeout=10)
+            monitor.stop()
+
+    conn.send('results')
+    mock = conn.recv()
+    mocks.join(timeout=5)
+
+    # Первое новое сообщение с парой (дайджест - несколько пар) после публикации всплеска
+    received: Dict[str, float] = {}
+    for method, text, received_at in mock['messages']:
+        if method == 'sendMessage':
+            for symbol in SYMBOL_PATTERN.findall(text):
+                received.setdefault(symbol, received_at)
+    latencies = [received[s] - at for s, at in mock['injected'].items() if s in received and received[s] >= at]
+    false_alerts = sum(1 for s in mock['stale'] if s in received)
+
+    return {
+        'contracts': args.contracts,
+        'scans_per_sec': scans / wall,
+        'target_hz': 1 / args.interval,
+        'tick_to_alert_p50_ms': percentile(latencies, 0.5) * 1000,
+        'tick_to_alert_p99_ms': percentile(latencies, 0.99) * 1000,
+        'detected': len(latencies),
+        'injected': len(mock['injected']),
+        'false_alerts': false_alerts,
+        'stale': len(mock['stale']),
+        'telegram_429': mock['rejected'],
+        'api_calls': len(mock['messages']),
+        'cpu_percent': cpu / wall * 100,
+        'rss_mb': rss_peak,
+        'ticks': mock['ticks'],
+    }
+
+
+def print_report(results: List[Dict], baseline: Dict[int, Dict] = None):
+    print("=" * 108)
+    print(f"{'пар':>6} | {'сканов/с':>12} | {'тик→алерт p50/p99, мс':>22} | {'найдено':>7} | {'ложных':>6} | "
+          f"{'429':>3} | {'API':>4} | {'CPU %':>6} | {'RSS МБ':>7}")
+    print("=" * 108)
+    for r in results:
+        print(f"{r['contracts']:6d} | {r['scans_per_sec']:5.2f}/{r['target_hz']:5.2f} | "
+              f"{r['tick_to_alert_p50_ms']:10.0f}/{r['tick_to_alert_p99_ms']:<11.0f} | "
+              f"{r['detected']:3d}/{r['injected']:<3d} | {r.get('false_alerts', 0):2d}/{r.get('stale', 0):<3d} | "
+              f"{r['telegram_429']:3d} | {r['api_calls']:4d} | "
+              f"{r['cpu_percent']:6.1f} | {r['rss_mb']:7.1f}")
+        previous = (baseline or {}).get(r['contracts'])
+        if previous:
+            deltas = []
+            for key, label in (('scans_per_sec', 'сканов/с'), ('tick_to_alert_p99_ms', 'p99'),
+                               ('cpu_percent', 'CPU'), ('rss_mb', 'RSS')):
+                if previous.get(key):
+                    deltas.append(f"{label} {(r[key] / previous[key] - 1) * 100:+.0f}%")
+            print(f"{'':6} | к базовому прогону: {', '.join(deltas)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест монитора на локальных заглушках")
+    parser.add_argument('--contracts', type=int, nargs='+', default=[1000, 5000, 20000, 50000])
+    parser.add_argument('--duration', type=float, default=30.0, help="длительность сценария, сек")
+    parser.add_argument('--grace', type=float, default=3.0, help="ожидание доставки после сценария, сек")
+    parser.add_argument('--interval', type=float, default=0.25, help="SCAN_INTERVAL монитора, сек")
+    parser.add_argument('--tick', type=float, default=0.5, help="как часто заглушка публикует новые цены, сек")
+    parser.add_argument('--churn', type=float, default=0.2, help="доля пар, меняющих цену за тик")
+    parser.add_argument('--burst-every', type=float, default=10.0,
+                        help="интервал между всплесками, сек (3 пары за 10 сек укладываются в лимит чата)")
+    parser.add_argument('--burst-size', type=int, default=3, help="пар во всплеске")
+    parser.add_argument('--stale-size', type=int, default=1,
+                        help="пар с устаревшим lastPrice во всплеске (спред только в массовом тикере)")
+    parser.add_argument('--burst-spread', type=float, default=15.0, help="спред всплеска, %%")
+    parser.add_argument('--burst-hold', type=float, default=3.0, help="сколько держится всплеск, сек")
+    parser.add_argument('--ingestion', choices=('rest', 'bus'), default='rest',
+                        help="rest - опрос в процессе монитора, bus - отдельный процесс-получатель и шина снимков")
+    parser.add_argument('--rules', help="файл правил алертов (ALERT_RULES_PATH) - их проверка входит в скан")
+    parser.add_argument('--bandwidth', type=float, default=0.0,
+                        help="ограничение канала заглушки MEXC, МБ/с (0 - без ограничения)")
+    parser.add_argument('--buffered', action='store_true',
+                        help="разбирать ответ тикеров после загрузки целиком (STREAM_PARSE=0)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="вывести результат одной строкой JSON")
+    parser.add_argument('--save', help="сохранить результаты в файл")
+    parser.add_argument('--compare', help="сравнить с результатами из файла")
+    args = parser.parse_args()
+
+    if len(args.contracts) == 1:
+        args.contracts = args.contracts[0]
+        results = [run_scenario(args)]
+    else:
+        # Каждый размер - в отдельном процессе: метрики, кэши и пик RSS не смешиваются
+        results = []
+        common = [a for a in sys.argv[1:] if a not in ('--json',)]
+        common = _without_option(common, '--contracts', '--save', '--compare')
+        for contracts in args.contracts:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--contracts', str(contracts), '--json', *common],
+                capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(completed.stderr, file=sys.stderr)
+                sys.exit(completed.returncode)
+            results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    if args.json:
+        print(json.dumps(results[0] if len(results) == 1 else results))
+        return
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = {r['contracts']: r for r in json.load(f)}
+    print_report(results, baseline)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+
+
+def _without_option(argv: List[str], *names: str) -> List[str]:
+    """Убрать из аргументов опции names вместе с их значениями"""
+    result = []
+    skipping = False
+    for arg in argv:
+        if arg.startswith('--'):
+            skipping = arg in names
+        if not skipping:
+            result.append(arg)
+    return result
+
+
+if __name__ == "__main__":
+    main()
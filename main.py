@@ -4,154 +4,690 @@ MEXC Price Spread Monitor - Главный модуль
 """
 import time
 import sys
-from datetime import datetime
+import asyncio
+import threading
+from typing import Optional
+import numpy as np
 from mexc_client import MEXCClient
+from mexc_stream import MEXCTickerStream
 from spread_analyzer import SpreadAnalyzer
+from symbol_table import SymbolTable
+from ticker_decoder import TickerSnapshot
+from snapshot_recorder import SnapshotRecorder
+from snapshot_bus import SnapshotBus, start_fetcher
+from metrics import MetricsServer
+from scheduler import FixedRateScheduler
+import metrics
 from telegram_notifier import TelegramNotifier
+from alert_dispatcher import AlertDispatcher
+from alert_lifecycle import AlertLifecycle
+from candidate_confirmer import CandidateConfirmer
+from alert_rules import AlertRule, RuleEngine
+from price_sources import VenuePrices
+from contract_cache import ContractCache
+from subscriptions import SubscriptionRegistry
+from state_journal import StateJournal
+from monitor_state import MonitorState
+from event_log import events
 import config
 
 
+class ScanProgress:
+    """Итоги скана, который анализируется по частям (потоковый разбор ответа), - до его конца"""
+
+    __slots__ = ('now', 'parts', 'candidates', 'alerts', 'confirmed', 'routed', 'pairs', 'changed',
+                 'max_spread', 'max_spread_pair', 'analysis_seconds')
+
+    def __init__(self, now: float):
+        self.now = now  # Одно время на весь скан: cooldown и история пар из разных частей согласованы
+        self.parts = []  # Проанализированные части ответа
+        self.candidates = []  # Алерты спреда всех частей (cooldown уже отмечен), ждут подтверждения
+        self.alerts = []  # Подтверждённые - уходят подписчикам и в журнал
+        self.confirmed = False
+        self.routed = []  # (подписка, symbol, время, спред) - для журнала
+        self.pairs = 0
+        self.changed = 0
+        self.max_spread = 0.0
+        self.max_spread_pair = None
+        self.analysis_seconds = 0.0
+
+
 class PriceSpreadMonitor:
     def __init__(self):
         print("🚀 Инициализация MEXC Price Spread Monitor...")
         
         try:
-            self.mexc = MEXCClient()
-            self.analyzer = SpreadAnalyzer()
+            # Одна таблица символов на клиент и анализатор: индексы снимка сразу адресуют состояние
+            self.symbol_table = SymbolTable()
+            self.mexc = MEXCClient(self.symbol_table)
+            self.analyzer = SpreadAnalyzer(symbol_table=self.symbol_table)
             self.notifier = TelegramNotifier()
+            self.dispatcher = AlertDispatcher(self.notifier)
+            self.lifecycle = AlertLifecycle(self.notifier, self.dispatcher) if config.ALERT_LIFECYCLE else None
+            # Кандидаты перепроверяются по отдельным парам: устаревший lastPrice не уходит в алерт
+            self.confirmer = CandidateConfirmer() if config.CONFIRM_CANDIDATES else None
+            # Другие биржи опрашиваются в том же скане, что и MEXC (только режим rest)
+            self.venues = None
+            if config.VENUES:
+                if config.INGESTION_MODE == 'rest':
+                    self.venues = VenuePrices.from_config(self.symbol_table)
+                else:
+                    print(f"⚠️ VENUES работают только в режиме rest, биржи {', '.join(config.VENUES)} не опрашиваются")
+            # Правила по остальным полям тикера (index, funding, объём...) из ALERT_RULES_PATH
+            # и встроенный межбиржевой спред на каждую биржу
+            builtin = []
+            if self.venues and config.CROSS_VENUE_MIN_SPREAD > 0:
+                builtin = [AlertRule(f"{name}_spread", f"abs(last vs {name}) >= {config.CROSS_VENUE_MIN_SPREAD}%",
+                                     config.CROSS_VENUE_COOLDOWN) for name in self.venues.names]
+            self.rules = RuleEngine(builtin=builtin)
+            self.journal = StateJournal() if config.STATE_JOURNAL_PATH else None
+            # Кому слать алерты: анализатор ищет по самому низкому порогу, подписки фильтруют дальше
+            self.subscriptions = SubscriptionRegistry()
+            self.subscriptions.load_or_default()
+            self.subscriptions.on_change = self.apply_subscriptions
+            self.apply_subscriptions()
+            # Отдельный клиент для списка контрактов: фоновый запрос не смешивается со статусами сканов
+            self.contract_client = MEXCClient()
+            self.contracts = ContractCache()
             print("✅ Все компоненты инициализированы")
         except Exception as e:
             print(f"❌ Ошибка инициализации: {e}")
             sys.exit(1)
         
         self.symbols = []
+        self._pending_contracts = None  # Свежий /contract/detail, ждёт применения в цикле сканирования
+        # Пары, снятые с торгов, по индексам SymbolTable: биржа ещё отдаёт их в тикерах, скан их пропускает
+        self.delisted = np.zeros(0, dtype=bool)
+        self.stream = None
+        self.bus = None  # Шина снимков (INGESTION_MODE=bus)
+        self.fetcher = None  # (процесс-получатель, событие остановки), если запущен этим процессом
+        self.metrics_server = None
+        self.scheduler = FixedRateScheduler(self.scan_all_pairs)
+        self.recorder = SnapshotRecorder(config.SNAPSHOT_RECORD_PATH, self.symbol_table) if config.SNAPSHOT_RECORD_PATH else None
         self.is_running = False
         self.scan_counter = 0  # Счётчик сканирований
         self.total_alerts = 0  # Общее количество алертов
+        self.state = MonitorState()  # Публикуется после каждого скана, читается командами бота
+        
+        # Cooldown и счётчики с прошлого запуска: пары выше порога не алертят все разом
+        if self.journal:
+            self.restore_state()
+    
+    def restore_state(self):
+        """Восстановить состояние из журнала"""
+        started = time.perf_counter()
+        saved = self.journal.restore()
+        self.scan_counter = saved.scan_counter
+        self.total_alerts = saved.total_alerts
+        restored = self.analyzer.restore_alerts(saved.cooldowns)
+        self.subscriptions.restore_cooldowns(saved.subscriber_cooldowns)
+        if saved.scan_counter:
+            print(f"♻️ Состояние восстановлено за {(time.perf_counter() - started) * 1000:.1f} мс: "
+                  f"{restored} пар в cooldown, {saved.scan_counter} сканов, {saved.total_alerts} алертов")
+    
+    def apply_subscriptions(self):
+        """Порог и cooldown анализатора - самые мягкие среди подписок"""
+        min_spread = self.subscriptions.min_threshold
+        cooldown = self.subscriptions.min_cooldown
+        self.analyzer.set_rule(
+            config.MIN_SPREAD_PERCENT if min_spread is None else min_spread,
+            config.ALERT_COOLDOWN if cooldown is None else cooldown
+        )
+        if self.journal:
+            self.journal.retention = self.subscriptions.max_cooldown or config.ALERT_COOLDOWN
     
     def load_symbols(self):
-        """Загрузить все фьючерсные пары"""
+        """
+        Загрузить все фьючерсные пары
+        Есть кэш контрактов - стартуем сразу по нему, свежий список подтянется в фоне
+        """
         print("\n📥 Загрузка списка фьючерсных пар...")
-        self.symbols = self.mexc.get_all_futures_symbols()
+        if config.INGESTION_MODE != 'bus':
+            self.mexc.transport.warm()  # Соединения к обоим хостам готовы к первому скану
+        if self.confirmer:
+            self.confirmer.warm()
+        self.reload_rules()  # Поля правил нужны декодеру уже в первом скане
+        if self.contracts.load():
+            self.symbols = self.contracts.symbols
+            for symbol in self.symbols:
+                self.symbol_table.get_or_add(symbol)
+            print(f"✅ Загружено {len(self.symbols)} пар из кэша ({self.contracts.age / 60:.0f} мин назад), обновление в фоне")
+            return True
         
-        if not self.symbols:
+        if not self.fetch_contracts():
             print("❌ Не удалось загрузить символы. Повторная попытка через 30 секунд...")
             return False
+        self.apply_contracts()
         
         print(f"✅ Загружено {len(self.symbols)} пар для мониторинга")
+        return True
+    
+    def fetch_contracts(self) -> bool:
+        """Запросить свежий список контрактов (блокирующе, можно из фонового потока)"""
+        details = self.contract_client.get_contract_details()
+        if not details:
+            return False
+        self._pending_contracts = details
+        return True
+    
+    def apply_contracts(self):
+        """Применить полученный список: новые пары в таблицу символов, снятые - убрать из состояния"""
+        details = self._pending_contracts
+        if details is None:
+            return
+        self._pending_contracts = None
         
-        # Показываем примеры пар с ценами при запуске
-        print("\n📊 Получение примеров цен для проверки...")
-        sample_data = self.mexc.get_all_price_data()
-        
-        if sample_data:
-            print(f"✅ Данные получены для {len(sample_data)} пар\n")
-            print("📋 Примеры пар с текущими ценами:")
-            print("-" * 70)
-            
-            # Показываем первые 10 пар
-            for i, data in enumerate(sample_data[:10], 1):
-                symbol = data['symbol']
-                last = data['last_price']
-                fair = data['fair_price']
-                diff = ((last - fair) / fair) * 100
-                
-                print(f"{i:2d}. {symbol:15s} | Last: {last:12.6f} | Fair: {fair:12.6f} | Δ {diff:+6.2f}%")
-            
-            print("-" * 70)
-            print(f"... и ещё {len(sample_data) - 10} пар\n")
+        initial = not self.symbols
+        added, removed = self.contracts.update(details)
+        for symbol in added:
+            self.symbol_table.get_or_add(symbol)
+        self.mark_delisted(added, False)  # Пара снова в списке - снова сканируется
+        self.mark_delisted(removed, True)
+        if removed:
+            # Снятые с торгов пары не держат cooldown и историю
+            self.analyzer.forget(removed)
+            if self.journal:
+                self.journal.forget(removed)
+        self.symbols = self.contracts.symbols
         
-        return True
+        try:
+            self.contracts.save()
+        except OSError as e:
+            print(f"⚠️ Не удалось сохранить кэш контрактов: {e}")
+        
+        if not initial and (added or removed):
+            print(f"🔄 Список контрактов: +{len(added)} новых, -{len(removed)} снятых ({len(self.symbols)} пар)")
+    
+    def mark_delisted(self, symbols, delisted: bool):
+        idx = [self.symbol_table.index[s] for s in symbols if s in self.symbol_table]
+        if not idx:
+            return
+        size = len(self.symbol_table)
+        if len(self.delisted) < size:
+            grown = np.zeros(max(size, len(self.delisted) * 2), dtype=bool)
+            grown[:len(self.delisted)] = self.delisted
+            self.delisted = grown
+        self.delisted[idx] = delisted
+    
+    def listed(self, snapshot):
+        """
+        Снимок без пар, снятых с торгов: их состояние забыто (forget), и без фильтра они вернулись бы в анализ,
+        алерты и правила. Пары, которых ещё нет в списке контрактов (листинг между обновлениями), остаются
+        """
+        delisted = self.delisted
+        if not len(delisted):
+            return snapshot
+        idx = snapshot.idx
+        known = idx < len(delisted)
+        drop = np.zeros(len(idx), dtype=bool)
+        drop[known] = delisted[idx[known]]
+        return snapshot.select(~drop) if drop.any() else snapshot
+    
+    def reload_rules(self):
+        """Перечитать файл правил, если он изменился: декодер начинает извлекать нужные правилам поля"""
+        if not self.rules.maybe_reload():
+            return
+        self.mexc.decoder.fields = self.rules.fields
+        missing = self.rules.venues - set(self.venues.names if self.venues else ())
+        if missing:
+            print(f"⚠️ Правила сравнивают с биржами {', '.join(sorted(missing))}, которых нет в VENUES: не сработают")
+        if self.rules.fields and config.INGESTION_MODE == 'bus':
+            print(f"⚠️ Шина снимков передаёт только last/fair: правила с полями "
+                  f"{', '.join(sorted(self.rules.fields))} в режиме bus не сработают")
+    
+    def contract_refresh_delay(self) -> float:
+        """Сколько ждать до фонового обновления списка контрактов (устаревший кэш - сразу)"""
+        return max(0.0, config.CONTRACT_REFRESH_INTERVAL - self.contracts.age)
+    
+    def _contract_refresh_loop(self):
+        """Фоновое обновление для синхронного режима; применяется в потоке сканирования"""
+        delay = self.contract_refresh_delay()
+        while self.is_running:
+            time.sleep(delay)
+            if self.is_running:
+                self.fetch_contracts()
+            delay = config.CONTRACT_REFRESH_INTERVAL
     
     def scan_all_pairs(self):
-        """Сканировать все пары на наличие спреда - ОПТИМИЗИРОВАННАЯ ВЕРСИЯ"""
-        self.scan_counter += 1
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        """
+        Сканировать все пары на наличие спреда - ОПТИМИЗИРОВАННАЯ ВЕРСИЯ
+        Возвращает feedback для планировщика темпа (статус биржи, максимальный спред)
+        """
+        started = time.perf_counter()
+        if self.venues:
+            self.venues.submit()  # Другие биржи - параллельно с MEXC
         
-        # СУПЕР БЫСТРО: Получаем ВСЕ тикеры одним запросом!
-        all_price_data = self.mexc.get_all_price_data()
+        # СУПЕР БЫСТРО: Получаем ВСЕ тикеры одним запросом, сразу в массивы
+        scan = None
+        if config.STREAM_PARSE:
+            # Пары анализируются по мере загрузки ответа: начало списка алертит до его конца
+            scan = self.begin_scan()
+            snapshot = self.mexc.stream_price_snapshot(lambda part: self.analyze_part(scan, part))
+        else:
+            snapshot = self.mexc.get_price_snapshot()
+        if self.venues:
+            # Скан ждёт самую медленную биржу, но не дольше VENUE_DEADLINE от начала
+            self.venues.collect(started)
+        return self.handle_snapshot(snapshot, started, scan)
+    
+    async def scan_all_pairs_async(self):
+        """То же для asyncio-рантайма: HTTP в пуле потоков, анализ - в цикле событий"""
+        started = time.perf_counter()
+        if self.venues:
+            self.venues.submit()
+        scan = None
+        if config.STREAM_PARSE:
+            # Загрузка и разбор - в потоке, части ответа анализируются в цикле событий по мере готовности
+            # (call_soon_threadsafe сохраняет порядок: все части будут обработаны до возврата из to_thread)
+            scan = self.begin_scan()
+            loop = asyncio.get_running_loop()
+            snapshot = await asyncio.to_thread(self.mexc.stream_price_snapshot,
+                                               lambda part: loop.call_soon_threadsafe(self.analyze_streamed, scan, part))
+        else:
+            snapshot = await asyncio.to_thread(self.mexc.get_price_snapshot)
+            if snapshot:
+                scan = self.begin_scan()
+                self.analyze_part(scan, snapshot)
+        if self.venues:
+            await asyncio.to_thread(self.venues.collect, started)
+        if scan is not None:
+            await self.confirm_scan_async(scan)
+        return self.handle_snapshot(snapshot, started, scan)
+    
+    def handle_snapshot(self, snapshot, started: float, scan: Optional[ScanProgress] = None):
+        """Обработать результат запроса тикеров и собрать feedback для планировщика"""
+        feedback = {
+            'status': self.mexc.last_status,
+            'retry_after': self.mexc.retry_after,
+            'rate_limit_remaining': self.mexc.rate_limit_remaining,
+            'max_spread': 0.0
+        }
         
-        if not all_price_data:
-            print(f"[{timestamp}] ❌ Ошибка получения данных")
-            return
+        if not snapshot:
+            events.emit('scan_failed', status=feedback['status'])
+            if feedback['status'] == 200:
+                feedback['status'] = None  # Ответ пришёл, но без данных - тоже повод притормозить
+            if scan is not None and scan.parts:
+                # Обрыв посреди потокового ответа: разобранные пары уже проанализированы - скан закрывается по ним
+                self.finish_scan(scan, TickerSnapshot.concat(scan.parts))
+            return feedback
         
-        alerts_sent = 0
-        max_spread = 0
-        max_spread_pair = None
+        if scan is not None:
+            feedback['max_spread'] = self.finish_scan(scan, snapshot)
+        else:
+            feedback['max_spread'] = self.process_snapshot(snapshot)
         
-        for price_data in all_price_data:
+        elapsed = time.perf_counter() - started
+        metrics.SCAN_SECONDS.observe(elapsed)
+        if elapsed > self.scheduler.interval:
+            metrics.SCAN_OVERRUNS.inc()
+        return feedback
+    
+    def start_bus(self):
+        """Режим bus: подключиться к шине снимков, при необходимости запустив процесс-получатель"""
+        if not config.SNAPSHOT_BUS_EXTERNAL:
+            self.fetcher = start_fetcher()
+        self.bus = SnapshotBus.attach(timeout=30.0)
+    
+    def handle_frame(self, frame, previous: int) -> int:
+        """Проанализировать снимок с шины; возвращает его поколение"""
+        started = time.perf_counter()
+        snapshot = self.frame_snapshot(frame, previous)
+        if snapshot is not None:
+            self.process_snapshot(snapshot)
+        metrics.SCAN_SECONDS.observe(time.perf_counter() - started)
+        return frame.generation
+    
+    async def handle_frame_async(self, frame, previous: int) -> int:
+        """handle_frame для asyncio-рантайма: подтверждение кандидатов не блокирует цикл событий"""
+        started = time.perf_counter()
+        snapshot = self.frame_snapshot(frame, previous)
+        if snapshot is not None:
+            await self.process_snapshot_async(snapshot)
+        metrics.SCAN_SECONDS.observe(time.perf_counter() - started)
+        return frame.generation
+    
+    def frame_snapshot(self, frame, previous: int) -> Optional[TickerSnapshot]:
+        """Копия снимка со слота шины, проверенная seqlock; None - слот переписан во время чтения, снимок пропущен"""
+        if previous and frame.generation - previous > 1:
+            metrics.BUS_SKIPPED.inc(frame.generation - previous - 1)  # Отстали - берём только последний
+        metrics.BUS_SNAPSHOT_AGE_SECONDS.observe(max(0.0, time.time() - frame.received_at))
+        snapshot = self.bus.to_snapshot(frame, self.symbol_table)
+        if snapshot is None:
+            metrics.BUS_OVERRUNS.inc()
+            events.emit('bus_overrun', generation=frame.generation, slots=self.bus.slots)
+        return snapshot
+    
+    def consume_bus(self):
+        """Синхронный цикл режима bus: каждый новый снимок, пропуская те, что не успели"""
+        generation = self.bus.generation
+        while self.is_running:
+            frame = self.bus.wait(generation, timeout=1.0)
+            if frame is None:
+                continue
             try:
-                # Анализируем спред
-                alert_data = self.analyzer.analyze(price_data)
-                
-                # Отслеживаем максимальный спред
-                spread = abs(((price_data['last_price'] - price_data['fair_price']) / price_data['fair_price']) * 100)
-                if spread > max_spread:
-                    max_spread = spread
-                    max_spread_pair = price_data['symbol']
+                self.handle_frame(frame, generation)
+            except Exception as e:
+                # Ошибка одного снимка не останавливает чтение шины - следующий снимок разбирается заново
+                events.emit('scan_error', stage='bus', error=repr(e))
+            generation = frame.generation
+    
+    async def consume_bus_async(self):
+        """То же для asyncio-рантайма: ожидание и анализ - в цикле событий"""
+        generation = self.bus.generation
+        while self.is_running:
+            frame = await self.bus.wait_async(generation, 1.0)
+            if frame is None:
+                continue
+            try:
+                await self.handle_frame_async(frame, generation)
+            except Exception as e:
+                events.emit('scan_error', stage='bus', error=repr(e))
+            generation = frame.generation
+    
+    def stop_bus(self):
+        """Отключиться от шины и остановить свой процесс-получатель"""
+        if self.bus:
+            self.bus.close()
+            self.bus = None
+        if self.fetcher:
+            process, stop = self.fetcher
+            stop.set()
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+            self.fetcher = None
+    
+    def scan_rate(self):
+        """(фактическая, целевая) частота сканов; в режиме bus темп задаёт процесс-получатель"""
+        if self.bus:
+            return self.bus.achieved_hz, self.bus.target_hz
+        return self.scheduler.achieved_hz, self.scheduler.target_hz
+    
+    def process_price_data(self, all_price_data):
+        """Проанализировать пачку цен в виде словарей (push из WebSocket)"""
+        if all_price_data:
+            self.process_snapshot(TickerSnapshot.from_price_data(all_price_data, self.symbol_table,
+                                                                 self.mexc.decoder.fields))
+    
+    def process_snapshot(self, snapshot) -> float:
+        """Проанализировать снимок цен и отправить алерты. Возвращает максимальный |спред|"""
+        scan = self.begin_scan()
+        self.analyze_part(scan, snapshot)
+        return self.finish_scan(scan, snapshot)
+    
+    async def process_price_data_async(self, all_price_data):
+        """process_price_data для asyncio-рантайма"""
+        if all_price_data:
+            await self.process_snapshot_async(TickerSnapshot.from_price_data(all_price_data, self.symbol_table,
+                                                                             self.mexc.decoder.fields))
+    
+    async def process_snapshot_async(self, snapshot) -> float:
+        """process_snapshot для asyncio-рантайма: подтверждение кандидатов не блокирует цикл событий"""
+        scan = self.begin_scan()
+        self.analyze_part(scan, snapshot)
+        await self.confirm_scan_async(scan)
+        return self.finish_scan(scan, snapshot)
+    
+    def begin_scan(self) -> 'ScanProgress':
+        """Начало скана: новые контракты и правила применяются до разбора ответа (декодеру нужны поля правил)"""
+        self.apply_contracts()
+        self.reload_rules()
+        return ScanProgress(time.time())
+    
+    def analyze_part(self, scan: 'ScanProgress', snapshot):
+        """
+        Спреды пар из снимка или его части (потоковый разбор); кандидаты в алерты копятся до конца скана
+        Части одного ответа не пересекаются по парам: состояние каждой пары обновляется раз за скан
+        """
+        snapshot = self.listed(snapshot)
+        started = time.perf_counter()
+        alerts, max_spread, max_spread_pair = self.analyzer.analyze_batch(
+            None, snapshot.last, snapshot.fair, now=scan.now, idx=snapshot.idx, exchange_ts=snapshot.exchange_ts,
+            continued=bool(scan.parts))
+        scan.analysis_seconds += time.perf_counter() - started
+        scan.parts.append(snapshot)
+        scan.candidates.extend(alerts)
+        scan.changed += self.analyzer.last_changed
+        scan.pairs += len(snapshot)
+        if max_spread_pair is not None and (scan.max_spread_pair is None or max_spread > scan.max_spread):
+            scan.max_spread, scan.max_spread_pair = max_spread, max_spread_pair
+    
+    def analyze_streamed(self, scan: 'ScanProgress', snapshot):
+        """analyze_part из цикла событий (часть потокового ответа): ошибка не роняет цикл и остальные части"""
+        try:
+            self.analyze_part(scan, snapshot)
+        except Exception as e:
+            events.emit('scan_error', stage='part', error=repr(e))
+    
+    def confirm_scan(self, scan: 'ScanProgress'):
+        """Все кандидаты скана - одним параллельным раундом запросов; не подтвердившиеся ждут повтора"""
+        if scan.candidates and self.confirmer:
+            self.apply_confirmation(scan, *self.confirmer.confirm(scan.candidates, self.analyzer.min_spread_percent))
+        else:
+            self.apply_confirmation(scan, scan.candidates, [])
+    
+    async def confirm_scan_async(self, scan: 'ScanProgress'):
+        """
+        confirm_scan для asyncio-рантайма: ответы (до CONFIRM_TIMEOUT) ждутся в пуле потоков, цикл событий свободен
+        Итог применяется уже в цикле событий - анализатор не трогается из другого потока
+        """
+        if scan.candidates and self.confirmer:
+            alerts, rejected = await asyncio.to_thread(self.confirmer.confirm, scan.candidates,
+                                                       self.analyzer.min_spread_percent)
+            self.apply_confirmation(scan, alerts, rejected)
+        else:
+            self.apply_confirmation(scan, scan.candidates, [])
+    
+    def apply_confirmation(self, scan: 'ScanProgress', alerts, rejected):
+        """Подтверждённые - в рассылку, не подтвердившиеся ждут повтора"""
+        if rejected:
+            self.analyzer.defer([a['symbol'] for a in rejected], scan.now)
+        scan.alerts = alerts
+        scan.confirmed = True
+    
+    def deliver_alerts(self, scan: 'ScanProgress') -> int:
+        """Подтверждённые алерты скана - подписчикам (дайджест - один на подписку за скан). Возвращает, сколько ушло"""
+        now = scan.now
+        sent = 0
+        digests = {}  # Ключ подписки -> (подписка, алерты скана) - в режиме жизненного цикла
+        for alert_data in scan.alerts:
+            try:
+                events.emit('spread_alert', symbol=alert_data['symbol'], last_price=alert_data['last_price'],
+                            fair_price=alert_data['fair_price'], spread_percent=alert_data['spread_percent'],
+                            direction=alert_data['direction'])
                 
-                if alert_data:
-                    # Очищаем строку и выводим алерт
-                    print(f"\n{'='*70}")
-                    print(f"🚨 СПРЕД ОБНАРУЖЕН: {alert_data['symbol']}")
-                    print(f"{'='*70}")
-                    print(f"💰 Последняя цена:    {alert_data['last_price']:12.6f}")
-                    print(f"⚖️  Справедливая цена: {alert_data['fair_price']:12.6f}")
-                    print(f"📈 Разница:           {alert_data['spread_percent']:+6.2f}% ({alert_data['direction']} справедливой)")
-                    print(f"⏰ Время обнаружения: {timestamp}")
-                    print(f"{'='*70}\n")
-                    
-                    # Отправляем уведомление
-                    self.notifier.send_alert_sync(alert_data)
-                    alerts_sent += 1
-                    self.total_alerts += 1
+                # Ставим в очередь отправки каждому подписчику - скан не ждёт Telegram
+                message = None
+                for subscription in self.subscriptions.route(alert_data['symbol'], alert_data['spread_percent'], now):
+                    scan.routed.append((subscription.key, alert_data['symbol'], now, alert_data['spread_percent']))
+                    if self.lifecycle:
+                        digests.setdefault(subscription.key, (subscription, []))[1].append(alert_data)
+                        continue
+                    message = message or self.notifier.format_message(alert_data)
+                    self.dispatcher.enqueue(alert_data, self.notifier.build_payload(
+                        alert_data, subscription.chat_id, subscription.topic_id, message))
+                sent += 1
+                self.total_alerts += 1
                 
             except Exception as e:
                 continue
+        if self.lifecycle:
+            # Алерты скана - одним сообщением на подписку
+            for subscription, subscription_alerts in digests.values():
+                self.lifecycle.publish(subscription, subscription_alerts)
+        return sent
+    
+    def finish_scan(self, scan: 'ScanProgress', snapshot) -> float:
+        """Конец скана по полному снимку: правила, закрытие сообщений, журнал, состояние. Возвращает максимальный |спред|"""
+        now = scan.now
+        snapshot = self.listed(snapshot)
+        self.scan_counter += 1
+        metrics.ANALYSIS_SECONDS.observe(scan.analysis_seconds)
+        metrics.SCAN_CHANGED_RATIO.set(scan.changed / scan.pairs if scan.pairs else 0.0)
         
-        # Компактный лог - одна строка
-        if alerts_sent > 0:
-            print(f"[{timestamp}] Скан #{self.scan_counter}: ✅ {len(all_price_data)} пар | 🔔 АЛЕРТОВ: {alerts_sent} | Всего: {self.total_alerts}")
-        else:
-            # Показываем только каждое 10-е сканирование если нет алертов
-            if self.scan_counter % 10 == 0:
-                print(f"[{timestamp}] Скан #{self.scan_counter}: ✅ {len(all_price_data)} пар | Макс спред: {max_spread:.2f}% ({max_spread_pair})") 
+        if self.recorder:
+            self.recorder.append(snapshot)
+        
+        if not scan.confirmed:
+            self.confirm_scan(scan)
+        started = time.perf_counter()
+        alerts_sent = self.deliver_alerts(scan)
+        dispatch_seconds = time.perf_counter() - started
+        
+        # Все правила - одна скомпилированная функция над колонками снимка
+        rule_alerts = []
+        if self.rules.ruleset.rules:
+            started = time.perf_counter()
+            if self.venues:
+                # Цены бирж по индексам таблицы -> колонки, выровненные по снимку MEXC
+                snapshot.columns.update(self.venues.columns(snapshot.idx, now))
+            try:
+                rule_alerts = self.rules.check(snapshot, self.symbol_table.names, now)
+            except Exception as e:
+                # Ошибка вычисления правил не отменяет уже разосланные алерты спреда, журнал и состояние скана
+                events.emit('scan_error', stage='rules', error=repr(e))
+            metrics.RULES_SECONDS.observe(time.perf_counter() - started)
+        
+        started = time.perf_counter()
+        for alert_data in rule_alerts:
+            events.emit('rule_alert', symbol=alert_data['symbol'], rule=alert_data['rule'],
+                        when=alert_data['when'], values=alert_data['values'])
+            # Правила не про спред: подписчикам по спискам пар, без порога и дайджеста
+            message = self.notifier.format_rule_message(alert_data)
+            for subscription in self.subscriptions.route_rule(alert_data['symbol']):
+                self.dispatcher.enqueue(alert_data, self.notifier.build_payload(
+                    alert_data, subscription.chat_id, subscription.topic_id, message))
+            metrics.RULE_ALERTS.inc()
+            alerts_sent += 1
+            self.total_alerts += 1
+        if self.lifecycle:
+            # Открытые сообщения правятся и закрываются
+            self.lifecycle.tick(self.analyzer.current_spread)
+        metrics.DISPATCH_SECONDS.observe(dispatch_seconds + time.perf_counter() - started)
+        
+        if self.journal:
+            self.journal.record_scan(
+                self.scan_counter, self.total_alerts,
+                [(a['symbol'], now, a['spread_percent']) for a in scan.alerts], scan.routed, now)
+        
+        achieved_hz, target_hz = self.scan_rate()
+        max_spread, max_spread_pair = scan.max_spread, scan.max_spread_pair
+        # Одна запись на скан; в консоль - при алертах или каждое 10-е сканирование
+        events.emit('scan', scan=self.scan_counter, pairs=len(snapshot), changed=scan.changed,
+                    alerts=alerts_sent, total=self.total_alerts, max_spread=max_spread, max_pair=max_spread_pair,
+                    hz=achieved_hz, target_hz=target_hz)
+        
+        # Публикуем новый неизменяемый снимок одной заменой ссылки
+        self.state = MonitorState(
+            scan_counter=self.scan_counter,
+            total_alerts=self.total_alerts,
+            symbols_count=len(self.symbols),
+            pairs_in_scan=len(snapshot),
+            changed_pairs=scan.changed,
+            max_spread=max_spread,
+            max_spread_pair=max_spread_pair,
+            active_cooldowns=self.analyzer.active_cooldowns(),
+            achieved_hz=achieved_hz,
+            target_hz=target_hz,
+            updated_at=time.time(),
+            stats=self.analyzer.stats()
+        )
+        
+        return max_spread
     
-    def run(self):
-        """Основной цикл мониторинга"""
+    def print_banner(self):
         print("\n" + "="*70)
         print("MEXC PRICE SPREAD MONITOR - МАКСИМАЛЬНАЯ СКОРОСТЬ")
         print("="*70)
         print(f"Минимальный спред: {config.MIN_SPREAD_PERCENT}%")
-        print(f"Режим: НЕПРЕРЫВНОЕ СКАНИРОВАНИЕ (без задержек)")
+        if config.INGESTION_MODE == 'ws':
+            print("Режим: WEBSOCKET ПОТОК (анализ на каждый push)")
+        elif config.INGESTION_MODE == 'bus':
+            print("Режим: ШИНА СНИМКОВ (опрос биржи в отдельном процессе)")
+        else:
+            print("Режим: НЕПРЕРЫВНОЕ СКАНИРОВАНИЕ (без задержек)")
         print(f"Cooldown между алертами: {config.ALERT_COOLDOWN} сек")
         print("="*70 + "\n")
+    
+    def start_metrics(self):
+        if config.METRICS_PORT:
+            self.metrics_server = MetricsServer()
+            self.metrics_server.start()
+            print(f"📈 Метрики: http://{config.METRICS_HOST}:{self.metrics_server.port}/metrics")
+    
+    def print_started(self):
+        print("✅ Мониторинг запущен! Нажмите Ctrl+C для остановки")
+        if config.INGESTION_MODE == 'ws':
+            print(f"📡 Поток тикеров: {config.MEXC_WS_URL} (REST fallback при обрыве)")
+        elif config.INGESTION_MODE == 'bus':
+            source = "внешний получатель" if config.SNAPSHOT_BUS_EXTERNAL else f"получатель pid {self.fetcher[0].pid}"
+            print(f"🧠 Шина снимков: {config.SNAPSHOT_BUS_NAME} ({source}, интервал {config.SCAN_INTERVAL} сек)")
+        else:
+            print(f"⏱️  Интервал сканирования: {config.SCAN_INTERVAL} сек (темп: {config.PACING_POLICY})")
+        print("📊 Показываю каждое 10-е сканирование (или сразу при обнаружении алерта)\n")
+    
+    def run(self):
+        """Основной цикл мониторинга (синхронный, без команд бота)"""
+        self.print_banner()
         
         # Загружаем список символов
         while not self.load_symbols():
             time.sleep(30)
         
         self.is_running = True
-        print("✅ Мониторинг запущен! Нажмите Ctrl+C для остановки")
-        print(f"⏱️  Интервал сканирования: {config.SCAN_INTERVAL} сек")
-        print("📊 Показываю каждое 10-е сканирование (или сразу при обнаружении алерта)\n")
+        events.start()
+        self.dispatcher.start()
+        threading.Thread(target=self._contract_refresh_loop, name="contract-refresh", daemon=True).start()
+        self.start_metrics()
+        if config.INGESTION_MODE == 'bus':
+            self.start_bus()
+        self.print_started()
         
         try:
-            while self.is_running:
-                self.scan_all_pairs()
-                time.sleep(config.SCAN_INTERVAL)
+            if config.INGESTION_MODE == 'ws':
+                self.run_stream()
+            elif config.INGESTION_MODE == 'bus':
+                self.consume_bus()
+            else:
+                # Фиксированная сетка времени вместо "скан + sleep": период не плывёт под нагрузкой
+                self.scheduler.run(lambda: self.is_running)
                 
         except KeyboardInterrupt:
             print("\n\n🛑 Получен сигнал остановки...")
             print(f"📊 Статистика: выполнено {self.scan_counter} сканирований, отправлено {self.total_alerts} алертов")
             self.stop()
     
+    def run_stream(self, url=None):
+        """Потоковый режим: анализ запускается на каждый push тикеров, а не по таймеру"""
+        self.stream = MEXCTickerStream(self.mexc, self.process_price_data, url=url)
+        asyncio.run(self.stream.run())
+    
     def stop(self):
         """Остановить мониторинг"""
         self.is_running = False
+        if self.stream:
+            self.stream.stop()
+        self.stop_bus()
+        self.dispatcher.stop()
+        if self.confirmer:
+            self.confirmer.close()
+        if self.venues:
+            self.venues.close()
+        if self.recorder:
+            self.recorder.close()
+        if self.journal:
+            self.journal.close()
+        if self.metrics_server:
+            self.metrics_server.stop()
+        events.stop()
         print("✅ Мониторинг остановлен")
 
 
 if __name__ == "__main__":
     monitor = PriceSpreadMonitor()
-    monitor.run()
+    if config.RUNTIME == 'async':
+        from runtime import MonitorRuntime
+        asyncio.run(MonitorRuntime(monitor).run())
+    else:
+        monitor.run()
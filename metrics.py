@@ -0,0 +1,180 @@
+"""
+Метрики горячего пути: гистограммы времени по фазам скана, счётчики, gauge
+Запись события - bisect и пара сложений (доли микросекунды), поэтому включено всегда
+Экспорт в формате Prometheus по http://METRICS_HOST:METRICS_PORT/metrics
+"""
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Sequence
+
+import config
+
+# Границы корзин для времени (секунды) и размера ответа (байты)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1024, 16384, 65536, 262144, 524288, 1048576, 2097152, 4194304, 16777216)
+
+
+class Histogram:
+    __slots__ = ('name', 'help', 'bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, name: str, help: str, bounds: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # Последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по корзинам (верхняя граница корзины)"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.count}")
+        return lines
+
+
+class Counter:
+    __slots__ = ('name', 'help', 'value')
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount: int = 1):
+        self.value += amount
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name}_total {self.help}", f"# TYPE {self.name}_total counter",
+                f"{self.name}_total {self.value}"]
+
+
+class Gauge:
+    __slots__ = ('name', 'help', 'value')
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {self.value}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def _get(self, cls, name: str, *args):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = cls(name, *args)
+            self.metrics[name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, bounds: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, bounds)
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Общий реестр процесса
+REGISTRY = MetricsRegistry()
+
+FETCH_SECONDS = REGISTRY.histogram('mexc_fetch_seconds', 'HTTP запрос тикеров')
+DECODE_SECONDS = REGISTRY.histogram('mexc_decode_seconds', 'Разбор ответа тикеров')
+FIRST_RECORD_SECONDS = REGISTRY.histogram('mexc_first_record_seconds', 'От запроса тикеров до первых разобранных пар (потоковый разбор)')
+ANALYSIS_SECONDS = REGISTRY.histogram('spread_analysis_seconds', 'Анализ спредов за скан')
+DISPATCH_SECONDS = REGISTRY.histogram('alert_dispatch_seconds', 'Постановка алертов скана в очередь')
+SLEEP_SECONDS = REGISTRY.histogram('scan_sleep_seconds', 'Пауза между сканами')
+SCAN_SECONDS = REGISTRY.histogram('scan_seconds', 'Полный скан (без паузы)')
+TICK_TO_ALERT_SECONDS = REGISTRY.histogram('tick_to_alert_seconds', 'От timestamp тикера биржи до доставки алерта')
+PAYLOAD_BYTES = REGISTRY.histogram('mexc_payload_bytes', 'Размер ответа тикеров', SIZE_BUCKETS)
+REQUEST_ERRORS = REGISTRY.counter('mexc_request_errors', 'Ошибки HTTP запросов к MEXC')
+REQUEST_RETRIES = REGISTRY.counter('mexc_request_retries', 'Повторные запросы к MEXC (переход на другой хост)')
+REQUEST_HEDGES = REGISTRY.counter('mexc_request_hedges', 'Запросы, продублированные на второй хост')
+SCAN_OVERRUNS = REGISTRY.counter('scan_overruns', 'Сканы дольше SCAN_INTERVAL')
+SCAN_SKIPPED_TICKS = REGISTRY.counter('scan_skipped_ticks', 'Тики сетки, пропущенные из-за долгих сканов')
+SCAN_TARGET_HZ = REGISTRY.gauge('scan_target_hz', 'Целевая частота сканирования')
+SCAN_ACHIEVED_HZ = REGISTRY.gauge('scan_achieved_hz', 'Фактическая частота сканирования')
+SCAN_CHANGED_RATIO = REGISTRY.gauge('scan_changed_ratio', 'Доля пар с изменившимися ценами в последнем снимке')
+CONFIRM_SECONDS = REGISTRY.histogram('confirm_seconds', 'Подтверждение кандидатов скана по отдельным парам')
+CONFIRM_REJECTED = REGISTRY.counter('confirm_rejected', 'Кандидаты, не подтвердившиеся свежими ценами')
+CONFIRM_UNANSWERED = REGISTRY.counter('confirm_unanswered', 'Кандидаты без ответа к дедлайну подтверждения')
+RULES_SECONDS = REGISTRY.histogram('alert_rules_seconds', 'Проверка правил алертов за скан')
+RULE_ALERTS = REGISTRY.counter('alert_rule_alerts', 'Алерты правил по полям тикера')
+VENUE_FETCH_SECONDS = REGISTRY.histogram('venue_fetch_seconds', 'Запрос тикеров другой биржи')
+VENUE_LATE = REGISTRY.counter('venue_late', 'Ответы бирж, не успевшие к дедлайну скана')
+BUS_SNAPSHOT_AGE_SECONDS = REGISTRY.histogram('bus_snapshot_age_seconds', 'От получения снимка на шине до начала анализа')
+BUS_SKIPPED = REGISTRY.counter('bus_skipped_snapshots', 'Снимки шины, пропущенные медленным читателем')
+BUS_OVERRUNS = REGISTRY.counter('bus_overruns', 'Слот снимка перезаписан во время чтения (снимок пропущен)')
+ALERT_QUEUE_DEPTH = REGISTRY.gauge('alert_queue_depth', 'Алертов в очереди отправки')
+
+
+class MetricsServer:
+    """HTTP эндпоинт /metrics в фоновом потоке"""
+
+    def __init__(self, registry: MetricsRegistry = REGISTRY, host: Optional[str] = None, port: Optional[int] = None):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host or config.METRICS_HOST, config.METRICS_PORT if port is None else port), Handler)
+        self.port = self._httpd.server_address[1]
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -4,41 +4,85 @@ MEXC API клиент для получения данных о фьючерса
 """
 import requests
 import time
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
+from event_log import events
+from hedged_transport import HedgedTransport
+from price_sources import PriceSource
+from symbol_table import SymbolTable
+from ticker_decoder import TickerDecoder, TickerSnapshot
+import metrics
 import config
 
 
-class MEXCClient:
-    def __init__(self):
+class MEXCClient(PriceSource):
+    name = 'mexc'
+    
+    def __init__(self, symbol_table: Optional[SymbolTable] = None, transport: Optional[HedgedTransport] = None):
         self.base_url = config.MEXC_BASE_URL
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        # Таблица символов общая с SpreadAnalyzer: индексы снимка = индексы состояния алертов
+        self.symbol_table = symbol_table if symbol_table is not None else SymbolTable()
+        self.decoder = TickerDecoder(self.symbol_table)
+        self.last_payload_size = 0
+        self.last_wire_size = 0  # Потоковый разбор: байт ответа по сети (со сжатием)
+        # Ответ последнего запроса - для адаптивного темпа сканирования
+        self.last_status: Optional[int] = None  # HTTP статус (None - сетевая ошибка)
+        self.retry_after: Optional[float] = None  # Retry-After от биржи, сек
+        self.rate_limit_remaining: Optional[int] = None  # X-RateLimit-Remaining, если биржа его шлёт
+        # MEXC_BASE_URL и MEXC_FUTURES_URL с хеджированием медленных запросов
+        self.transport = transport if transport is not None else HedgedTransport()
     
-    def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
-        """Выполнить HTTP запрос с повторными попытками"""
-        url = f"{self.base_url}{endpoint}"
-        
-        for attempt in range(config.MAX_RETRIES):
-            try:
-                response = self.session.get(
-                    url,
-                    params=params,
-                    timeout=config.REQUEST_TIMEOUT
-                )
-                response.raise_for_status()
-                return response.json()
-            except requests.exceptions.RequestException as e:
-                print(f"⚠️ Ошибка запроса (попытка {attempt + 1}/{config.MAX_RETRIES}): {e}")
-                if attempt < config.MAX_RETRIES - 1:
-                    time.sleep(2 ** attempt)  # Экспоненциальная задержка
-                else:
-                    return None
-        return None
+    def _make_request(self, endpoint: str, params: Optional[Dict] = None, raw: bool = False):
+        """
+        Выполнить HTTP запрос (raw=True - вернуть тело без разбора JSON)
+        Повторы и переход на второй хост делает транспорт без sleep; если не ответил никто -
+        None, и темп следующих сканов снизит планировщик
+        """
+        try:
+            started = time.perf_counter()
+            response = self.transport.get(endpoint, params=params)
+            if not self._accept(endpoint, response):
+                return None
+            content = response.content
+            metrics.FETCH_SECONDS.observe(time.perf_counter() - started)
+            metrics.PAYLOAD_BYTES.observe(len(content))
+            if raw:
+                self.last_payload_size = len(content)
+                return content
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            if e.response is None:
+                self.last_status = None
+            metrics.REQUEST_ERRORS.inc()
+            events.emit('request_failed', endpoint=endpoint, status=self.last_status, error=str(e))
+            return None
     
-    def get_all_futures_symbols(self) -> List[str]:
-        """Получить все доступные фьючерсные пары"""
+    def _accept(self, endpoint: str, response: requests.Response) -> bool:
+        """Статус и лимиты ответа - для планировщика; False - 429, 4xx/5xx - исключение requests"""
+        self.last_status = response.status_code
+        self.retry_after = self._parse_retry_after(response)
+        remaining = response.headers.get('X-RateLimit-Remaining')
+        self.rate_limit_remaining = int(remaining) if remaining and remaining.isdigit() else None
+        if response.status_code == 429:
+            # Лимит биржи: не долбим повторами, темп снизит планировщик
+            metrics.REQUEST_ERRORS.inc()
+            events.emit('request_rate_limited', endpoint=endpoint, retry_after=self.retry_after)
+            return False
+        response.raise_for_status()
+        return True
+    
+    @staticmethod
+    def _parse_retry_after(response: requests.Response) -> Optional[float]:
+        """Retry-After в секундах, если биржа его прислала"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    
+    def get_contract_details(self) -> List[Dict]:
+        """Описания всех контрактов (/api/v1/contract/detail): symbol, priceUnit, state, openingTime..."""
         try:
             data = self._make_request("/api/v1/contract/detail")
             
@@ -46,14 +90,19 @@ class MEXCClient:
                 print("⚠️ Не удалось получить список контрактов")
                 return []
             
-            symbols = [contract['symbol'] for contract in data['data'] if contract.get('symbol')]
-            print(f"✅ Загружено {len(symbols)} фьючерсных пар")
-            return symbols
+            return [contract for contract in data['data'] if contract.get('symbol')]
             
         except Exception as e:
             print(f"❌ Ошибка при получении символов: {e}")
             return []
     
+    def get_all_futures_symbols(self) -> List[str]:
+        """Получить все доступные фьючерсные пары"""
+        symbols = [contract['symbol'] for contract in self.get_contract_details()]
+        if symbols:
+            print(f"✅ Загружено {len(symbols)} фьючерсных пар")
+        return symbols
+    
     def get_all_tickers(self) -> Dict[str, Dict]:
         """
         ОПТИМИЗИРОВАННЫЙ МЕТОД: Получить ВСЕ тикеры одним запросом!
@@ -79,6 +128,99 @@ class MEXCClient:
             print(f"❌ Ошибка при получении тикеров: {e}")
             return {}
     
+    def get_price_snapshot(self) -> Optional[TickerSnapshot]:
+        """
+        САМЫЙ ЛЁГКИЙ МЕТОД: все цены одним запросом без json.loads и словарей
+        Возвращает массивы (индекс символа, last, fair) или None при ошибке
+        """
+        try:
+            raw = self._make_request("/api/v1/contract/ticker", raw=True)
+            if not raw:
+                return None
+            
+            started = time.perf_counter()
+            snapshot = self.decoder.decode(raw)
+            metrics.DECODE_SECONDS.observe(time.perf_counter() - started)
+            if snapshot is None:
+                print("⚠️ Не удалось получить тикеры")
+            return snapshot
+            
+        except Exception as e:
+            print(f"❌ Ошибка при получении тикеров: {e}")
+            return None
+    
+    def stream_price_snapshot(self, on_batch: Optional[Callable[[TickerSnapshot], None]] = None
+                              ) -> Optional[TickerSnapshot]:
+        """
+        То же, что get_price_snapshot, но разбор идёт по мере загрузки (сжатый ответ распаковывается кусками)
+        on_batch получает пары, чьи записи уже пришли целиком, - анализ начинается до конца загрузки
+        Возвращает полный снимок (все части) или None при ошибке
+        """
+        endpoint = "/api/v1/contract/ticker"
+        response = None
+        try:
+            started = time.perf_counter()
+            response = self.transport.get(endpoint, stream=True)
+            if not self._accept(endpoint, response):
+                return None
+            
+            reader = self.decoder.stream()
+            decode_seconds = 0.0
+            first = None
+            for chunk in response.iter_content(config.STREAM_PARSE_CHUNK_SIZE):
+                parsed = time.perf_counter()
+                batch = reader.feed(chunk)
+                decode_seconds += time.perf_counter() - parsed
+                if batch is not None:
+                    if first is None:
+                        first = time.perf_counter() - started
+                        metrics.FIRST_RECORD_SECONDS.observe(first)
+                    if on_batch:
+                        self._deliver(on_batch, batch)
+            parsed = time.perf_counter()
+            tail, snapshot = reader.finish()
+            decode_seconds += time.perf_counter() - parsed
+            if tail is not None and len(tail):
+                if first is None:
+                    metrics.FIRST_RECORD_SECONDS.observe(time.perf_counter() - started)
+                if on_batch:
+                    self._deliver(on_batch, tail)
+            
+            metrics.FETCH_SECONDS.observe(time.perf_counter() - started)
+            metrics.DECODE_SECONDS.observe(decode_seconds)
+            metrics.PAYLOAD_BYTES.observe(reader.size)
+            self.last_payload_size = reader.size
+            self.last_wire_size = response.raw.tell()  # Байт по сети (сжатых)
+            if snapshot is None:
+                print("⚠️ Не удалось получить тикеры")
+            return snapshot
+            
+        except requests.exceptions.RequestException as e:
+            if e.response is None:
+                self.last_status = None
+            metrics.REQUEST_ERRORS.inc()
+            events.emit('request_failed', endpoint=endpoint, status=self.last_status, error=str(e))
+            return None
+        except ValueError as e:
+            # Запасной разбор целого ответа через json: тело оказалось не JSON
+            print(f"❌ Ошибка при получении тикеров: {e}")
+            return None
+        finally:
+            if response is not None:
+                response.close()
+    
+    @staticmethod
+    def _deliver(on_batch: Callable[[TickerSnapshot], None], batch: TickerSnapshot):
+        """Ошибка обработчика части не обрывает загрузку: остальные пары скана всё равно разбираются"""
+        try:
+            on_batch(batch)
+        except Exception as e:
+            events.emit('scan_error', stage='part', error=repr(e))
+    
+    def fetch(self) -> Optional[TickerSnapshot]:
+        """PriceSource: снимок MEXC - основной, с ним сравниваются остальные биржи"""
+        return self.get_price_snapshot()
+    
     def get_all_price_data(self) -> List[Dict]:
         """
         СУПЕР БЫСТРЫЙ МЕТОД: Получить все цены одним запросом
@@ -92,26 +234,40 @@ class MEXCClient:
         price_data_list = []
         
         for symbol, ticker in tickers.items():
-            last_price = ticker.get('lastPrice')
-            fair_price = ticker.get('fairPrice')
-            
-            if last_price is None or fair_price is None:
-                continue
-            
-            try:
-                last_price = float(last_price)
-                fair_price = float(fair_price)
-                
-                if last_price <= 0 or fair_price <= 0:
-                    continue
-                
-                price_data_list.append({
-                    'symbol': symbol,
-                    'last_price': last_price,
-                    'fair_price': fair_price
-                })
-            except (ValueError, TypeError):
-                continue
+            price_data = self.to_price_data(symbol, ticker)
+            if price_data:
+                price_data_list.append(price_data)
         
         return price_data_list
-
+    
+    @staticmethod
+    def to_price_data(symbol: str, ticker: Dict, fields: Iterable[str] = ()) -> Optional[Dict]:
+        """
+        Преобразовать сырой тикер MEXC в {'symbol', 'last_price', 'fair_price'}
+        Используется и REST-опросом, и WebSocket-потоком
+        fields - поля тикера, нужные правилам алертов, копируются как есть
+        """
+        last_price = ticker.get('lastPrice')
+        fair_price = ticker.get('fairPrice')
+        
+        if last_price is None or fair_price is None:
+            return None
+        
+        try:
+            last_price = float(last_price)
+            fair_price = float(fair_price)
+        except (ValueError, TypeError):
+            return None
+        
+        if last_price <= 0 or fair_price <= 0:
+            return None
+        
+        price_data = {
+            'symbol': symbol,
+            'last_price': last_price,
+            'fair_price': fair_price,
+            'timestamp': ticker.get('timestamp')  # Время тикера на бирже (ms)
+        }
+        for name in fields:
+            price_data[name] = ticker.get(name)
+        return price_data
@@ -0,0 +1,178 @@
+"""
+WebSocket поток тикеров MEXC
+Подписка на push.tickers вместо REST-опроса: анализ запускается на каждый push,
+при обрыве - переподключение с переподпиской, при пропуске/протухании - REST
+"""
+import asyncio
+import inspect
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+import websockets
+
+from mexc_client import MEXCClient
+import config
+
+
+class MEXCTickerStream:
+    def __init__(self, client: MEXCClient, on_update: Callable[[List[Dict]], Union[None, Awaitable[None]]],
+                 url: Optional[str] = None, record_path: Optional[str] = None):
+        """
+        client - MEXCClient для REST-ресинхронизации и fallback
+        on_update - вызывается со списком изменившихся пар (формат get_all_price_data);
+                    корутина ожидается до чтения следующего кадра
+        """
+        self.client = client
+        self.on_update = on_update
+        self.url = url or config.MEXC_WS_URL
+        self.record_path = record_path or config.STREAM_RECORD_PATH
+
+        # Текущий снимок {symbol: ticker_data}, как в get_all_tickers
+        self.snapshot: Dict[str, Dict] = {}
+        self.is_running = False
+        self.is_connected = False
+
+        self.last_message_time = 0.0  # Локальное время последнего push
+        self.last_push_ts = 0  # Время биржи (ms) последнего push
+        self.pushes = 0
+        self.reconnects = 0
+        self.gaps = 0
+        self.rest_fallbacks = 0
+        self._record_file = None
+
+    def apply_tickers(self, tickers: List[Dict]) -> List[Dict]:
+        """Обновить снимок и вернуть пары, у которых изменились цены"""
+        changed = []
+        for ticker in tickers:
+            symbol = ticker.get('symbol')
+            if not symbol:
+                continue
+
+            previous = self.snapshot.get(symbol)
+            self.snapshot[symbol] = ticker
+            if previous is not None \
+                    and previous.get('lastPrice') == ticker.get('lastPrice') \
+                    and previous.get('fairPrice') == ticker.get('fairPrice'):
+                continue
+
+            price_data = MEXCClient.to_price_data(symbol, ticker, self.client.decoder.fields)
+            if price_data:
+                changed.append(price_data)
+        return changed
+
+    async def _emit(self, price_data: List[Dict]):
+        if not price_data:
+            return
+        try:
+            result = self.on_update(price_data)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            print(f"❌ Ошибка обработки push: {e}")
+
+    async def resync(self):
+        """Полная ресинхронизация снимка через REST (после пропуска или при fallback)"""
+        tickers = await asyncio.to_thread(self.client.get_all_tickers)
+        if not tickers:
+            return False
+        self.rest_fallbacks += 1
+        await self._emit(self.apply_tickers(list(tickers.values())))
+        return True
+
+    async def _handle_message(self, raw) -> bool:
+        """Разобрать кадр. Возвращает True если обнаружен пропуск данных"""
+        now = time.time()
+        if self._record_file:
+            self._record_file.write(json.dumps({'t': now, 'frame': raw if isinstance(raw, str) else raw.decode()}) + "\n")
+
+        message = json.loads(raw)
+        if message.get('channel') != 'push.tickers':
+            return False
+
+        gap = False
+        push_ts = message.get('ts') or 0
+        if self.last_message_time and now - self.last_message_time > config.STREAM_GAP_THRESHOLD:
+            gap = True
+        if push_ts and self.last_push_ts and push_ts < self.last_push_ts:
+            # Время биржи пошло назад - сервер переиграл/перепутал кадры
+            gap = True
+
+        self.last_message_time = now
+        self.last_push_ts = max(self.last_push_ts, push_ts)
+        self.pushes += 1
+
+        data = message.get('data') or []
+        if isinstance(data, dict):
+            data = [data]
+        await self._emit(self.apply_tickers(data))
+        return gap
+
+    async def _ping_loop(self, ws):
+        while True:
+            await asyncio.sleep(config.STREAM_PING_INTERVAL)
+            await ws.send(json.dumps({'method': 'ping'}))
+
+    async def _consume(self, ws):
+        """Подписаться и читать push до обрыва или протухания потока"""
+        await ws.send(json.dumps({'method': 'sub.tickers', 'param': {}}))
+        ping_task = asyncio.create_task(self._ping_loop(ws))
+        self.is_connected = True
+
+        # После (пере)подключения добираем всё, что пропустили, пока не было потока
+        await self.resync()
+        try:
+            while self.is_running:
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=config.STREAM_STALE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    print(f"⚠️ Поток молчит {config.STREAM_STALE_TIMEOUT} сек - переподключение")
+                    return
+
+                if await self._handle_message(raw):
+                    self.gaps += 1
+                    print("⚠️ Пропуск в потоке тикеров - ресинхронизация через REST")
+                    await self.resync()
+        finally:
+            self.is_connected = False
+            ping_task.cancel()
+
+    async def _poll_rest(self, duration: float):
+        """Fallback: опрашивать REST, пока поток недоступен"""
+        deadline = time.monotonic() + duration
+        while self.is_running and time.monotonic() < deadline:
+            await self.resync()
+            await asyncio.sleep(config.SCAN_INTERVAL)
+
+    async def run(self):
+        """Основной цикл: подключение, подписка, переподключение с backoff"""
+        self.is_running = True
+        if self.record_path:
+            self._record_file = open(self.record_path, 'a', encoding='utf-8')
+
+        attempt = 0
+        try:
+            while self.is_running:
+                try:
+                    async with websockets.connect(self.url, ping_interval=None, max_size=None) as ws:
+                        print(f"✅ WebSocket подключён: {self.url}")
+                        attempt = 0
+                        await self._consume(ws)
+                except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+                    print(f"⚠️ Ошибка WebSocket: {e}")
+
+                if not self.is_running:
+                    break
+
+                self.reconnects += 1
+                delay = min(2 ** attempt, config.STREAM_RECONNECT_MAX_DELAY)
+                attempt += 1
+                print(f"🔄 Переподключение через {delay} сек (данные пока через REST)")
+                await self._poll_rest(delay)
+        finally:
+            if self._record_file:
+                self._record_file.close()
+                self._record_file = None
+
+    def stop(self):
+        self.is_running = False
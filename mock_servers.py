@@ -0,0 +1,479 @@
+"""
+Локальные заглушки внешних сервисов для проверки без живой биржи
+"""
+import asyncio
+import gzip
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import websockets
+
+
+def load_recorded_frames(path: str) -> List[dict]:
+    """Прочитать кадры, записанные MEXCTickerStream (STREAM_RECORD_PATH)"""
+    frames = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                frames.append(json.loads(line))
+    return frames
+
+
+class ReplayTickerServer:
+    """
+    WebSocket заглушка MEXC: принимает sub.tickers/ping и
+    проигрывает записанные кадры с исходными интервалами (ускоренно через speed)
+    """
+
+    def __init__(self, frames: List[dict], host: str = '127.0.0.1', port: int = 0,
+                 speed: float = 1.0, drop_after: Optional[int] = None):
+        """
+        frames - [{'t': время_приёма, 'frame': сырой_кадр}]
+        drop_after - оборвать соединение после N кадров (проверка переподключения)
+        """
+        self.frames = frames
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self.drop_after = drop_after
+        self.connections = 0
+        self.subscriptions = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}/edge"
+
+    async def _replay(self, ws):
+        previous_t = None
+        for sent, item in enumerate(self.frames):
+            if self.drop_after is not None and sent >= self.drop_after:
+                await ws.close()
+                return
+            if previous_t is not None:
+                await asyncio.sleep(max(0.0, item['t'] - previous_t) / self.speed)
+            previous_t = item['t']
+            await ws.send(item['frame'])
+
+    async def _handler(self, ws, path=None):
+        self.connections += 1
+        replay_task = None
+        try:
+            async for raw in ws:
+                message = json.loads(raw)
+                method = message.get('method')
+                if method == 'ping':
+                    await ws.send(json.dumps({'channel': 'pong', 'data': 0}))
+                elif method == 'sub.tickers':
+                    self.subscriptions += 1
+                    await ws.send(json.dumps({'channel': 'rs.sub.tickers', 'data': 'success'}))
+                    if replay_task is None:
+                        replay_task = asyncio.create_task(self._replay(ws))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if replay_task:
+                replay_task.cancel()
+
+    async def start(self):
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+class MockMEXCServer:
+    """
+    HTTP заглушка REST API фьючерсов MEXC: /api/v1/contract/detail, /api/v1/contract/ticker
+    (все пары или ?symbol=) и /api/v1/contract/fair_price/{symbol}
+    Ответы кодируются заранее (set_contracts/set_prices), запрос только отдаёт байты
+    (gzip - если клиент его принимает, сжатый ответ кэшируется до следующего set_prices)
+    """
+
+    def __init__(self, contracts: int = 500, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, seed: int = 1, slow_rate: float = 0.0,
+                 slow_latency: float = 1.0, fail_rate: float = 0.0, bandwidth: float = 0.0,
+                 compress: bool = True):
+        """
+        contracts - сколько контрактов SYM{i}_USDT отдавать
+        latency - искусственная задержка ответа (сек)
+        slow_rate/slow_latency - доля ответов с задержкой slow_latency (хвост задержек)
+        fail_rate - доля ответов 503
+        bandwidth - ограничение скорости отдачи тела, байт/сек (0 - без ограничения)
+        compress - отдавать gzip клиентам с Accept-Encoding: gzip
+        """
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.fail_rate = fail_rate
+        self.bandwidth = bandwidth
+        self.compress = compress
+        self._gzipped = (b'', b'')  # (тело массового тикера, оно же сжатое)
+        self.requests: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._detail = b''
+        self._ticker = b''
+        self.symbols: List[str] = []
+        self._fair: List[float] = []
+        self._spread: List[float] = []
+        self.updated_at = 0.0  # Когда опубликован текущий снимок цен (time.time())
+        # Пары, чей спред в массовом тикере - устаревший lastPrice: по отдельной паре его нет
+        self.stale: set = set()
+        self._index: Dict[str, int] = {}
+        self._bursts: Dict[str, float] = {}
+        self._timestamp = 0
+        self.set_contracts([f"SYM{i}_USDT" for i in range(contracts)])
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path, _, query = self.path.partition('?')
+                symbol = parse_qs(query).get('symbol', [None])[0]
+                if path.startswith('/api/v1/contract/fair_price/'):
+                    path, symbol = path.rsplit('/', 1)
+                # Запросы по одной паре считаются отдельно от массового тикера
+                key = f"{path}/{{symbol}}" if symbol else path
+                server.requests[key] = server.requests.get(key, 0) + 1
+                delay = server.latency
+                if server.slow_rate and server._rng.random() < server.slow_rate:
+                    delay = server.slow_latency
+                if delay:
+                    time.sleep(delay)
+                if server.fail_rate and server._rng.random() < server.fail_rate:
+                    self.send_error(503)
+                    return
+                if path == '/api/v1/contract/detail':
+                    body = server._detail
+                elif path == '/api/v1/contract/ticker':
+                    body = server._ticker if symbol is None else server.symbol_ticker(symbol)
+                elif path == '/api/v1/contract/fair_price':
+                    body = server.fair_price(symbol)
+                else:
+                    body = None
+                if body is None:
+                    self.send_error(404)
+                    return
+                gzipped = server.compress and 'gzip' in self.headers.get('Accept-Encoding', '')
+                if gzipped:
+                    body = server.gzipped(body)
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                if gzipped:
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    server.write(self.wfile, body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Клиент не дождался ответа (дедлайн подтверждения) - для заглушки это норма
+                    pass
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Подставляется в config.MEXC_BASE_URL"""
+        return f"http://{self.host}:{self.port}"
+
+    def set_contracts(self, symbols: List[str]):
+        """Заменить список контрактов (листинг/делистинг) и перегенерировать цены"""
+        self.symbols = list(symbols)
+        self._index = {s: i for i, s in enumerate(self.symbols)}
+        detail = [{'symbol': s, 'priceUnit': 0.0001, 'state': 0, 'openingTime': 1700000000000 + i}
+                  for i, s in enumerate(self.symbols)]
+        self._detail = json.dumps({'success': True, 'code': 0, 'data': detail}).encode()
+        self._fair = [0.0] * len(self.symbols)
+        self._spread = [0.0] * len(self.symbols)
+        # Остальные поля тикера (для правил алертов) - свой генератор, цены от них не зависят
+        fields_rng = random.Random(len(self.symbols))
+        self._volume = [round(fields_rng.lognormvariate(12, 2)) for _ in self.symbols]
+        self._funding = [round(fields_rng.gauss(0, 0.0003), 6) for _ in self.symbols]
+        self.set_prices()
+
+    def set_prices(self, spreads: Optional[Dict[str, float]] = None, churn: float = 1.0):
+        """
+        Новый снимок цен: спреды из spreads (%), у остальных пар в пределах +-2%
+        churn - доля пар, у которых меняется цена (остальные повторяют прошлый снимок)
+        """
+        spreads = spreads or {}
+        now = int(time.time() * 1000)
+        rng = self._rng
+        fair_prices, base_spreads = self._fair, self._spread
+        tickers = []
+        for i, s in enumerate(self.symbols):
+            if churn >= 1.0 or not fair_prices[i] or rng.random() < churn:
+                fair_prices[i] = round(rng.uniform(0.001, 50000), 6)
+                base_spreads[i] = rng.uniform(-2, 2)
+            fair = fair_prices[i]
+            spread = spreads.get(s, base_spreads[i])
+            last = round(fair * (1 + spread / 100), 8)
+            tickers.append({'symbol': s, 'lastPrice': last, 'fairPrice': fair, 'indexPrice': fair,
+                            'volume24': self._volume[i], 'amount24': round(self._volume[i] * fair, 2),
+                            'timestamp': now, 'bid1': round(last * 0.9999, 8), 'ask1': round(last * 1.0001, 8),
+                            'fundingRate': self._funding[i]})
+        self._ticker = json.dumps({'success': True, 'code': 0, 'data': tickers}).encode()
+        self._bursts = dict(spreads)
+        self._timestamp = now
+        self.updated_at = time.time()
+
+    def gzipped(self, body: bytes) -> bytes:
+        """Сжатое тело; массовый тикер сжимается один раз на снимок"""
+        if body is not self._ticker:
+            return gzip.compress(body, compresslevel=6)
+        source, cached = self._gzipped
+        if source is not body:
+            cached = gzip.compress(body, compresslevel=6)
+            self._gzipped = (body, cached)
+        return cached
+
+    def write(self, wfile, body: bytes):
+        """Отдать тело, не быстрее bandwidth байт/сек (медленный канал до биржи)"""
+        if not self.bandwidth:
+            wfile.write(body)
+            return
+        step = 16 * 1024
+        started = time.perf_counter()
+        for offset in range(0, len(body), step):
+            wfile.write(body[offset:offset + step])
+            wfile.flush()
+            delay = started + (offset + step) / self.bandwidth - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+    def symbol_ticker(self, symbol: str) -> Optional[bytes]:
+        """Тикер одной пары со стаканом; у пар из stale спреда всплеска нет (цена уже вернулась)"""
+        i = self._index.get(symbol)
+        if i is None:
+            return None
+        fair = self._fair[i]
+        spread = self._spread[i] if symbol in self.stale else self._bursts.get(symbol, self._spread[i])
+        last = round(fair * (1 + spread / 100), 8)
+        ticker = {'symbol': symbol, 'lastPrice': last, 'bid1': round(last * 0.9999, 8),
+                  'ask1': round(last * 1.0001, 8), 'fairPrice': fair, 'indexPrice': fair, 'timestamp': self._timestamp}
+        return json.dumps({'success': True, 'code': 0, 'data': ticker}).encode()
+
+    def fair_price(self, symbol: str) -> Optional[bytes]:
+        i = self._index.get(symbol)
+        if i is None:
+            return None
+        data = {'symbol': symbol, 'fairPrice': self._fair[i], 'timestamp': self._timestamp}
+        return json.dumps({'success': True, 'code': 0, 'data': data}).encode()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class MockVenueServer:
+    """
+    HTTP заглушка тикеров другой биржи (binance, bybit, okx) в её формате ответа
+    Цены задаются по символам MEXC (BTC_USDT) и переводятся в имена биржи
+    """
+
+    PATHS = {'binance': '/fapi/v1/ticker/price', 'bybit': '/v5/market/tickers', 'okx': '/api/v5/market/tickers'}
+
+    def __init__(self, venue: str, prices: Optional[Dict[str, float]] = None, host: str = '127.0.0.1',
+                 port: int = 0, latency: float = 0.0, fail_rate: float = 0.0, seed: int = 1):
+        """
+        prices - symbol MEXC -> last на этой бирже
+        latency - задержка ответа (сек): медленная биржа для проверки дедлайна скана
+        """
+        if venue not in self.PATHS:
+            raise ValueError(f"venue должен быть одним из {tuple(self.PATHS)}")
+        self.venue = venue
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._body = b''
+        self.set_prices(prices or {})
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.partition('?')[0] != server.PATHS[server.venue]:
+                    self.send_error(404)
+                    return
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.fail_rate and server._rng.random() < server.fail_rate:
+                    self.send_error(503)
+                    return
+                body = server._body
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # Клиент ушёл по дедлайну скана
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def set_prices(self, prices: Dict[str, float]):
+        """Новый снимок цен биржи (ответ кодируется заранее)"""
+        self.prices = dict(prices)
+        now = int(time.time() * 1000)
+        if self.venue == 'binance':
+            body = [{'symbol': s.replace('_', ''), 'price': f"{p:.8g}", 'time': now} for s, p in self.prices.items()]
+        elif self.venue == 'bybit':
+            body = {'retCode': 0, 'retMsg': 'OK', 'result': {'category': 'linear', 'list': [
+                {'symbol': s.replace('_', ''), 'lastPrice': f"{p:.8g}"} for s, p in self.prices.items()]}}
+        else:
+            body = {'code': '0', 'msg': '', 'data': [
+                {'instId': s.replace('_', '-') + '-SWAP', 'last': f"{p:.8g}", 'ts': str(now)}
+                for s, p in self.prices.items()]}
+        self._body = json.dumps(body).encode()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+class MockTelegramServer:
+    """
+    HTTP заглушка Bot API: запоминает принятые сообщения и
+    отвечает 429 с retry_after при превышении лимита на чат
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 chat_limit: int = 20, window: float = 60.0, latency: float = 0.0,
+                 global_limit: int = 30):
+        """
+        chat_limit/window - не больше chat_limit сообщений в чат за window секунд
+        global_limit - не больше стольких сообщений в секунду на бота (во все чаты)
+        latency - искусственная задержка ответа (сек)
+        """
+        self.chat_limit = chat_limit
+        self.window = window
+        self.global_limit = global_limit
+        self.latency = latency
+        self.messages: List[Dict] = []
+        self.rejected = 0
+        self._sent_times: Dict[str, deque] = {}
+        self._global_times: deque = deque()
+        self._lock = threading.Lock()
+        self._next_message_id = 1
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                method = self.path.rsplit('/', 1)[-1]
+                if 'json' in self.headers.get('Content-Type', ''):
+                    payload = json.loads(body or b'{}')
+                else:
+                    # python-telegram-bot шлёт параметры формой
+                    payload = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+                status, response = server.handle(method, payload)
+                data = json.dumps(response).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer((host, port), Handler)
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """Подставляется в config.TELEGRAM_API_URL"""
+        return f"http://{self.host}:{self.port}"
+
+    def handle(self, method: str, payload: Dict):
+        # Служебные методы python-telegram-bot Application (запуск бота на заглушке)
+        if method == 'getMe':
+            return 200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'mock', 'username': 'mock_bot'}}
+        if method == 'getUpdates':
+            time.sleep(min(float(payload.get('timeout') or 0), 0.5))
+            return 200, {'ok': True, 'result': []}
+        if method in ('deleteWebhook', 'setMyCommands', 'close', 'logOut'):
+            return 200, {'ok': True, 'result': True}
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        chat_id = str(payload.get('chat_id'))
+        now = time.monotonic()
+        with self._lock:
+            sent = self._sent_times.setdefault(chat_id, deque())
+            while sent and now - sent[0] >= self.window:
+                sent.popleft()
+            global_sent = self._global_times
+            while global_sent and now - global_sent[0] >= 1.0:
+                global_sent.popleft()
+            if len(sent) >= self.chat_limit or len(global_sent) >= self.global_limit:
+                self.rejected += 1
+                if len(sent) >= self.chat_limit:
+                    retry_after = max(1, int(self.window - (now - sent[0])) + 1)
+                else:
+                    retry_after = 1
+                return 429, {
+                    'ok': False,
+                    'error_code': 429,
+                    'description': f'Too Many Requests: retry after {retry_after}',
+                    'parameters': {'retry_after': retry_after}
+                }
+            sent.append(now)
+            global_sent.append(now)
+
+            if method == 'editMessageText':
+                message_id = int(payload.get('message_id') or 0)
+                if not 0 < message_id < self._next_message_id:
+                    return 400, {'ok': False, 'error_code': 400, 'description': 'Bad Request: message to edit not found'}
+            else:
+                message_id = self._next_message_id
+                self._next_message_id += 1
+            self.messages.append({'method': method, 'received_at': time.time(), 'message_id': message_id, **payload})
+
+        return 200, {'ok': True, 'result': {'message_id': message_id, 'chat': {'id': payload.get('chat_id')}}}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,85 @@
+"""
+Неизменяемый снимок состояния монитора, публикуемый после каждого скана
+Команды бота читают только его - без блокировок и без доступа к горячему циклу
+"""
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+
+class SpreadStats(NamedTuple):
+    """
+    Статистика пар на конец скана для /top и /symbol: копии массивов анализатора по индексам SymbolTable
+    index/names - таблица символов (только дописывается: индексы за пределами копий - пары новее снимка)
+    """
+    index: Dict[str, int]
+    names: List[str]
+    last: np.ndarray
+    fair: np.ndarray
+    spread: np.ndarray
+    ewma: np.ndarray
+    std: np.ndarray
+    zscore: np.ndarray
+    above_since: np.ndarray  # NaN - сейчас ниже порога
+    above_total: np.ndarray  # Секунды выше порога в завершённых эпизодах
+    consecutive_above: np.ndarray
+    cooldown: np.ndarray  # bool: у пары активен cooldown
+
+    def symbol(self, symbol: str, now: Optional[float] = None) -> Optional[Dict]:
+        """Статистика одной пары (None - пары нет или цен ещё не было)"""
+        idx = self.index.get(symbol)
+        if idx is None or idx >= len(self.last) or np.isnan(self.last[idx]):
+            return None
+        if now is None:
+            now = time.time()
+        since = self.above_since[idx]
+        above_now = 0.0 if np.isnan(since) else float(now - since)
+        return {
+            'symbol': symbol,
+            'last_price': float(self.last[idx]),
+            'fair_price': float(self.fair[idx]),
+            'spread_percent': float(self.spread[idx]),
+            'ewma': float(self.ewma[idx]),
+            'std': float(self.std[idx]),
+            'zscore': float(self.zscore[idx]),
+            'above_now': above_now,
+            'above_total': float(self.above_total[idx]) + above_now,
+            'consecutive_above': int(self.consecutive_above[idx]),
+            'cooldown': bool(self.cooldown[idx]),
+        }
+
+    def top(self, n: int, by: str = 'spread', now: Optional[float] = None) -> List[Dict]:
+        """
+        N пар с наибольшим |спредом| (by='spread') или |z-score| (by='z')
+        Частичный отбор argpartition за O(n), сортируются только N выбранных
+        """
+        size = len(self.last)
+        if size == 0 or n <= 0:
+            return []
+        source = self.spread if by == 'spread' else self.zscore
+        # Пары без цен (ещё не было в снимке или сняты с торгов) в отбор не попадают
+        values = np.where(np.isnan(self.last), -np.inf, np.abs(source))
+        n = min(n, int(np.count_nonzero(values > -np.inf)))
+        if n == 0:
+            return []
+        selected = np.argpartition(values, size - n)[size - n:]
+        selected = selected[np.argsort(values[selected])[::-1]]
+        if now is None:
+            now = time.time()
+        return [self.symbol(self.names[i], now) for i in selected.tolist()]
+
+
+class MonitorState(NamedTuple):
+    scan_counter: int = 0
+    total_alerts: int = 0
+    symbols_count: int = 0  # Пар в списке контрактов
+    pairs_in_scan: int = 0  # Пар с ценами в последнем скане
+    changed_pairs: int = 0  # Из них с изменившимися ценами (только они пересчитывались)
+    max_spread: float = 0.0
+    max_spread_pair: Optional[str] = None
+    active_cooldowns: int = 0
+    achieved_hz: float = 0.0
+    target_hz: float = 0.0
+    updated_at: float = 0.0
+    stats: Optional[SpreadStats] = None  # Статистика пар для /top и /symbol (None - сканов ещё не было)
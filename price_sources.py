@@ -0,0 +1,292 @@
+"""
+Источники цен с нескольких бирж: та же пара на Binance/Bybit/OKX рядом с MEXC
+Каждый источник отдаёт снимок в индексах общей SymbolTable (символы приводятся к виду MEXC),
+VenuePrices опрашивает все биржи параллельно в пределах дедлайна скана и держит цены
+каждой биржи в массиве по индексам таблицы - межбиржевой спред считается на выровненных массивах
+"""
+import re
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from event_log import events
+from symbol_table import SymbolTable
+from ticker_decoder import TickerSnapshot
+import metrics
+import config
+
+# Множитель в имени контракта (1000PEPEUSDT = 1000 PEPE): цена делится на него
+_MULTIPLIER_RE = re.compile(r'^(1000000|100000|10000|1000|1M)(?=[A-Z])')
+_MULTIPLIERS = {'1000000': 1e6, '100000': 1e5, '10000': 1e4, '1000': 1e3, '1M': 1e6}
+
+
+class PriceSource:
+    """Источник цен одной биржи: снимок всех пар в индексах общей SymbolTable"""
+
+    name = ''
+
+    def fetch(self) -> Optional[TickerSnapshot]:
+        """Снимок цен (None - ошибка запроса или ответ без данных)"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class HttpVenueSource(PriceSource):
+    """
+    Биржа с REST-эндпоинтом всех тикеров одним запросом
+    Наследник задаёт path/params, parse (ответ -> [(символ биржи, last)]) и base (символ -> база/котировка)
+    """
+
+    default_url = ''
+    path = ''
+    params: Optional[Dict] = None
+
+    def __init__(self, symbol_table: SymbolTable, base_url: Optional[str] = None,
+                 timeout: Optional[float] = None, overrides: Optional[Dict[str, str]] = None):
+        """
+        base_url - адрес API биржи (заглушка в тестах)
+        overrides - символ биржи -> символ MEXC, если автоматическое приведение не подходит
+        """
+        self.symbol_table = symbol_table
+        self.base_url = (base_url or config.VENUE_URLS.get(self.name) or self.default_url).rstrip('/')
+        # Таймаут запроса длиннее дедлайна скана: медленная биржа не ждётся сканом, но её ответ не теряется
+        self.timeout = config.REQUEST_TIMEOUT if timeout is None else timeout
+        self.overrides = dict(config.VENUE_SYMBOL_OVERRIDES.get(self.name, {}) if overrides is None else overrides)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        # Символ биржи -> (индекс в таблице, множитель цены) или None; сбрасывается, когда растёт таблица
+        self._lookup: Dict[str, Optional[Tuple[int, float]]] = {}
+        self._table_size = -1
+        self.last_status: Optional[int] = None
+
+    def parse(self, body) -> Iterable[Tuple[str, str]]:
+        raise NotImplementedError
+
+    def base(self, symbol: str) -> Optional[str]:
+        """База контракта в USDT (BTCUSDT -> BTC); None - не USDT-контракт"""
+        raise NotImplementedError
+
+    def normalize(self, symbol: str) -> List[Tuple[str, float]]:
+        """Кандидаты (символ MEXC, множитель): как есть, затем без множителя в имени"""
+        if symbol in self.overrides:
+            return [(self.overrides[symbol], 1.0)]
+        base = self.base(symbol)
+        if not base:
+            return []
+        candidates = [(f"{base}_USDT", 1.0)]
+        match = _MULTIPLIER_RE.match(base)
+        if match:
+            candidates.append((f"{base[match.end():]}_USDT", _MULTIPLIERS[match.group(1)]))
+        return candidates
+
+    def _resolve(self, symbol: str) -> Optional[Tuple[int, float]]:
+        index = self.symbol_table.index
+        for canonical, multiplier in self.normalize(symbol):
+            idx = index.get(canonical)
+            if idx is not None:
+                return idx, multiplier
+        return None
+
+    def align(self, rows: Iterable[Tuple[str, str]]) -> TickerSnapshot:
+        """Пары биржи, которые торгуются на MEXC, - в снимок по индексам таблицы"""
+        if len(self.symbol_table) != self._table_size:
+            self._lookup.clear()  # Новые листинги на MEXC: пары биржи, не найденные раньше, ищутся заново
+            self._table_size = len(self.symbol_table)
+        lookup = self._lookup
+        idx, last = [], []
+        for symbol, price in rows:
+            resolved = lookup.get(symbol, False)
+            if resolved is False:
+                resolved = lookup[symbol] = self._resolve(symbol)
+            if resolved is None:
+                continue
+            try:
+                value = float(price) / resolved[1]
+            except (TypeError, ValueError):
+                continue
+            if value > 0:
+                idx.append(resolved[0])
+                last.append(value)
+        last = np.array(last, dtype=np.float64)
+        return TickerSnapshot(np.array(idx, dtype=np.int64), last, np.full(len(last), np.nan), time.time())
+
+    def fetch(self) -> Optional[TickerSnapshot]:
+        try:
+            response = self.session.get(f"{self.base_url}{self.path}", params=self.params, timeout=self.timeout)
+            self.last_status = response.status_code
+            response.raise_for_status()
+            return self.align(self.parse(response.json()))
+        except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as e:
+            events.emit('request_failed', endpoint=f"{self.name}{self.path}", status=self.last_status, error=str(e))
+            return None
+
+    def close(self):
+        self.session.close()
+
+
+class BinanceSource(HttpVenueSource):
+    """USDⓈ-M фьючерсы Binance: /fapi/v1/ticker/price"""
+
+    name = 'binance'
+    default_url = 'https://fapi.binance.com'
+    path = '/fapi/v1/ticker/price'
+
+    def parse(self, body):
+        return ((row['symbol'], row['price']) for row in body)
+
+    def base(self, symbol: str) -> Optional[str]:
+        return symbol[:-4] if symbol.endswith('USDT') else None
+
+
+class BybitSource(HttpVenueSource):
+    """Линейные контракты Bybit: /v5/market/tickers?category=linear"""
+
+    name = 'bybit'
+    default_url = 'https://api.bybit.com'
+    path = '/v5/market/tickers'
+    params = {'category': 'linear'}
+
+    def parse(self, body):
+        if body.get('retCode') != 0:
+            raise ValueError(f"retCode {body.get('retCode')}: {body.get('retMsg')}")
+        return ((row['symbol'], row['lastPrice']) for row in body['result']['list'])
+
+    def base(self, symbol: str) -> Optional[str]:
+        return symbol[:-4] if symbol.endswith('USDT') else None
+
+
+class OKXSource(HttpVenueSource):
+    """Бессрочные свопы OKX: /api/v5/market/tickers?instType=SWAP (BTC-USDT-SWAP)"""
+
+    name = 'okx'
+    default_url = 'https://www.okx.com'
+    path = '/api/v5/market/tickers'
+    params = {'instType': 'SWAP'}
+
+    def parse(self, body):
+        if body.get('code') != '0':
+            raise ValueError(f"code {body.get('code')}: {body.get('msg')}")
+        return ((row['instId'], row['last']) for row in body['data'])
+
+    def base(self, symbol: str) -> Optional[str]:
+        parts = symbol.split('-')
+        return parts[0] if len(parts) == 3 and parts[1] == 'USDT' and parts[2] == 'SWAP' else None
+
+
+# Имя биржи в VENUES и в правилах алертов -> адаптер
+VENUE_SOURCES = {source.name: source for source in (BinanceSource, BybitSource, OKXSource)}
+
+
+class VenuePrices:
+    def __init__(self, sources: Sequence[PriceSource], symbol_table: SymbolTable,
+                 deadline: Optional[float] = None, max_age: Optional[float] = None):
+        """
+        deadline - общий дедлайн скана (сек от его начала): кто не успел, применится в следующем скане
+        max_age - цены биржи старше этого не участвуют в спредах (NaN)
+        """
+        self.sources = list(sources)
+        self.symbol_table = symbol_table
+        self.deadline = config.VENUE_DEADLINE if deadline is None else deadline
+        self.max_age = config.VENUE_MAX_AGE if max_age is None else max_age
+
+        self._pool = ThreadPoolExecutor(max_workers=max(1, len(self.sources)), thread_name_prefix="venue")
+        # Цены биржи по индексам SymbolTable (NaN - пары на бирже нет)
+        self.last: Dict[str, np.ndarray] = {s.name: np.full(0, np.nan) for s in self.sources}
+        self.updated_at: Dict[str, float] = {s.name: -np.inf for s in self.sources}
+        self.fetch_seconds: Dict[str, float] = {s.name: np.nan for s in self.sources}
+        self._inflight: Dict[str, Future] = {}
+        self.late = 0  # Ответов, не успевших к дедлайну скана
+        self.failures = 0
+
+    @classmethod
+    def from_config(cls, symbol_table: SymbolTable, names: Optional[Iterable[str]] = None) -> 'VenuePrices':
+        """Источники из VENUES (неизвестное имя - ValueError)"""
+        names = config.VENUES if names is None else names
+        unknown = [name for name in names if name not in VENUE_SOURCES]
+        if unknown:
+            raise ValueError(f"неизвестные биржи в VENUES: {', '.join(unknown)} (есть: {', '.join(VENUE_SOURCES)})")
+        return cls([VENUE_SOURCES[name](symbol_table) for name in names], symbol_table)
+
+    @property
+    def names(self) -> List[str]:
+        return [s.name for s in self.sources]
+
+    def _timed_fetch(self, source: PriceSource) -> Tuple[Optional[TickerSnapshot], float]:
+        started = time.perf_counter()
+        snapshot = source.fetch()
+        return snapshot, time.perf_counter() - started
+
+    def submit(self):
+        """Запустить запросы ко всем биржам; биржа с запросом из прошлого скана не дублируется"""
+        for source in self.sources:
+            if source.name not in self._inflight:
+                self._inflight[source.name] = self._pool.submit(self._timed_fetch, source)
+
+    def collect(self, started: float):
+        """
+        Дождаться бирж до дедлайна скана (started - perf_counter начала скана) и применить ответы
+        Не успевшие остаются в полёте: их ответ применится следующим collect
+        """
+        if not self._inflight:
+            return
+        remaining = self.deadline - (time.perf_counter() - started)
+        done, pending = wait(list(self._inflight.values()), timeout=max(0.0, remaining))
+        self.late += len(pending)
+        if pending:
+            metrics.VENUE_LATE.inc(len(pending))
+        for name, future in list(self._inflight.items()):
+            if future not in done:
+                continue
+            del self._inflight[name]
+            snapshot, seconds = future.result()
+            self.fetch_seconds[name] = seconds
+            metrics.VENUE_FETCH_SECONDS.observe(seconds)
+            if snapshot is None:
+                self.failures += 1
+                continue
+            self.apply(name, snapshot)
+
+    def apply(self, name: str, snapshot: TickerSnapshot):
+        """Полный снимок биржи: пары, которых в нём нет, становятся NaN"""
+        size = len(self.symbol_table)
+        prices = self.last[name]
+        if len(prices) < size:
+            prices = np.full(max(size, len(prices) * 2, 1024), np.nan)
+        else:
+            prices.fill(np.nan)
+        prices[snapshot.idx] = snapshot.last
+        self.last[name] = prices
+        self.updated_at[name] = snapshot.received_at
+
+    def columns(self, idx: np.ndarray, now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Цены бирж, выровненные по снимку MEXC (idx); устаревшая или недоступная биржа - NaN"""
+        if now is None:
+            now = time.time()
+        columns = {}
+        for name, prices in self.last.items():
+            if now - self.updated_at[name] > self.max_age:
+                columns[name] = np.full(idx.size, np.nan)
+            elif idx.size and int(idx.max()) >= len(prices):
+                # Пары, добавленные в таблицу после ответа биржи, - NaN до следующего ответа
+                column = np.full(idx.size, np.nan)
+                known = idx < len(prices)
+                column[known] = prices[idx[known]]
+                columns[name] = column
+            else:
+                columns[name] = prices[idx]
+        return columns
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        for source in self.sources:
+            source.close()
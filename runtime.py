@@ -0,0 +1,173 @@
+"""
+Единый asyncio-рантайм: получение тикеров, анализ, отправка алертов и команды бота
+работают как задачи одного цикла событий, без потоков, гоняющихся за состоянием монитора
+"""
+import asyncio
+import signal
+from typing import List, Optional
+
+from telegram.ext import Application
+
+from event_log import events
+from mexc_stream import MEXCTickerStream
+from telegram_bot_commands import TelegramBotCommands
+import config
+
+
+class MonitorRuntime:
+    def __init__(self, monitor, application: Optional[Application] = None, enable_bot: Optional[bool] = None):
+        """
+        monitor - экземпляр PriceSpreadMonitor
+        application - готовое python-telegram-bot Application (например, на локальной заглушке Bot API)
+        """
+        self.monitor = monitor
+        self.enable_bot = config.TELEGRAM_BOT_COMMANDS if enable_bot is None else enable_bot
+        self.application = application
+        self.commands: Optional[TelegramBotCommands] = None
+        self.tasks: List[asyncio.Task] = []
+        self._stop_event: Optional[asyncio.Event] = None
+
+    def stop(self):
+        """Запросить остановку (можно вызывать из обработчика сигнала)"""
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    def _install_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+            except (NotImplementedError, RuntimeError):
+                pass  # Windows / не главный поток: остаётся KeyboardInterrupt
+
+    async def _start_bot(self):
+        """Запустить команды бота; ошибка запуска не останавливает мониторинг"""
+        if not self.enable_bot:
+            return
+        try:
+            await self._start_application()
+        except Exception as e:
+            print(f"⚠️ Команды бота не запущены: {e}")
+
+    async def _start_application(self):
+        if self.application is None:
+            self.application = (
+                Application.builder()
+                .token(config.TELEGRAM_BOT_TOKEN)
+                .base_url(f"{config.TELEGRAM_API_URL}/bot")
+                .build()
+            )
+        self.commands = TelegramBotCommands(self.monitor)
+        self.commands.setup_handlers(self.application)
+
+        await self.application.initialize()
+        await self.application.start()
+        await self.application.updater.start_polling(drop_pending_updates=True, bootstrap_retries=3)
+        print("🤖 Команды бота запущены: /start /status /stats /subscribe /mysub /top /symbol")
+
+    async def _stop_bot(self):
+        application = self.application
+        if application is None or not self.enable_bot:
+            return
+        try:
+            if application.updater and application.updater.running:
+                await application.updater.stop()
+            if application.running:
+                await application.stop()
+            await application.shutdown()
+        except Exception as e:
+            print(f"⚠️ Ошибка остановки бота: {e}")
+
+    async def _load_symbols(self) -> bool:
+        while not self._stop_event.is_set():
+            if await asyncio.to_thread(self.monitor.load_symbols):
+                return True
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                pass
+        return False
+
+    async def _refresh_contracts(self):
+        """Периодически перечитывать список контрактов; разница применяется в следующем скане"""
+        delay = self.monitor.contract_refresh_delay()
+        while True:
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=delay)
+                return
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.to_thread(self.monitor.fetch_contracts)
+            delay = config.CONTRACT_REFRESH_INTERVAL
+
+    async def run(self):
+        """Запустить все задачи и ждать остановки (сигнал, stop() или падение задачи)"""
+        monitor = self.monitor
+        self._stop_event = asyncio.Event()
+        self._install_signal_handlers()
+
+        monitor.print_banner()
+        try:
+            if not await self._load_symbols():
+                return
+
+            monitor.is_running = True
+            events.start()
+            monitor.start_metrics()
+            self.tasks.append(asyncio.create_task(monitor.dispatcher.run_async(), name="alert-sender"))
+            self.tasks.append(asyncio.create_task(self._refresh_contracts(), name="contract-refresh"))
+
+            if config.INGESTION_MODE == 'ws':
+                monitor.stream = MEXCTickerStream(monitor.mexc, monitor.process_price_data_async)
+                self.tasks.append(asyncio.create_task(monitor.stream.run(), name="ticker-stream"))
+            elif config.INGESTION_MODE == 'bus':
+                await asyncio.to_thread(monitor.start_bus)
+                self.tasks.append(asyncio.create_task(monitor.consume_bus_async(), name="bus-reader"))
+            else:
+                self.tasks.append(asyncio.create_task(
+                    monitor.scheduler.run_async(monitor.scan_all_pairs_async, lambda: monitor.is_running),
+                    name="scan-loop"
+                ))
+
+            await self._start_bot()
+            monitor.print_started()
+
+            stop_waiter = asyncio.create_task(self._stop_event.wait())
+            done, _ = await asyncio.wait(self.tasks + [stop_waiter], return_when=asyncio.FIRST_COMPLETED)
+            stop_waiter.cancel()
+            for task in done:
+                if task is not stop_waiter and not task.cancelled() and task.exception():
+                    print(f"❌ Задача {task.get_name()} упала: {task.exception()!r}")
+        finally:
+            await self.shutdown()
+
+    async def shutdown(self):
+        """Остановить источники данных, дослать очередь, отменить задачи, закрыть бота"""
+        monitor = self.monitor
+        print("\n🛑 Остановка...")
+        monitor.is_running = False
+        if monitor.stream:
+            monitor.stream.stop()
+
+        await self._stop_bot()
+        await monitor.dispatcher.drain()
+
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        monitor.stop_bus()
+        if monitor.confirmer:
+            monitor.confirmer.close()
+        if monitor.venues:
+            monitor.venues.close()
+
+        if monitor.recorder:
+            monitor.recorder.close()
+        if monitor.journal:
+            monitor.journal.close()
+        if monitor.metrics_server:
+            monitor.metrics_server.stop()
+        events.stop()
+        print(f"📊 Статистика: выполнено {monitor.scan_counter} сканирований, отправлено {monitor.total_alerts} алертов")
+        print("✅ Мониторинг остановлен")
@@ -0,0 +1,162 @@
+"""
+Планировщик сканирований с фиксированной частотой
+Сканы стартуют по сетке времени (а не "скан + пауза"), пропущенные тики не копятся,
+а сливаются в один. Темп задаёт подключаемая политика: быстрее при спредах около порога,
+медленнее при 429/5xx и Retry-After. Часы и sleep подставляются - удобно для fake clock
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from event_log import events
+import metrics
+import config
+
+
+class PacingPolicy:
+    """Политика темпа: по результату скана выбирает интервал до следующего"""
+
+    def __init__(self, base_interval: Optional[float] = None):
+        self.base_interval = config.SCAN_INTERVAL if base_interval is None else base_interval
+
+    def next_interval(self, feedback: Optional[Dict]) -> float:
+        return self.base_interval
+
+
+class FixedPacing(PacingPolicy):
+    """Всегда SCAN_INTERVAL"""
+
+
+class AdaptivePacing(PacingPolicy):
+    """
+    Ускоряется, пока есть спреды около порога, и отступает при ответах биржи 429/5xx
+
+    feedback скана: {'max_spread': float, 'status': int|None, 'retry_after': float|None,
+                     'rate_limit_remaining': int|None}
+    """
+
+    def __init__(self, base_interval: Optional[float] = None, fast_interval: Optional[float] = None,
+                 max_interval: Optional[float] = None, near_ratio: Optional[float] = None):
+        super().__init__(base_interval)
+        self.fast_interval = config.PACING_FAST_INTERVAL if fast_interval is None else fast_interval
+        self.max_interval = config.PACING_MAX_INTERVAL if max_interval is None else max_interval
+        self.near_ratio = config.PACING_NEAR_RATIO if near_ratio is None else near_ratio
+        self.backoff = 0.0  # Текущий отступ из-за ошибок биржи (0 - нет)
+
+    def next_interval(self, feedback: Optional[Dict]) -> float:
+        feedback = feedback or {}
+        status = feedback.get('status')
+        throttled = status is None or status == 429 or status >= 500 or feedback.get('rate_limit_remaining') == 0
+
+        if throttled:
+            self.backoff = min(max(self.backoff * 2, self.base_interval * 2), self.max_interval)
+        else:
+            # Успешный скан: отступ постепенно сходит на нет
+            self.backoff = self.backoff / 2 if self.backoff / 2 > self.base_interval else 0.0
+
+        if self.backoff:
+            interval = self.backoff
+        elif feedback.get('max_spread', 0.0) >= config.MIN_SPREAD_PERCENT * self.near_ratio:
+            interval = self.fast_interval
+        else:
+            interval = self.base_interval
+
+        retry_after = feedback.get('retry_after')
+        if retry_after:
+            interval = max(interval, retry_after)
+        return interval
+
+
+PACING_POLICIES = {
+    'fixed': FixedPacing,
+    'adaptive': AdaptivePacing,
+}
+
+
+class FixedRateScheduler:
+    def __init__(self, task: Callable[[], Optional[Dict]], policy: Optional[PacingPolicy] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        """
+        task - один скан; возвращает feedback для политики (или None при ошибке получения данных)
+        Исключение из task не останавливает цикл: оно записывается как scan_error, скан считается неудачным
+        """
+        self.task = task
+        self.policy = policy or PACING_POLICIES[config.PACING_POLICY]()
+        self.clock = clock
+        self.sleep = sleep
+
+        self.interval = self.policy.base_interval
+        self.next_deadline: Optional[float] = None
+        self.ticks = 0
+        self.skipped_ticks = 0
+        self._starts = deque(maxlen=60)  # Время старта последних сканов
+
+    @property
+    def target_hz(self) -> float:
+        return 1 / self.interval if self.interval > 0 else 0.0
+
+    @property
+    def achieved_hz(self) -> float:
+        """Фактическая частота по последним сканам"""
+        if len(self._starts) < 2:
+            return 0.0
+        span = self._starts[-1] - self._starts[0]
+        return (len(self._starts) - 1) / span if span > 0 else 0.0
+
+    def _begin(self):
+        now = self.clock()
+        if self.next_deadline is None:
+            self.next_deadline = now
+        self._starts.append(now)
+        self.ticks += 1
+
+    def _finish(self, feedback: Optional[Dict]) -> float:
+        """Выбрать интервал по feedback и вернуть, сколько ждать до следующего скана"""
+        self.interval = self.policy.next_interval(feedback)
+        self.next_deadline += self.interval
+
+        now = self.clock()
+        if now - self.next_deadline >= self.interval:
+            # Скан не уложился: пропущенные тики сливаются в один немедленный скан,
+            # без очереди "догоняющих" сканов; сетка сдвигается на последний пропущенный тик
+            missed = int((now - self.next_deadline) // self.interval)
+            self.skipped_ticks += missed
+            self.next_deadline += missed * self.interval
+            metrics.SCAN_SKIPPED_TICKS.inc(missed)
+
+        metrics.SCAN_TARGET_HZ.set(self.target_hz)
+        metrics.SCAN_ACHIEVED_HZ.set(self.achieved_hz)
+        return self.next_deadline - now
+
+    def tick(self):
+        """Один шаг: скан, выбор интервала, ожидание следующей точки сетки"""
+        self._begin()
+        try:
+            feedback = self.task()
+        except Exception as e:
+            # Скан упал: в журнал и консоль (❌), политика отступает как при ошибке биржи
+            events.emit('scan_error', stage='scan', error=repr(e))
+            feedback = None
+        delay = self._finish(feedback)
+        if delay > 0:
+            self.sleep(delay)
+            metrics.SLEEP_SECONDS.observe(delay)
+
+    def run(self, should_continue: Callable[[], bool]):
+        while should_continue():
+            self.tick()
+
+    async def run_async(self, task: Callable[[], Awaitable[Optional[Dict]]], should_continue: Callable[[], bool]):
+        """То же на asyncio: task - корутина скана, ожидание не блокирует другие задачи"""
+        while should_continue():
+            self._begin()
+            try:
+                feedback = await task()
+            except Exception as e:
+                events.emit('scan_error', stage='scan', error=repr(e))
+                feedback = None
+            delay = self._finish(feedback)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                metrics.SLEEP_SECONDS.observe(delay)
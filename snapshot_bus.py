@@ -0,0 +1,541 @@
+"""
+Шина снимков тикеров в разделяемой памяти: один процесс-получатель, сколько угодно читателей
+Получатель (MEXCClient + FixedRateScheduler) пишет каждый снимок колонками фиксированной раскладки
+в multiprocessing.shared_memory; анализатор, запись, статистика и команды бота в своих процессах
+читают массивы numpy прямо из сегмента, без копирования и без своих запросов к бирже.
+Медленный читатель не задерживает получение: GIL у каждого процесса свой
+
+Раскладка сегмента (выравнивание 8 байт):
+    заголовок int64[16]: магия, ёмкость, число слотов, размер блока имён, поколение,
+                         байт имён, число имён, pid получателя, статус последнего запроса, ошибок
+    заголовок float64[8]: время публикации, длительность запроса, фактическая и целевая частота
+    слоты int64[slots, 3]: seqlock, поколение, число пар; float64[slots, 2]: received_at, fetch_seconds
+    колонки [slots, capacity]: idx int64, last/fair/exchange_ts float64
+    имена: "SYM1\\nSYM2\\n..." - только дозапись; номер строки = значение в колонке idx
+
+Снимок поколения g пишется в слот g % slots под seqlock (счётчик нечётный, пока слот пишется).
+Читатель получает представления слота без копирования; они остаются целыми, пока получатель
+не обошёл кольцо. Прежде чем действовать по снимку, to_snapshot копирует слот и проверяет seqlock
+после копии: разорванный снимок (получатель успел переписать слот) отбрасывается, а не анализируется
+
+Запуск:
+    python snapshot_bus.py fetch                  # отдельный процесс-получатель (SNAPSHOT_BUS_EXTERNAL=1)
+    python snapshot_bus.py watch                  # читатель: поколение, возраст снимка, макс. спред
+    python snapshot_bus.py record snapshots.bin   # запись снимков с шины в файл SnapshotRecorder
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from event_log import events
+from scheduler import FixedRateScheduler
+from symbol_table import SymbolTable
+from ticker_decoder import TickerSnapshot
+import config
+
+MAGIC = int.from_bytes(b'MXBUS1\0\0', 'little')
+
+# Поля int64-заголовка
+_MAGIC, _CAPACITY, _SLOTS, _NAMES_CAPACITY, _GENERATION, _NAMES_BYTES, _NAMES_COUNT, _PID, _STATUS, _FAILURES = range(10)
+# Поля float64-заголовка
+_PUBLISHED_AT, _FETCH_SECONDS, _ACHIEVED_HZ, _TARGET_HZ = range(4)
+# Поля слота
+_SEQ, _SLOT_GENERATION, _COUNT = range(3)
+_RECEIVED_AT, _SLOT_FETCH_SECONDS = range(2)
+
+
+def _layout(capacity: int, slots: int, names_capacity: int):
+    """Смещения областей сегмента: [(имя, dtype, форма, смещение)], полный размер"""
+    areas = [
+        ('header', np.int64, (16,)),
+        ('header_f', np.float64, (8,)),
+        ('slot_meta', np.int64, (slots, 3)),
+        ('slot_time', np.float64, (slots, 2)),
+        ('idx', np.int64, (slots, capacity)),
+        ('last', np.float64, (slots, capacity)),
+        ('fair', np.float64, (slots, capacity)),
+        ('exchange_ts', np.float64, (slots, capacity)),
+        ('names', np.uint8, (names_capacity,)),
+    ]
+    result, offset = [], 0
+    for name, dtype, shape in areas:
+        result.append((name, dtype, shape, offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset = (offset + 7) & ~7
+    return result, offset
+
+
+def _open_segment(name: str) -> shared_memory.SharedMemory:
+    """
+    Открыть существующий сегмент без регистрации в трекере ресурсов: до 3.13 трекер удаляет
+    сегмент при выходе любого подключившегося процесса, а удалять его должен только получатель
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name)
+    finally:
+        resource_tracker.register = register
+
+
+class BusFrame:
+    """Снимок на шине: колонки - представления слота в разделяемой памяти (без копирования)"""
+
+    __slots__ = ('generation', 'slot', 'seq', 'received_at', 'fetch_seconds',
+                 'idx', 'last', 'fair', 'exchange_ts', '_meta')
+
+    def __init__(self, bus: 'SnapshotBus', slot: int, seq: int, generation: int):
+        count = int(bus._slot_meta[slot, _COUNT])
+        self.generation = generation
+        self.slot = slot
+        self.seq = seq
+        self.received_at = float(bus._slot_time[slot, _RECEIVED_AT])
+        self.fetch_seconds = float(bus._slot_time[slot, _SLOT_FETCH_SECONDS])
+        self.idx = bus._idx[slot, :count]
+        self.last = bus._last[slot, :count]
+        self.fair = bus._fair[slot, :count]
+        self.exchange_ts = bus._exchange_ts[slot, :count]
+        self._meta = bus._slot_meta
+
+    def __len__(self) -> int:
+        return len(self.idx)
+
+    def valid(self) -> bool:
+        """Слот не перезаписан с момента чтения: всё, что прочитано из колонок, - один снимок"""
+        return int(self._meta[self.slot, _SEQ]) == self.seq
+
+
+class SnapshotBus:
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        """Не вызывается напрямую: SnapshotBus.create (получатель) или SnapshotBus.attach (читатель)"""
+        self._shm = shm
+        self.owner = owner
+        self.name = shm.name
+
+        header = np.ndarray((16,), dtype=np.int64, buffer=shm.buf)
+        if int(header[_MAGIC]) != MAGIC:
+            raise ValueError(f"{shm.name}: не сегмент шины снимков")
+        self.capacity = int(header[_CAPACITY])
+        self.slots = int(header[_SLOTS])
+        areas, _ = _layout(self.capacity, self.slots, int(header[_NAMES_CAPACITY]))
+        for name, dtype, shape, offset in areas:
+            setattr(self, f"_{name}", np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset))
+
+        # Зеркало блока имён у читателя и перевод индексов шины в индексы локальной SymbolTable
+        self.names: List[str] = []
+        self._names_read = 0
+        self._remap = np.empty(0, dtype=np.int64)
+        self._published_names = 0
+        self.torn_reads = 0  # Попыток чтения, попавших на запись слота
+
+    @classmethod
+    def create(cls, name: Optional[str] = None, capacity: Optional[int] = None,
+               slots: Optional[int] = None, names_capacity: Optional[int] = None) -> 'SnapshotBus':
+        """Создать сегмент (получатель). Оставшийся от упавшего процесса сегмент пересоздаётся"""
+        name = name or config.SNAPSHOT_BUS_NAME
+        capacity = capacity or config.SNAPSHOT_BUS_CAPACITY
+        slots = slots or config.SNAPSHOT_BUS_SLOTS
+        names_capacity = names_capacity or config.SNAPSHOT_BUS_NAMES_BYTES
+        _, size = _layout(capacity, slots, names_capacity)
+        try:
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            try:
+                running = cls.attach(name)
+            except FileNotFoundError:
+                running = None
+            if running is not None:
+                pid = int(running._header[_PID])
+                running.close()
+                raise RuntimeError(f"шина {name} уже занята получателем (pid {pid})")
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name, create=True, size=size)
+
+        header = np.ndarray((16,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_CAPACITY], header[_SLOTS], header[_NAMES_CAPACITY] = capacity, slots, names_capacity
+        header[_PID] = os.getpid()
+        header[_MAGIC] = MAGIC  # Последним: до этого читатель считает сегмент неготовым
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: Optional[str] = None, timeout: float = 0.0) -> 'SnapshotBus':
+        """
+        Подключиться к сегменту (читатель); timeout - сколько ждать появления живого получателя
+        FileNotFoundError - шины нет (получатель не запущен)
+        """
+        name = name or config.SNAPSHOT_BUS_NAME
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                shm = _open_segment(name)
+                try:
+                    bus = cls(shm, owner=False)
+                except ValueError:
+                    shm.close()
+                    raise FileNotFoundError(name)
+                if bus.fetcher_alive():
+                    return bus
+                bus.close()
+                raise FileNotFoundError(name)
+            except FileNotFoundError:
+                if time.monotonic() >= deadline:
+                    raise
+                time.sleep(0.05)
+
+    def fetcher_alive(self) -> bool:
+        """Процесс, создавший сегмент, ещё жив (сегмент не остался от упавшего получателя)"""
+        pid = int(self._header[_PID])
+        if pid == os.getpid():
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    # --- Получатель ---
+
+    def _publish_names(self, names: Sequence[str]):
+        """Дописать имена, появившиеся с прошлой публикации (до данных слота, которые на них ссылаются)"""
+        if len(names) == self._published_names:
+            return
+        data = ''.join(f"{name}\n" for name in names[self._published_names:]).encode()
+        start = int(self._header[_NAMES_BYTES])
+        if start + len(data) > len(self._names):
+            raise ValueError("блок имён шины переполнен - увеличьте SNAPSHOT_BUS_NAMES_BYTES")
+        self._names[start:start + len(data)] = np.frombuffer(data, dtype=np.uint8)
+        self._header[_NAMES_BYTES] = start + len(data)
+        self._header[_NAMES_COUNT] = len(names)
+        self._published_names = len(names)
+
+    def publish(self, snapshot: TickerSnapshot, names: Sequence[str], fetch_seconds: float = 0.0,
+                status: Optional[int] = 200) -> int:
+        """
+        Записать снимок в следующий слот; names - SymbolTable.names получателя (индексы снимка)
+        Возвращает поколение опубликованного снимка
+        """
+        count = len(snapshot)
+        if count > self.capacity:
+            raise ValueError(f"снимок из {count} пар не помещается в шину ({self.capacity})")
+        self._publish_names(names)
+
+        header, meta = self._header, self._slot_meta
+        generation = int(header[_GENERATION]) + 1
+        slot = generation % self.slots
+        meta[slot, _SEQ] += 1  # Нечётный - слот пишется
+        self._idx[slot, :count] = snapshot.idx
+        self._last[slot, :count] = snapshot.last
+        self._fair[slot, :count] = snapshot.fair
+        self._exchange_ts[slot, :count] = snapshot.exchange_ts
+        meta[slot, _COUNT] = count
+        meta[slot, _SLOT_GENERATION] = generation
+        self._slot_time[slot, _RECEIVED_AT] = snapshot.received_at
+        self._slot_time[slot, _SLOT_FETCH_SECONDS] = fetch_seconds
+        meta[slot, _SEQ] += 1  # Чётный - слот готов
+
+        self._header_f[_PUBLISHED_AT] = time.time()
+        self._header_f[_FETCH_SECONDS] = fetch_seconds
+        header[_STATUS] = status or 0
+        header[_GENERATION] = generation
+        return generation
+
+    def record_failure(self, status: Optional[int]):
+        """Запрос не дал снимка: читатели видят статус и счётчик ошибок"""
+        self._header[_STATUS] = status or 0
+        self._header[_FAILURES] += 1
+
+    def set_rate(self, achieved_hz: float, target_hz: float):
+        self._header_f[_ACHIEVED_HZ] = achieved_hz
+        self._header_f[_TARGET_HZ] = target_hz
+
+    # --- Читатель ---
+
+    @property
+    def generation(self) -> int:
+        """Поколение последнего опубликованного снимка (0 - снимков ещё не было)"""
+        return int(self._header[_GENERATION])
+
+    @property
+    def status(self) -> Optional[int]:
+        return int(self._header[_STATUS]) or None
+
+    @property
+    def failures(self) -> int:
+        return int(self._header[_FAILURES])
+
+    @property
+    def published_at(self) -> float:
+        return float(self._header_f[_PUBLISHED_AT])
+
+    @property
+    def achieved_hz(self) -> float:
+        return float(self._header_f[_ACHIEVED_HZ])
+
+    @property
+    def target_hz(self) -> float:
+        return float(self._header_f[_TARGET_HZ])
+
+    def latest(self) -> Optional[BusFrame]:
+        """Последний целый снимок (None - снимков ещё не было)"""
+        header, meta = self._header, self._slot_meta
+        while True:
+            generation = int(header[_GENERATION])
+            if generation == 0:
+                return None
+            slot = generation % self.slots
+            seq = int(meta[slot, _SEQ])
+            if seq % 2 == 0 and int(meta[slot, _SLOT_GENERATION]) == generation:
+                frame = BusFrame(self, slot, seq, generation)
+                if frame.valid():
+                    return frame
+            # Получатель обошёл кольцо, пока мы читали заголовок слота - берём свежее поколение
+            self.torn_reads += 1
+
+    def wait(self, after: int, timeout: Optional[float] = None) -> Optional[BusFrame]:
+        """Дождаться снимка новее поколения after (None - не дождались за timeout)"""
+        poll = config.SNAPSHOT_BUS_POLL_INTERVAL
+        deadline = None if timeout is None else time.monotonic() + timeout
+        header = self._header
+        while int(header[_GENERATION]) <= after:
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(poll)
+        return self.latest()
+
+    async def wait_async(self, after: int, timeout: Optional[float] = None) -> Optional[BusFrame]:
+        """То же для asyncio: опрос поколения в цикле событий, без потока, читающего сегмент после close"""
+        poll = config.SNAPSHOT_BUS_POLL_INTERVAL
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        header = self._header
+        while int(header[_GENERATION]) <= after:
+            if deadline is not None and loop.time() >= deadline:
+                return None
+            await asyncio.sleep(poll)
+        return self.latest()
+
+    def sync_names(self) -> List[str]:
+        """Дочитать имена, дописанные получателем с прошлого раза"""
+        end = int(self._header[_NAMES_BYTES])
+        if end > self._names_read:
+            chunk = self._names[self._names_read:end].tobytes().decode()
+            self.names.extend(sys.intern(name) for name in chunk.split('\n')[:-1])
+            self._names_read = end
+        return self.names
+
+    def to_snapshot(self, frame: BusFrame, table: SymbolTable) -> Optional[TickerSnapshot]:
+        """
+        Копия снимка в индексах локальной SymbolTable читателя; None - слот перезаписан во время копирования
+        Копия (перевод индексов - одна выборка numpy) не зависит от получателя: алерты, правила и запись
+        идут по тому же снимку, что прошёл проверку seqlock
+        """
+        if len(self._remap) < int(self._header[_NAMES_COUNT]):
+            names = self.sync_names()
+            known = len(self._remap)
+            remap = np.empty(len(names), dtype=np.int64)
+            remap[:known] = self._remap
+            for i in range(known, len(names)):
+                remap[i] = table.get_or_add(names[i])
+            self._remap = remap
+        # Сначала копия колонок и проверка seqlock: индексы переписанного слота могут быть любыми
+        idx = frame.idx.copy()
+        last, fair, exchange_ts = frame.last.copy(), frame.fair.copy(), frame.exchange_ts.copy()
+        if not frame.valid() or (len(idx) and (idx.min() < 0 or idx.max() >= len(self._remap))):
+            self.torn_reads += 1
+            return None
+        return TickerSnapshot(self._remap[idx], last, fair, frame.received_at, exchange_ts)
+
+    def close(self):
+        """
+        Отключиться; получатель ещё и удаляет сегмент
+        numpy не удерживает буфер сегмента: после close представления снимков (BusFrame, TickerSnapshot
+        читать нельзя - вызывать, когда ни один поток не ждёт и не копирует снимок
+        """
+        for name, *_ in _layout(0, 0, 0)[0]:
+            setattr(self, f"_{name}", None)
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # У читателя остались представления снимка - отображение освободится с процессом
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class SnapshotFetcher:
+    """Процесс-получатель: единственный, кто ходит к бирже; каждый снимок - на шину"""
+
+    def __init__(self, bus: SnapshotBus, client=None):
+        from mexc_client import MEXCClient
+
+        self.bus = bus
+        self.client = client or MEXCClient()
+        self.table = self.client.symbol_table
+        self.scheduler = FixedRateScheduler(self.fetch)
+
+    def fetch(self):
+        """Один запрос тикеров; feedback для политики темпа - как у скана монитора"""
+        started = time.perf_counter()
+        snapshot = self.client.get_price_snapshot()
+        elapsed = time.perf_counter() - started
+        client = self.client
+        feedback = {
+            'status': client.last_status,
+            'retry_after': client.retry_after,
+            'rate_limit_remaining': client.rate_limit_remaining,
+            'max_spread': 0.0
+        }
+        if not snapshot:
+            events.emit('scan_failed', status=feedback['status'])
+            self.bus.record_failure(feedback['status'])
+            if feedback['status'] == 200:
+                feedback['status'] = None
+            return feedback
+
+        self.bus.publish(snapshot, self.table.names, elapsed, client.last_status)
+        self.bus.set_rate(self.scheduler.achieved_hz, self.scheduler.target_hz)
+        # Адаптивному темпу нужен максимальный спред: считаем здесь, не дожидаясь читателей
+        with np.errstate(divide='ignore', invalid='ignore'):
+            spread = np.abs(snapshot.last - snapshot.fair) / snapshot.fair * 100
+        feedback['max_spread'] = float(np.max(spread, initial=0.0, where=snapshot.fair > 0))
+        return feedback
+
+    def run(self, should_continue):
+        self.scheduler.run(should_continue)
+
+
+def run_fetcher(name: Optional[str] = None, stop=None, ready=None, settings: Optional[Dict] = None):
+    """
+    Точка входа процесса-получателя
+    stop/ready - multiprocessing.Event от родителя: остановка и "сегмент создан"
+    settings - значения config родителя (spawn импортирует config заново, правки в коде теряются)
+    """
+    for key, value in (settings or {}).items():
+        setattr(config, key, value)
+    # Свой файл журнала: два процесса не дописывают строки в один файл вперемешку
+    events.path = f"{config.EVENT_LOG_PATH}.fetcher" if config.EVENT_LOG_PATH else ''
+    events.console = config.EVENT_LOG_CONSOLE
+    events.start()
+    bus = SnapshotBus.create(name)
+    if ready is not None:
+        ready.set()
+    parent = os.getppid()
+    fetcher = SnapshotFetcher(bus)
+    try:
+        if stop is None:
+            fetcher.run(lambda: True)
+        else:
+            # Родитель убит без остановки - получатель не остаётся сиротой
+            fetcher.run(lambda: not stop.is_set() and os.getppid() == parent)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.close()
+        events.stop()
+
+
+def start_fetcher(name: Optional[str] = None, timeout: float = 30.0):
+    """Запустить получатель дочерним процессом; возвращает (процесс, событие остановки)"""
+    import multiprocessing
+
+    context = multiprocessing.get_context('spawn')
+    stop, ready = context.Event(), context.Event()
+    settings = {key: value for key, value in vars(config).items() if key.isupper()}
+    process = context.Process(target=run_fetcher, args=(name, stop, ready, settings),
+                              name="snapshot-fetcher", daemon=True)
+    process.start()
+    if not ready.wait(timeout):
+        process.terminate()
+        raise RuntimeError("процесс-получатель не создал шину снимков")
+    return process, stop
+
+
+def watch(bus: SnapshotBus):
+    """Читатель-статистика: поколение, возраст снимка, длительность запроса, максимальный спред"""
+    generation = bus.generation
+    while True:
+        frame = bus.wait(generation, timeout=5.0)
+        if frame is None:
+            print(f"⏳ Нет новых снимков 5 сек (статус {bus.status}, ошибок {bus.failures})")
+            continue
+        skipped = frame.generation - generation - 1 if generation else 0
+        generation = frame.generation
+        with np.errstate(divide='ignore', invalid='ignore'):
+            spread = np.abs(frame.last - frame.fair) / frame.fair * 100
+        pos = int(np.nanargmax(np.where(frame.fair > 0, spread, 0.0)))
+        names = bus.sync_names()
+        max_spread, max_pair = float(spread[pos]), names[frame.idx[pos]]
+        age = (time.time() - frame.received_at) * 1000
+        intact = "" if frame.valid() else " ⚠️ слот перезаписан во время чтения"
+        print(f"#{frame.generation} {len(frame)} пар | возраст {age:.1f} мс | запрос {frame.fetch_seconds * 1000:.0f} мс | "
+              f"макс {max_spread:.2f}% ({max_pair}) | пропущено {skipped}{intact}")
+
+
+def record(bus: SnapshotBus, path: str):
+    """Читатель-запись: снимки с шины в файл SnapshotRecorder (replay/sweep как обычно)"""
+    from snapshot_recorder import SnapshotRecorder
+
+    table = SymbolTable()
+    recorder = SnapshotRecorder(path, table)
+    generation = bus.generation
+    try:
+        while True:
+            frame = bus.wait(generation, timeout=5.0)
+            if frame is None:
+                continue
+            generation = frame.generation
+            snapshot = bus.to_snapshot(frame, table)
+            if snapshot is None:
+                print(f"⚠️ Снимок #{frame.generation} перезаписан во время чтения - пропущен")
+                continue
+            recorder.append(snapshot)
+    finally:
+        recorder.close()
+        print(f"💾 Записано снимков: {recorder.frames}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Шина снимков тикеров в разделяемой памяти")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('fetch', help="процесс-получатель: MEXC -> шина")
+    sub.add_parser('watch', help="показывать снимки с шины")
+    p_record = sub.add_parser('record', help="писать снимки с шины в файл")
+    p_record.add_argument('path')
+    parser.add_argument('--name', default=config.SNAPSHOT_BUS_NAME, help="имя сегмента")
+    args = parser.parse_args()
+
+    if args.command == 'fetch':
+        print(f"📡 Получатель снимков: шина {args.name}, интервал {config.SCAN_INTERVAL} сек ({config.PACING_POLICY})")
+        run_fetcher(args.name)
+        return
+
+    bus = SnapshotBus.attach(args.name, timeout=30.0)
+    try:
+        if args.command == 'watch':
+            watch(bus)
+        else:
+            record(bus, args.path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Запись снимков тикеров и быстрый replay для подбора параметров алертов
+
+Формат файла (только дозапись):
+    MXSNAP1\\n
+    записи: тип (1 байт) + длина (uint32) + данные
+        b'S' - новые символы файла: zlib("SYM1\\nSYM2...")
+        b'F' - снимок: timestamp (float64) + n (uint32) + zlib(idx int32[n] + last f64[n] + fair f64[n])
+Недописанная последняя запись (падение процесса) отбрасывается при чтении и при дозаписи
+
+Запуск:
+    python snapshot_recorder.py replay snapshots.bin --min-spread 10 --cooldown 300
+    python snapshot_recorder.py sweep snapshots.bin --min-spread 5,10,15 --cooldown 60,300 --escalation 3,5
+"""
+import argparse
+import itertools
+import mmap
+import os
+import struct
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from spread_analyzer import SpreadAnalyzer
+from symbol_table import SymbolTable
+from ticker_decoder import TickerSnapshot
+
+MAGIC = b'MXSNAP1\n'
+_RECORD = struct.Struct('<cI')
+_FRAME = struct.Struct('<dI')
+
+
+class SnapshotRecorder:
+    def __init__(self, path: str, table: SymbolTable, level: int = 1):
+        """
+        path - файл записи (создаётся или дописывается)
+        table - SymbolTable монитора, индексы снимков переводятся в индексы файла
+        """
+        self.path = path
+        self.table = table
+        self.level = level
+        self.frames = 0
+
+        # Индексы файла не совпадают с индексами таблицы после перезапуска - держим перевод
+        self._file_index: Dict[str, int] = {}
+        self._remap = np.empty(0, dtype=np.int32)
+
+        valid_size = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            reader = SnapshotReader(path)
+            for name in reader.read_symbols():
+                self._file_index[name] = len(self._file_index)
+            valid_size = reader.valid_size
+            reader.close()
+
+        self._file = open(path, 'r+b' if valid_size else 'wb')
+        if valid_size:
+            self._file.truncate(valid_size)
+            self._file.seek(valid_size)
+        else:
+            self._file.write(MAGIC)
+
+    def _write_record(self, kind: bytes, data: bytes):
+        self._file.write(_RECORD.pack(kind, len(data)))
+        self._file.write(data)
+
+    def _update_remap(self):
+        """Дописать в файл символы, появившиеся в таблице после прошлого снимка"""
+        known = len(self._remap)
+        if known == len(self.table):
+            return
+
+        new_names = []
+        remap = np.empty(len(self.table), dtype=np.int32)
+        remap[:known] = self._remap
+        for idx in range(known, len(self.table)):
+            name = self.table.names[idx]
+            file_idx = self._file_index.get(name)
+            if file_idx is None:
+                file_idx = len(self._file_index)
+                self._file_index[name] = file_idx
+                new_names.append(name)
+            remap[idx] = file_idx
+        self._remap = remap
+
+        if new_names:
+            self._write_record(b'S', zlib.compress('\n'.join(new_names).encode(), self.level))
+
+    def append(self, snapshot: TickerSnapshot, timestamp: Optional[float] = None):
+        """Дописать снимок (колонки idx/last/fair сжаты одним блоком)"""
+        self._update_remap()
+        idx = self._remap[snapshot.idx]
+        columns = idx.tobytes() + snapshot.last.astype(np.float64).tobytes() + snapshot.fair.astype(np.float64).tobytes()
+        header = _FRAME.pack(timestamp or snapshot.received_at, len(idx))
+        self._write_record(b'F', header + zlib.compress(columns, self.level))
+        self._file.flush()
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+
+
+class SnapshotReader:
+    """Чтение файла снимков через mmap без копирования всего файла в память"""
+
+    def __init__(self, path: str):
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path}: не файл снимков MXSNAP1")
+        self.names: List[str] = []
+        self.valid_size = len(MAGIC)
+
+    def _records(self) -> Iterator[Tuple[bytes, memoryview]]:
+        data = memoryview(self._mmap)
+        offset = len(MAGIC)
+        size = len(data)
+        while offset + _RECORD.size <= size:
+            kind, length = _RECORD.unpack_from(data, offset)
+            start = offset + _RECORD.size
+            if start + length > size:
+                break  # Недописанная запись
+            offset = start + length
+            self.valid_size = offset
+            yield kind, data[start:offset]
+
+    def read_symbols(self) -> List[str]:
+        """Только таблица символов (для дозаписи в существующий файл)"""
+        for kind, payload in self._records():
+            if kind == b'S':
+                self.names.extend(zlib.decompress(payload).decode().split('\n'))
+        return self.names
+
+    def frames(self) -> Iterator[Tuple[float, np.ndarray, np.ndarray, np.ndarray]]:
+        """(timestamp, idx, last, fair) по порядку; новые символы попадают в self.names"""
+        for kind, payload in self._records():
+            if kind == b'S':
+                self.names.extend(zlib.decompress(payload).decode().split('\n'))
+            elif kind == b'F':
+                timestamp, count = _FRAME.unpack_from(payload)
+                columns = zlib.decompress(payload[_FRAME.size:])
+                idx = np.frombuffer(columns, dtype=np.int32, count=count)
+                last = np.frombuffer(columns, dtype=np.float64, count=count, offset=4 * count)
+                fair = np.frombuffer(columns, dtype=np.float64, count=count, offset=12 * count)
+                yield timestamp, idx, last, fair
+
+    def close(self):
+        if isinstance(self._mmap, mmap.mmap):
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # Недочитанный генератор ещё держит срез - закроется сборщиком мусора
+        self._file.close()
+
+
+def _make_analyzer(params: Dict, table: SymbolTable) -> SpreadAnalyzer:
+    analyzer = SpreadAnalyzer(
+        min_spread_percent=params.get('min_spread_percent'),
+        alert_cooldown=params.get('alert_cooldown'),
+        escalation_percent=params.get('escalation_percent'),
+        symbol_table=table
+    )
+    for key in ('min_consecutive_scans', 'min_duration', 'use_ewma'):
+        if key in params:
+            setattr(analyzer, key, params[key])
+    analyzer.verbose = False
+    return analyzer
+
+
+def sweep(path: str, param_sets: List[Dict]) -> List[List[Dict]]:
+    """
+    Прогнать запись через SpreadAnalyzer для нескольких наборов параметров за один проход
+    Возвращает алерты (как из analyze_batch, плюс 'timestamp') для каждого набора
+    """
+    reader = SnapshotReader(path)
+    table = SymbolTable()
+    analyzers = [_make_analyzer(params, table) for params in param_sets]
+    results: List[List[Dict]] = [[] for _ in param_sets]
+
+    try:
+        for timestamp, file_idx, last, fair in reader.frames():
+            # Свежая таблица заполняется в порядке файла: индекс файла = индекс таблицы
+            while len(table) < len(reader.names):
+                table.get_or_add(reader.names[len(table)])
+            idx = file_idx.astype(np.int64)
+            for analyzer, alerts in zip(analyzers, results):
+                fired, _, _ = analyzer.analyze_batch(None, last, fair, now=timestamp, idx=idx)
+                for alert in fired:
+                    alert['timestamp'] = timestamp
+                alerts.extend(fired)
+    finally:
+        reader.close()
+    return results
+
+
+def replay(path: str, params: Optional[Dict] = None) -> List[Dict]:
+    """Алерты, которые сработали бы на записи с заданными параметрами"""
+    return sweep(path, [params or {}])[0]
+
+
+def _parse_list(value: Optional[str], cast):
+    return [cast(v) for v in value.split(',')] if value else [None]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay записанных снимков тикеров MEXC")
+    parser.add_argument('mode', choices=['replay', 'sweep'])
+    parser.add_argument('path')
+    parser.add_argument('--min-spread', help="MIN_SPREAD_PERCENT (в sweep - через запятую)")
+    parser.add_argument('--cooldown', help="ALERT_COOLDOWN, сек")
+    parser.add_argument('--escalation', help="Рост спреда для повторного алерта в cooldown, %%")
+    parser.add_argument('--consecutive', help="ALERT_MIN_CONSECUTIVE_SCANS")
+    args = parser.parse_args()
+
+    grid = itertools.product(
+        _parse_list(args.min_spread, float),
+        _parse_list(args.cooldown, float),
+        _parse_list(args.escalation, float),
+        _parse_list(args.consecutive, int)
+    )
+    param_sets = []
+    for min_spread, cooldown, escalation, consecutive in grid:
+        params = {'min_spread_percent': min_spread, 'alert_cooldown': cooldown, 'escalation_percent': escalation}
+        if consecutive is not None:
+            params['min_consecutive_scans'] = consecutive
+        param_sets.append(params)
+    if args.mode == 'replay':
+        param_sets = param_sets[:1]
+
+    started = time.perf_counter()
+    results = sweep(args.path, param_sets)
+    elapsed = time.perf_counter() - started
+
+    print(f"⏱️  {len(param_sets)} наборов параметров за {elapsed:.2f} сек")
+    for params, alerts in zip(param_sets, results):
+        shown = {k: v for k, v in params.items() if v is not None} or "config.py"
+        top = ", ".join(f"{symbol} x{count}" for symbol, count in Counter(a['symbol'] for a in alerts).most_common(5))
+        print(f"{shown}: алертов {len(alerts)} | {top}")
@@ -3,14 +3,48 @@
 УМНЫЙ COOLDOWN: разные токены = нет cooldown, один токен = 5 мин или +5% спред
 """
 import time
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from alert_state import AlertStateStore
+from event_log import events
+from monitor_state import SpreadStats
+from spread_history import SpreadHistory
+from symbol_table import SymbolTable
 import config
 
 
 class SpreadAnalyzer:
-    def __init__(self):
-        # Хранит {symbol: {'timestamp': float, 'spread': float}}
-        self.alert_history: Dict[str, Dict] = {}
+    def __init__(self, min_spread_percent: Optional[float] = None,
+                 alert_cooldown: Optional[float] = None,
+                 escalation_percent: Optional[float] = None,
+                 symbol_table: Optional[SymbolTable] = None):
+        # Параметры правила (по умолчанию из config; отдельные значения нужны для подбора параметров)
+        self.min_spread_percent = config.MIN_SPREAD_PERCENT if min_spread_percent is None else min_spread_percent
+        self.alert_cooldown = config.ALERT_COOLDOWN if alert_cooldown is None else alert_cooldown
+        self.escalation_percent = config.ALERT_ESCALATION_PERCENT if escalation_percent is None else escalation_percent
+        self.min_consecutive_scans = config.ALERT_MIN_CONSECUTIVE_SCANS
+        self.min_duration = config.ALERT_MIN_DURATION
+        self.use_ewma = config.ALERT_USE_EWMA
+        self.verbose = True  # Записывать рост спреда в cooldown в журнал событий (в replay выключается)
+        
+        # Время и спред последнего алерта по индексам таблицы символов; истёкшие cooldown сбрасываются
+        self.symbols = symbol_table if symbol_table is not None else SymbolTable()
+        self.alert_state = AlertStateStore(cooldown=self.alert_cooldown)
+        
+        # Кольцевые буферы истории и счётчики устойчивости для фильтров
+        self.history = SpreadHistory(threshold=self.min_spread_percent)
+        
+        # Цены и спред прошлого снимка по индексам таблицы: пересчитываются только изменившиеся пары
+        self._last = np.full(0, np.nan)
+        self._fair = np.full(0, np.nan)
+        self._spread = np.zeros(0)
+        self._above = np.zeros(0, dtype=bool)  # Индекс пар с |спред| >= порога
+        self.last_changed = 0  # Сколько пар изменилось в последнем снимке
+        self.last_total = 0
+        # Записи cooldown до отметки алертов последнего скана: idx -> (время, спред) - для defer
+        self._premark: Dict[int, Tuple[float, float]] = {}
     
     def calculate_spread_percent(self, last_price: float, fair_price: float) -> float:
         """Рассчитать процент разницы между последней и справедливой ценой"""
@@ -29,28 +63,30 @@ class SpreadAnalyzer:
         - Один токен: cooldown 5 минут ИЛИ если спред вырос на +5%
         """
         # Проверяем минимальный порог
-        if abs(spread_percent) < config.MIN_SPREAD_PERCENT:
+        if abs(spread_percent) < self.min_spread_percent:
             return False
         
-        # Если этот символ еще не был в истории - отправляем алерт
-        if symbol not in self.alert_history:
+        current_time = time.time()
+        self.alert_state.expire(current_time)
+        
+        # Если по символу нет активного cooldown - отправляем алерт
+        idx = self.symbols.index.get(symbol)
+        last_alert = None if idx is None else self.alert_state.get(idx)
+        if last_alert is None:
             return True
         
         # Получаем данные предыдущего алерта
-        last_alert = self.alert_history[symbol]
-        last_timestamp = last_alert['timestamp']
-        last_spread = last_alert['spread']
+        last_timestamp, last_spread = last_alert
         
-        current_time = time.time()
         time_passed = current_time - last_timestamp
         
         # Проверяем cooldown
-        if time_passed < config.ALERT_COOLDOWN:
+        if time_passed < self.alert_cooldown:
             # Cooldown еще активен - проверяем изменение спреда
             spread_increase = abs(spread_percent) - abs(last_spread)
             
-            if spread_increase >= 5.0:  # Спред вырос на 5%+
-                print(f"   💡 {symbol}: Спред вырос на {spread_increase:.2f}% (было {abs(last_spread):.2f}%, стало {abs(spread_percent):.2f}%)")
+            if spread_increase >= self.escalation_percent:  # Спред вырос на 5%+
+                events.emit('spread_escalated', symbol=symbol, previous=abs(last_spread), current=abs(spread_percent))
                 return True
             else:
                 # Cooldown активен и спред не вырос значительно
@@ -59,12 +95,140 @@ class SpreadAnalyzer:
         # Cooldown прошел - можно отправлять
         return True
     
-    def mark_alerted(self, symbol: str, spread_percent: float):
+    def mark_alerted(self, symbol: str, spread_percent: float, now: Optional[float] = None):
         """Отметить, что алерт был отправлен"""
-        self.alert_history[symbol] = {
-            'timestamp': time.time(),
-            'spread': spread_percent
-        }
+        if now is None:
+            now = time.time()
+        
+        self.alert_state.mark(self.symbols.get_or_add(symbol), now, spread_percent)
+    
+    def defer(self, symbols: Sequence[str], now: Optional[float] = None, delay: Optional[float] = None):
+        """
+        Алерты последнего скана, не прошедшие подтверждение: cooldown пары возвращается к прежнему,
+        но следующая попытка - не раньше delay секунд (раньше - только при росте спреда на escalation_percent)
+        """
+        if now is None:
+            now = time.time()
+        delay = config.CONFIRM_RETRY_DELAY if delay is None else delay
+        alert_state = self.alert_state
+        for symbol in symbols:
+            idx = self.symbols.index[symbol]
+            previous_time, previous_spread = self._premark.get(idx, (-np.inf, 0.0))
+            candidate_spread = float(alert_state.spread[idx])
+            alert_state.mark(idx, max(previous_time, now - self.alert_cooldown + delay),
+                             max(previous_spread, candidate_spread, key=abs))
+    
+    def active_cooldowns(self) -> int:
+        """Сколько пар сейчас в cooldown (O(1), истёкшие сбрасываются в каждом скане)"""
+        return len(self.alert_state)
+    
+    def restore_alerts(self, rows: Sequence[Tuple[str, float, float]], now: Optional[float] = None) -> int:
+        """Вернуть cooldown из журнала (symbol, время, спред); истёкшие пропускаются. Возвращает, сколько восстановлено"""
+        if now is None:
+            now = time.time()
+        restored = 0
+        for symbol, alerted_at, spread in rows:
+            if now - alerted_at < self.alert_cooldown:
+                self.alert_state.mark(self.symbols.get_or_add(symbol), alerted_at, spread)
+                restored += 1
+        return restored
+    
+    def forget(self, symbols: Sequence[str]):
+        """Удалить состояние пар, снятых с торгов"""
+        idx = np.array([self.symbols.index[s] for s in symbols if s in self.symbols], dtype=np.int64)
+        if idx.size == 0:
+            return
+        self.alert_state.remove(idx)
+        self.history.ensure_capacity(int(idx.max()) + 1)
+        self.history.forget(idx)
+        self._ensure_capacity(int(idx.max()) + 1)
+        self._last[idx] = np.nan
+        self._fair[idx] = np.nan
+        self._spread[idx] = 0.0
+        self._above[idx] = False
+    
+    def _ensure_capacity(self, size: int):
+        """Расширить массивы прошлого снимка под новые символы (удвоением)"""
+        capacity = len(self._last)
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, 1024)
+        
+        def grow(array, fill):
+            grown = np.full(new_capacity, fill, dtype=array.dtype)
+            grown[:capacity] = array
+            return grown
+        
+        self._last = grow(self._last, np.nan)
+        self._fair = grow(self._fair, np.nan)
+        self._spread = grow(self._spread, 0.0)
+        self._above = grow(self._above, False)
+    
+    def set_rule(self, min_spread_percent: float, alert_cooldown: float, now: Optional[float] = None):
+        """Сменить порог и cooldown на ходу (подписки): индекс "выше порога" пересчитывается сразу"""
+        self.alert_cooldown = alert_cooldown
+        self.alert_state.cooldown = alert_cooldown
+        if min_spread_percent == self.min_spread_percent:
+            return
+        self.min_spread_percent = min_spread_percent
+        self.history.threshold = min_spread_percent
+        if now is None:
+            now = time.time()
+        
+        above = np.abs(self._spread) >= min_spread_percent
+        size = min(len(above), self.history.capacity)
+        history = self.history
+        # Пары, пересёкшие новый порог, начинают отсчёт устойчивости заново
+        dropped = np.flatnonzero(self._above[:size] & ~above[:size])
+        history.consecutive_above[dropped] = 0
+        history.above_total[dropped] += np.nan_to_num(now - history.above_since[dropped])
+        history.above_since[dropped] = np.nan
+        raised = np.flatnonzero(above[:size] & ~self._above[:size])
+        history.above_since[raised] = now
+        self._above = above
+    
+    def stats(self) -> SpreadStats:
+        """Копия статистики пар на текущий момент (публикуется в MonitorState после скана)"""
+        history = self.history
+        size = min(len(self.symbols), len(self._last), history.capacity)
+        alert_state = self.alert_state
+        cooldown = np.zeros(size, dtype=bool)
+        known = min(size, alert_state.capacity)
+        cooldown[:known] = alert_state.time[:known] != -np.inf
+        return SpreadStats(
+            index=self.symbols.index,
+            names=self.symbols.names,
+            last=self._last[:size].copy(),
+            fair=self._fair[:size].copy(),
+            spread=self._spread[:size].copy(),
+            ewma=history.ewma[:size].copy(),
+            std=np.sqrt(history.ewvar[:size]),
+            zscore=history.zscore[:size].copy(),
+            above_since=history.above_since[:size].copy(),
+            above_total=history.above_total[:size].copy(),
+            consecutive_above=history.consecutive_above[:size].copy(),
+            cooldown=cooldown,
+        )
+    
+    def top(self, n: int, by: str = 'spread') -> List[Dict]:
+        """N пар с наибольшим |спредом| (by='spread') или |z-score| (by='z'), см. SpreadStats.top"""
+        return self.stats().top(n, by)
+    
+    def current_spread(self, symbol: str) -> Optional[float]:
+        """Спред пары в последнем снимке (None - пары нет или цен ещё не было)"""
+        idx = self.symbols.index.get(symbol)
+        if idx is None or idx >= len(self._last) or np.isnan(self._last[idx]):
+            return None
+        return float(self._spread[idx])
+    
+    def symbol_stats(self, symbol: str, now: Optional[float] = None) -> Optional[Dict]:
+        """Статистика одной пары из накопленных массивов (None - пары нет или цен ещё не было)"""
+        return self.stats().symbol(symbol, now)
+    
+    @property
+    def changed_ratio(self) -> float:
+        """Доля пар последнего снимка, у которых изменились цены"""
+        return self.last_changed / self.last_total if self.last_total else 0.0
     
     def analyze(self, price_data: Dict) -> Optional[Dict]:
         """Проанализировать данные о ценах и вернуть результат, если нужен алерт"""
@@ -86,3 +250,129 @@ class SpreadAnalyzer:
             }
         
         return None
+    
+    def persistent(self, state_idx: np.ndarray, now: float) -> np.ndarray:
+        """Маска пар, чей спред выше порога достаточно долго (ALERT_MIN_* / ALERT_USE_EWMA)"""
+        history = self.history
+        mask = np.ones(state_idx.size, dtype=bool)
+        if self.min_consecutive_scans > 1:
+            mask &= history.consecutive_above[state_idx] >= self.min_consecutive_scans
+        if self.min_duration > 0:
+            # NaN (спред ниже порога) в сравнении даёт False
+            mask &= history.time_above(state_idx, now) >= self.min_duration
+        if self.use_ewma:
+            mask &= np.abs(history.ewma[state_idx]) >= self.min_spread_percent
+        return mask
+    
+    def analyze_batch(self, symbols: Optional[Sequence[str]], last, fair,
+                      now: Optional[float] = None,
+                      idx: Optional[np.ndarray] = None,
+                      exchange_ts: Optional[np.ndarray] = None,
+                      continued: bool = False) -> Tuple[List[Dict], float, Optional[str]]:
+        """
+        Пакетный анализ снимка: пересчитываются только пары с изменившимися ценами,
+        решение об алерте принимается только для пар выше порога
+        
+        symbols - список символов, last/fair - массивы цен той же длины
+        idx - готовые индексы из общей SymbolTable (снимок TickerSnapshot), тогда symbols не нужен
+        exchange_ts - время тикеров на бирже (ms), попадает в алерт для метрики tick-to-alert
+        continued - очередная часть того же скана (потоковый разбор): defer знает алерты всех частей
+        Возвращает (алерты в формате analyze, максимальный |спред|, пара с максимальным спредом)
+        """
+        if now is None:
+            now = time.time()
+        
+        last = np.asarray(last, dtype=np.float64)
+        fair = np.asarray(fair, dtype=np.float64)
+        self.last_total = last.size
+        self.last_changed = 0
+        if last.size == 0:
+            return [], 0.0, None
+        
+        if idx is None:
+            idx = self.symbols.indices(symbols)
+        size = len(self.symbols)
+        self._ensure_capacity(size)
+        self.history.ensure_capacity(size)
+        alert_state = self.alert_state
+        alert_state.ensure_capacity(size)
+        alert_state.expire(now)  # Истёкшие cooldown сброшены - такие пары выше порога снова кандидаты
+        names = self.symbols.names
+        
+        # Разница с прошлым снимком: новые пары (NaN) и изменившиеся цены
+        changed_mask = (last != self._last[idx]) | (fair != self._fair[idx])
+        changed = np.flatnonzero(changed_mask)
+        self.last_changed = changed.size
+        
+        if changed.size:
+            changed_idx = idx[changed]
+            changed_last = last[changed]
+            changed_fair = fair[changed]
+            # Спреды изменившихся пар; некорректные цены дают 0
+            valid = (changed_last > 0) & (changed_fair > 0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                spread = np.where(valid, (changed_last - changed_fair) / changed_fair * 100, 0.0)
+            self._last[changed_idx] = changed_last
+            self._fair[changed_idx] = changed_fair
+            self._spread[changed_idx] = spread
+            self._above[changed_idx] = np.abs(spread) >= self.min_spread_percent
+            self.history.push(changed_idx, now, changed_last, changed_fair, spread)
+        
+        # Кандидаты - пары снимка из индекса "выше порога" (MIN_SPREAD_PERCENT)
+        candidates = np.flatnonzero(self._above[idx])
+        unchanged = candidates[~changed_mask[candidates]]
+        if unchanged.size:
+            self.history.repeat(idx[unchanged], self._spread[idx[unchanged]])
+        
+        abs_spread = np.abs(self._spread[idx])
+        max_pos = int(np.argmax(abs_spread))
+        max_spread = float(abs_spread[max_pos])
+        max_spread_pair = names[idx[max_pos]]
+        
+        if candidates.size == 0:
+            return [], max_spread, max_spread_pair
+        
+        # Фильтры устойчивости: спред должен продержаться, а не мелькнуть на одном тике
+        candidates = candidates[self.persistent(idx[candidates], now)]
+        if candidates.size == 0:
+            return [], max_spread, max_spread_pair
+        
+        # Cooldown и правило +5% - те же условия, что в should_alert
+        state_idx = idx[candidates]
+        candidate_spread = self._spread[state_idx]
+        cooled_down = (now - alert_state.time[state_idx]) >= self.alert_cooldown
+        escalated = (np.abs(candidate_spread) - np.abs(alert_state.spread[state_idx])) >= self.escalation_percent
+        fire_mask = cooled_down | escalated
+        fire = candidates[fire_mask]
+        
+        if self.verbose:
+            for pos in candidates[~cooled_down & escalated]:
+                previous = float(abs(alert_state.spread[idx[pos]]))
+                events.emit('spread_escalated', symbol=names[idx[pos]], previous=previous,
+                            current=float(abs_spread[pos]))
+        
+        fire_idx = idx[fire]
+        premark = dict(zip(fire_idx.tolist(), zip(alert_state.time[fire_idx].tolist(),
+                                                  alert_state.spread[fire_idx].tolist())))
+        if continued:
+            self._premark.update(premark)
+        else:
+            self._premark = premark
+        alert_state.mark(fire_idx, now, candidate_spread[fire_mask])
+        
+        alerts = []
+        for pos in fire:
+            symbol = names[idx[pos]]
+            spread_percent = float(self._spread[idx[pos]])
+            alert_data = {
+                'symbol': symbol,
+                'last_price': float(last[pos]),
+                'fair_price': float(fair[pos]),
+                'spread_percent': spread_percent,
+                'direction': 'выше' if spread_percent > 0 else 'ниже'
+            }
+            if exchange_ts is not None and not np.isnan(exchange_ts[pos]):
+                alert_data['exchange_ts'] = float(exchange_ts[pos])
+            alerts.append(alert_data)
+        
+        return alerts, max_spread, max_spread_pair
@@ -0,0 +1,142 @@
+"""
+История спреда по каждой паре: кольцевые буферы (timestamp, last, fair) в массивах
+Память выделяется заранее: символы x окно, без Python-объектов на каждую точку
+Счётчики устойчивости (сколько сканов подряд / сколько секунд выше порога) и статистика
+спреда (EWMA среднего и дисперсии, z-score) обновляются при записи, поэтому запросы
+правил алертов и команд бота - O(1) на пару
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+import config
+
+
+class SpreadHistory:
+    def __init__(self, window: Optional[int] = None, threshold: Optional[float] = None,
+                 ewma_alpha: Optional[float] = None, capacity: int = 1024):
+        """
+        window - сколько последних точек хранить на пару
+        threshold - порог |спреда| (%), для которого ведутся счётчики устойчивости
+        ewma_alpha - вес новой точки в сглаженном спреде
+        """
+        self.window = window or config.HISTORY_WINDOW
+        self.threshold = config.MIN_SPREAD_PERCENT if threshold is None else threshold
+        self.alpha = config.SPREAD_EWMA_ALPHA if ewma_alpha is None else ewma_alpha
+        self.capacity = 0
+
+        self.ts = np.zeros((0, self.window))
+        self.last = np.zeros((0, self.window))
+        self.fair = np.zeros((0, self.window))
+        self.head = np.zeros(0, dtype=np.int64)  # Куда писать следующую точку
+        self.count = np.zeros(0, dtype=np.int64)  # Сколько точек в буфере (<= window)
+
+        self.consecutive_above = np.zeros(0, dtype=np.int64)  # Сканов подряд с |спред| >= threshold
+        self.above_since = np.full(0, np.nan)  # Когда спред поднялся выше порога (NaN - сейчас ниже)
+        self.ewma = np.full(0, np.nan)  # Сглаженный спред (со знаком)
+        self.ewvar = np.zeros(0)  # EWMA дисперсии спреда
+        self.zscore = np.zeros(0)  # Отклонение последнего спреда от EWMA в сигмах (до его учёта)
+        self.above_total = np.zeros(0)  # Секунды выше порога в завершённых эпизодах
+
+        self.ensure_capacity(capacity)
+
+    def ensure_capacity(self, size: int):
+        """Расширить буферы под новые символы (удвоением, чтобы не копировать на каждом скане)"""
+        if size <= self.capacity:
+            return
+        new_capacity = max(size, self.capacity * 2)
+
+        def grow(array, fill):
+            shape = (new_capacity,) + array.shape[1:]
+            grown = np.full(shape, fill, dtype=array.dtype)
+            grown[:self.capacity] = array
+            return grown
+
+        self.ts = grow(self.ts, 0.0)
+        self.last = grow(self.last, 0.0)
+        self.fair = grow(self.fair, 0.0)
+        self.head = grow(self.head, 0)
+        self.count = grow(self.count, 0)
+        self.consecutive_above = grow(self.consecutive_above, 0)
+        self.above_since = grow(self.above_since, np.nan)
+        self.ewma = grow(self.ewma, np.nan)
+        self.ewvar = grow(self.ewvar, 0.0)
+        self.zscore = grow(self.zscore, 0.0)
+        self.above_total = grow(self.above_total, 0.0)
+        self.capacity = new_capacity
+
+    def push(self, idx: np.ndarray, ts: float, last: np.ndarray, fair: np.ndarray, spread: np.ndarray):
+        """Записать точки для пар idx (один вызов на скан) и обновить счётчики"""
+        if idx.size == 0:
+            return
+        self.ensure_capacity(int(idx.max()) + 1)
+
+        pos = self.head[idx]
+        self.ts[idx, pos] = ts
+        self.last[idx, pos] = last
+        self.fair[idx, pos] = fair
+        self.head[idx] = (pos + 1) % self.window
+        self.count[idx] = np.minimum(self.count[idx] + 1, self.window)
+
+        above = np.abs(spread) >= self.threshold
+        self.consecutive_above[idx] = np.where(above, self.consecutive_above[idx] + 1, 0)
+        since = self.above_since[idx]
+        # Эпизод выше порога закончился - его длительность уходит в сумму
+        ended = ~above & ~np.isnan(since)
+        self.above_total[idx[ended]] += ts - since[ended]
+        self.above_since[idx] = np.where(above, np.where(np.isnan(since), ts, since), np.nan)
+
+        self._update_stats(idx, spread)
+
+    def _update_stats(self, idx: np.ndarray, spread: np.ndarray):
+        """Инкрементальные EWMA среднего и дисперсии; z-score - по статистике до этой точки"""
+        mean = self.ewma[idx]
+        var = self.ewvar[idx]
+        diff = spread - mean  # NaN - первая точка пары
+        std = np.sqrt(var)
+        self.zscore[idx] = np.divide(diff, std, out=np.zeros(idx.size), where=std > 0)
+        increment = self.alpha * diff
+        mean += increment
+        var = (1 - self.alpha) * (var + diff * increment)
+        first = np.isnan(mean)
+        if first.any():
+            mean[first] = spread[first] if np.ndim(spread) else spread
+            var[first] = 0.0
+        self.ewma[idx] = mean
+        self.ewvar[idx] = var
+
+    def repeat(self, idx: np.ndarray, spread: np.ndarray):
+        """
+        Скан без изменения цен у пар idx выше порога: точка в буфер не пишется,
+        но счётчик сканов подряд и EWMA продвигаются, как если бы пришёл тот же спред
+        """
+        if idx.size == 0:
+            return
+        self.consecutive_above[idx] += 1
+        self._update_stats(idx, spread)
+
+    def forget(self, idx: np.ndarray):
+        """Очистить историю пар (делистинг)"""
+        self.head[idx] = 0
+        self.count[idx] = 0
+        self.consecutive_above[idx] = 0
+        self.above_since[idx] = np.nan
+        self.ewma[idx] = np.nan
+        self.ewvar[idx] = 0.0
+        self.zscore[idx] = 0.0
+        self.above_total[idx] = 0.0
+
+    def time_above(self, idx: np.ndarray, now: float) -> np.ndarray:
+        """Сколько секунд спред непрерывно выше порога (NaN - сейчас ниже)"""
+        return now - self.above_since[idx]
+
+    def total_above(self, idx: np.ndarray, now: float) -> np.ndarray:
+        """Сколько секунд спред был выше порога за всё время наблюдения (с текущим эпизодом)"""
+        since = self.above_since[idx]
+        return self.above_total[idx] + np.where(np.isnan(since), 0.0, now - since)
+
+    def samples(self, idx: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Точки одной пары в хронологическом порядке (для отладки и команд бота)"""
+        count = int(self.count[idx])
+        order = (self.head[idx] - count + np.arange(count)) % self.window
+        return self.ts[idx, order], self.last[idx, order], self.fair[idx, order]
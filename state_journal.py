@@ -0,0 +1,110 @@
+"""
+Журнал состояния монитора в SQLite (WAL): cooldown алертов и счётчики переживают перезапуск
+Каждый скан - одна короткая транзакция с алертами этого скана; старые записи периодически
+удаляются, WAL усекается. Падение процесса посреди записи откатывает только незавершённую транзакцию
+"""
+import sqlite3
+import time
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS cooldowns (symbol TEXT PRIMARY KEY, time REAL NOT NULL, spread REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS subscriber_cooldowns (
+    subscriber TEXT NOT NULL, symbol TEXT NOT NULL, time REAL NOT NULL, spread REAL NOT NULL,
+    PRIMARY KEY (subscriber, symbol)
+);
+"""
+
+# (symbol, время алерта, спред) и (ключ подписки, symbol, время, спред)
+AlertRow = Tuple[str, float, float]
+SubscriberRow = Tuple[str, str, float, float]
+
+
+class JournalState(NamedTuple):
+    scan_counter: int
+    total_alerts: int
+    cooldowns: List[AlertRow]
+    subscriber_cooldowns: List[SubscriberRow]
+
+
+class StateJournal:
+    def __init__(self, path: Optional[str] = None, compact_interval: Optional[float] = None):
+        """
+        path - файл базы (рядом появятся -wal и -shm)
+        compact_interval - как часто удалять истёкшие cooldown и усекать WAL (сек)
+        """
+        self.path = config.STATE_JOURNAL_PATH if path is None else path
+        self.compact_interval = config.JOURNAL_COMPACT_INTERVAL if compact_interval is None else compact_interval
+        # isolation_level=None - транзакции открываем сами, одна на скан
+        self._db = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # NORMAL в WAL: падение процесса не теряет закоммиченное, fsync только на checkpoint
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._last_compact = time.time()
+        self.retention = config.ALERT_COOLDOWN  # Дольше этого запись не нужна ни одной подписке (сек)
+
+    def restore(self) -> JournalState:
+        """Прочитать сохранённое состояние (пустое, если журнал новый)"""
+        counters = dict(self._db.execute("SELECT key, value FROM counters"))
+        return JournalState(
+            scan_counter=int(counters.get('scan_counter', 0)),
+            total_alerts=int(counters.get('total_alerts', 0)),
+            cooldowns=self._db.execute("SELECT symbol, time, spread FROM cooldowns").fetchall(),
+            subscriber_cooldowns=self._db.execute(
+                "SELECT subscriber, symbol, time, spread FROM subscriber_cooldowns").fetchall()
+        )
+
+    def record_scan(self, scan_counter: int, total_alerts: int,
+                    alerts: Iterable[AlertRow] = (), routed: Iterable[SubscriberRow] = (),
+                    now: Optional[float] = None):
+        """Записать итог скана одной транзакцией (без алертов - только счётчики)"""
+        db = self._db
+        db.execute("BEGIN")
+        try:
+            db.executemany("INSERT OR REPLACE INTO counters (key, value) VALUES (?, ?)",
+                           (('scan_counter', scan_counter), ('total_alerts', total_alerts)))
+            db.executemany("INSERT OR REPLACE INTO cooldowns (symbol, time, spread) VALUES (?, ?, ?)", alerts)
+            db.executemany("INSERT OR REPLACE INTO subscriber_cooldowns (subscriber, symbol, time, spread) "
+                           "VALUES (?, ?, ?, ?)", routed)
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            db.execute("ROLLBACK")
+            raise
+
+        now = time.time() if now is None else now
+        if now - self._last_compact >= self.compact_interval:
+            self.compact(now)
+
+    def forget(self, symbols: Iterable[str]):
+        """Удалить cooldown пар, снятых с торгов"""
+        rows = [(s,) for s in symbols]
+        db = self._db
+        db.execute("BEGIN")
+        try:
+            db.executemany("DELETE FROM cooldowns WHERE symbol = ?", rows)
+            db.executemany("DELETE FROM subscriber_cooldowns WHERE symbol = ?", rows)
+            db.execute("COMMIT")
+        except sqlite3.Error:
+            db.execute("ROLLBACK")
+            raise
+
+    def compact(self, now: Optional[float] = None):
+        """Удалить записи старше retention и усечь WAL"""
+        now = time.time() if now is None else now
+        cutoff = now - self.retention
+        self._db.execute("BEGIN")
+        self._db.execute("DELETE FROM cooldowns WHERE time < ?", (cutoff,))
+        self._db.execute("DELETE FROM subscriber_cooldowns WHERE time < ?", (cutoff,))
+        self._db.execute("COMMIT")
+        self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._last_compact = now
+
+    def close(self):
+        try:
+            self._db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            self._db.close()
@@ -0,0 +1,248 @@
+"""
+Подписки на алерты: у каждого чата/темы свой порог, сторона, списки пар и cooldown
+Подписки лежат в списках, отсортированных по порогу, с ключом (символ или "все", сторона):
+подписчики алерта - префиксы двух списков по bisect, O(log n + k) без обхода всех подписок
+"""
+import json
+import math
+import os
+import time
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import config
+
+SIDES = ('long', 'short', 'both')
+
+
+def _positive(name: str, value) -> float:
+    value = float(value)
+    if not math.isfinite(value) or value <= 0:
+        raise ValueError(f"{name} должен быть конечным числом больше нуля, получено {value}")
+    return value
+
+
+class Subscription:
+    __slots__ = ('chat_id', 'topic_id', 'min_spread', 'side', 'allow', 'deny', 'cooldown', 'last_alert')
+
+    def __init__(self, chat_id, topic_id: Optional[int] = None, min_spread: Optional[float] = None,
+                 side: str = 'both', allow: Iterable[str] = (), deny: Iterable[str] = (),
+                 cooldown: Optional[float] = None):
+        """
+        allow - только эти пары (пусто - все), deny - кроме этих
+        side - long (last ниже fair), short (last выше fair) или both
+        min_spread и cooldown - конечные и больше нуля (NaN сломал бы сортировку порогов и совпадал бы с любым спредом)
+        """
+        if side not in SIDES:
+            raise ValueError(f"side должен быть одним из {SIDES}")
+        self.chat_id = str(chat_id)
+        self.topic_id = int(topic_id) if topic_id else None
+        self.min_spread = _positive('min_spread', config.MIN_SPREAD_PERCENT if min_spread is None else min_spread)
+        self.side = side
+        self.allow = frozenset(allow)
+        self.deny = frozenset(deny)
+        self.cooldown = _positive('cooldown', config.ALERT_COOLDOWN if cooldown is None else cooldown)
+        self.last_alert: Dict[str, Tuple[float, float]] = {}  # symbol -> (время, спред) последнего алерта
+
+    @property
+    def key(self) -> str:
+        return f"{self.chat_id}:{self.topic_id or ''}"
+
+    def to_dict(self) -> Dict:
+        return {
+            'chat_id': self.chat_id, 'topic_id': self.topic_id, 'min_spread': self.min_spread,
+            'side': self.side, 'allow': sorted(self.allow), 'deny': sorted(self.deny), 'cooldown': self.cooldown
+        }
+
+    def ready(self, symbol: str, spread: float, now: float) -> bool:
+        """Cooldown подписчика и правило роста спреда (как у SpreadAnalyzer)"""
+        previous = self.last_alert.get(symbol)
+        if previous is None or now - previous[0] >= self.cooldown:
+            return True
+        return abs(spread) - abs(previous[1]) >= config.ALERT_ESCALATION_PERCENT
+
+    def mark(self, symbol: str, spread: float, now: float):
+        last_alert = self.last_alert
+        last_alert[symbol] = (now, spread)
+        if len(last_alert) > 1024:
+            # Истёкшие записи больше не нужны - словарь не растёт с числом пар за всё время
+            for expired in [s for s, (t, _) in last_alert.items() if now - t >= self.cooldown]:
+                del last_alert[expired]
+
+
+class _ThresholdList:
+    """Подписки, отсортированные по порогу: префикс до |спреда| - все, у кого порог пройден"""
+
+    __slots__ = ('thresholds', 'subscriptions')
+
+    def __init__(self):
+        self.thresholds: List[float] = []
+        self.subscriptions: List[Subscription] = []
+
+    def add(self, subscription: Subscription):
+        pos = bisect_right(self.thresholds, subscription.min_spread)
+        self.thresholds.insert(pos, subscription.min_spread)
+        self.subscriptions.insert(pos, subscription)
+
+    def remove(self, subscription: Subscription):
+        lo = bisect_left(self.thresholds, subscription.min_spread)
+        hi = bisect_right(self.thresholds, subscription.min_spread)
+        for pos in range(lo, hi):
+            if self.subscriptions[pos] is subscription:
+                del self.thresholds[pos]
+                del self.subscriptions[pos]
+                return
+
+    def upto(self, value: float) -> List[Subscription]:
+        return self.subscriptions[:bisect_right(self.thresholds, value)]
+
+
+class SubscriptionRegistry:
+    def __init__(self, path: Optional[str] = None):
+        self.path = config.SUBSCRIPTIONS_PATH if path is None else path
+        self.subscriptions: Dict[str, Subscription] = {}
+        # (символ или None - все пары, сторона) -> подписки по порогу
+        self._index: Dict[Tuple[Optional[str], str], _ThresholdList] = {}
+        self._all = _ThresholdList()  # Все подписки - для минимального порога
+        self.on_change: Optional[Callable[[], None]] = None
+
+    def __len__(self) -> int:
+        return len(self.subscriptions)
+
+    def get(self, chat_id, topic_id: Optional[int] = None) -> Optional[Subscription]:
+        return self.subscriptions.get(Subscription(chat_id, topic_id).key)
+
+    def _index_keys(self, subscription: Subscription):
+        sides = ('long', 'short') if subscription.side == 'both' else (subscription.side,)
+        symbols = subscription.allow or (None,)
+        for symbol in symbols:
+            for side in sides:
+                yield symbol, side
+
+    def _add(self, subscription: Subscription):
+        self.subscriptions[subscription.key] = subscription
+        self._all.add(subscription)
+        for key in self._index_keys(subscription):
+            bucket = self._index.get(key)
+            if bucket is None:
+                bucket = self._index[key] = _ThresholdList()
+            bucket.add(subscription)
+
+    def _remove(self, subscription: Subscription):
+        del self.subscriptions[subscription.key]
+        self._all.remove(subscription)
+        for key in self._index_keys(subscription):
+            bucket = self._index[key]
+            bucket.remove(subscription)
+            if not bucket.thresholds:
+                del self._index[key]
+
+    def upsert(self, subscription: Subscription):
+        """Добавить подписку или заменить подписку того же чата/темы (cooldown переносится)"""
+        previous = self.subscriptions.get(subscription.key)
+        if previous is not None:
+            subscription.last_alert = previous.last_alert
+            self._remove(previous)
+        self._add(subscription)
+        self._changed()
+
+    def remove(self, chat_id, topic_id: Optional[int] = None) -> bool:
+        subscription = self.get(chat_id, topic_id)
+        if subscription is None:
+            return False
+        self._remove(subscription)
+        self._changed()
+        return True
+
+    def _changed(self):
+        self.save()
+        if self.on_change:
+            self.on_change()
+
+    @property
+    def min_threshold(self) -> Optional[float]:
+        """Самый низкий порог среди подписок (None - подписок нет)"""
+        return self._all.thresholds[0] if self._all.thresholds else None
+
+    @property
+    def min_cooldown(self) -> Optional[float]:
+        if not self.subscriptions:
+            return None
+        return min(s.cooldown for s in self.subscriptions.values())
+
+    def route(self, symbol: str, spread: float, now: Optional[float] = None) -> List[Subscription]:
+        """Подписчики, которым нужно отправить алерт; их cooldown по паре отмечается сразу"""
+        if now is None:
+            now = time.time()
+        side = 'short' if spread > 0 else 'long'
+        value = abs(spread)
+
+        matched = []
+        for key in ((None, side), (symbol, side)):
+            bucket = self._index.get(key)
+            if bucket is None:
+                continue
+            for subscription in bucket.upto(value):
+                if symbol in subscription.deny or not subscription.ready(symbol, spread, now):
+                    continue
+                subscription.mark(symbol, spread, now)
+                matched.append(subscription)
+        return matched
+
+    def route_rule(self, symbol: str) -> List[Subscription]:
+        """
+        Подписчики алерта правила: порог и сторона спреда не важны, только списки пар
+        Те же корзины индекса, что у route, целиком: подписки на все пары и на эту пару, без обхода остальных
+        """
+        matched = {}
+        for key in ((None, 'long'), (None, 'short'), (symbol, 'long'), (symbol, 'short')):
+            bucket = self._index.get(key)
+            if bucket is None:
+                continue
+            for subscription in bucket.subscriptions:
+                if symbol not in subscription.deny:
+                    matched[subscription.key] = subscription  # Сторона both лежит в двух корзинах
+        return list(matched.values())
+
+    @property
+    def max_cooldown(self) -> Optional[float]:
+        if not self.subscriptions:
+            return None
+        return max(s.cooldown for s in self.subscriptions.values())
+
+    def restore_cooldowns(self, rows: Iterable[Tuple[str, str, float, float]], now: Optional[float] = None):
+        """Вернуть cooldown подписчиков из журнала (ключ подписки, symbol, время, спред)"""
+        if now is None:
+            now = time.time()
+        for key, symbol, alerted_at, spread in rows:
+            subscription = self.subscriptions.get(key)
+            if subscription is not None and now - alerted_at < subscription.cooldown:
+                subscription.last_alert[symbol] = (alerted_at, spread)
+
+    def load(self) -> bool:
+        """Прочитать подписки с диска. False - файла нет"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding='utf-8') as f:
+            rows = json.load(f)
+        for row in rows:
+            try:
+                self._add(Subscription(**row))
+            except (TypeError, ValueError) as e:
+                print(f"⚠️ Подписка {row.get('chat_id')} пропущена: {e}")
+        return True
+
+    def save(self):
+        """Записать подписки атомарно (временный файл + replace)"""
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([s.to_dict() for s in self.subscriptions.values()], f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def load_or_default(self):
+        """Подписки с диска; при первом запуске - одна подписка из TELEGRAM_CHAT_ID/TELEGRAM_TOPIC_ID"""
+        if not self.load() and config.TELEGRAM_CHAT_ID:
+            self._add(Subscription(config.TELEGRAM_CHAT_ID, config.TELEGRAM_TOPIC_ID or None))
+            self.save()
@@ -0,0 +1,44 @@
+"""
+Стабильная таблица символов: symbol -> индекс в массивах состояния
+Индекс выдаётся один раз и не меняется между сканированиями
+"""
+import sys
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+
+class SymbolTable:
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.names: List[str] = []
+        # Кэш последнего запроса: при неизменном списке пар индексы не пересчитываются
+        self._last_symbols: List[str] = []
+        self._last_indices = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.index
+
+    def get_or_add(self, symbol: str) -> int:
+        """Получить индекс символа, добавив его при первом появлении"""
+        idx = self.index.get(symbol)
+        if idx is None:
+            symbol = sys.intern(symbol)
+            idx = len(self.names)
+            self.index[symbol] = idx
+            self.names.append(symbol)
+        return idx
+
+    def indices(self, symbols: Sequence[str]) -> np.ndarray:
+        """Индексы для списка символов (массив int64)"""
+        if len(symbols) == len(self._last_symbols) and symbols == self._last_symbols:
+            return self._last_indices
+
+        get_or_add = self.get_or_add
+        result = np.fromiter((get_or_add(s) for s in symbols), dtype=np.int64, count=len(symbols))
+        self._last_symbols = list(symbols)
+        self._last_indices = result
+        return result
@@ -1,9 +1,13 @@
 """
 Telegram бот с командами для управления
 """
+import math
+from typing import Optional, Tuple
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
+from subscriptions import SIDES, Subscription
 import config
+import metrics
 from datetime import datetime
 import asyncio
 
@@ -12,6 +16,9 @@ class TelegramBotCommands:
     def __init__(self, monitor):
         """
         monitor - экземпляр PriceSpreadMonitor
+        Команды читают только monitor.state - неизменяемый снимок последнего скана
+        (/top и /symbol - его статистику пар: скан, идущий в пуле потоков, её не меняет)
+        Команды подписок меняют monitor.subscriptions в том же цикле событий, что и сканы
         """
         self.monitor = monitor
         self.start_time = datetime.now()
@@ -27,6 +34,13 @@ class TelegramBotCommands:
 /start - Показать это сообщение
 /status - Статус бота
 /stats - Статистика работы
+/subscribe [порог] [long|short|both] - Подписать этот чат/тему
+/unsubscribe - Отписать
+/allow, /deny [пары] - Только эти пары / кроме этих
+/cooldown [сек] - Пауза между алертами по одной паре
+/mysub - Текущая подписка
+/top [N] [z] - Пары с наибольшим спредом (или z-score)
+/symbol ПАРА - Статистика спреда по паре
 
 <b>Настройки:</b>
 📊 Отслеживаю: <code>{}</code> пар
@@ -35,7 +49,7 @@ class TelegramBotCommands:
 
 Бот работает в режиме реального времени!
 """.format(
-            len(self.monitor.symbols),
+            self.monitor.state.symbols_count,
             config.MIN_SPREAD_PERCENT,
             config.ALERT_COOLDOWN // 60
         )
@@ -44,6 +58,7 @@ class TelegramBotCommands:
     
     async def cmd_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /status"""
+        state = self.monitor.state
         uptime = datetime.now() - self.start_time
         hours = int(uptime.total_seconds() // 3600)
         minutes = int((uptime.total_seconds() % 3600) // 60)
@@ -53,9 +68,9 @@ class TelegramBotCommands:
 
 🟢 Статус: <b>Активен</b>
 ⏱ Работает: <code>{hours}ч {minutes}м</code>
-📈 Сканирований: <code>{self.monitor.scan_counter}</code>
-🔔 Всего алертов: <code>{self.monitor.total_alerts}</code>
-📊 Мониторинг: <code>{len(self.monitor.symbols)}</code> пар
+📈 Сканирований: <code>{state.scan_counter}</code>
+🔔 Всего алертов: <code>{state.total_alerts}</code>
+📊 Мониторинг: <code>{state.symbols_count}</code> пар
 
 ⚡️ Режим: <b>Непрерывное сканирование</b>
 """
@@ -64,30 +79,246 @@ class TelegramBotCommands:
     
     async def cmd_stats(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         """Команда /stats"""
+        state = self.monitor.state
         uptime = datetime.now() - self.start_time
-        scans_per_minute = self.monitor.scan_counter / (uptime.total_seconds() / 60) if uptime.total_seconds() > 0 else 0
+        scans_per_minute = state.scan_counter / (uptime.total_seconds() / 60) if uptime.total_seconds() > 0 else 0
+        dispatch = self.monitor.dispatcher.metrics()
+        phases = "\n".join(
+            f"• {name}: <code>{h.quantile(0.5) * 1000:.1f}/{h.quantile(0.95) * 1000:.1f} мс</code>"
+            for name, h in (
+                ("HTTP", metrics.FETCH_SECONDS),
+                ("Разбор", metrics.DECODE_SECONDS),
+                ("Анализ", metrics.ANALYSIS_SECONDS),
+                ("Очередь", metrics.DISPATCH_SECONDS),
+                ("Тик→алерт", metrics.TICK_TO_ALERT_SECONDS),
+            )
+        )
+        hosts = "\n".join(
+            f"• {host['url']}: <code>{host['ewma_ms']:.0f}/{host['p95_ms']:.0f} мс</code>"
+            f"{' 🔌 выключен' if host['open'] else ''}"
+            for host in self.monitor.mexc.transport.stats()
+        )
+        
+        lifecycle = ""
+        if self.monitor.lifecycle:
+            cycle = self.monitor.lifecycle.stats()
+            lifecycle = (f"\n• Сообщений/правок: <code>{cycle['messages']}/{cycle['edits']}</code>"
+                         f" (открыто {cycle['open']}, закрыто пар {cycle['resolved']})")
         
         stats_message = f"""
 📊 <b>Детальная статистика</b>
 
 <b>Общее:</b>
-• Выполнено сканирований: <code>{self.monitor.scan_counter}</code>
-• Отправлено алертов: <code>{self.monitor.total_alerts}</code>
+• Выполнено сканирований: <code>{state.scan_counter}</code>
+• Отправлено алертов: <code>{state.total_alerts}</code>
 • Скорость: <code>{scans_per_minute:.1f}</code> сканирований/мин
+• Частота факт/цель: <code>{state.achieved_hz:.2f}/{state.target_hz:.2f}</code> Гц
+• Изменилось в последнем скане: <code>{state.changed_pairs}/{state.pairs_in_scan}</code> пар
 
 <b>Настройки:</b>
 • Порог спреда: <code>{config.MIN_SPREAD_PERCENT}%</code>
 • Cooldown: <code>{config.ALERT_COOLDOWN}с</code>
-• Отслеживаемые пары: <code>{len(self.monitor.symbols)}</code>
+• Отслеживаемые пары: <code>{state.symbols_count}</code>
+• Подписок: <code>{len(self.monitor.subscriptions)}</code>
 
 <b>Активные алерты в cooldown:</b>
-<code>{len(self.monitor.analyzer.alert_history)}</code> пар
+<code>{state.active_cooldowns}</code> пар
+
+<b>Очередь отправки:</b>
+• В очереди: <code>{dispatch['queue_depth']}</code>{lifecycle}
+• Отправлено/выброшено/ошибок: <code>{dispatch['sent']}/{dispatch['dropped']}/{dispatch['failed']}</code>
+• Задержка отправки p50/p95: <code>{dispatch['send_p50_ms']:.0f}/{dispatch['send_p95_ms']:.0f} мс</code>
+
+<b>Фазы скана p50/p95:</b>
+{phases}
+• Ошибки/повторы/хеджи HTTP: <code>{metrics.REQUEST_ERRORS.value}/{metrics.REQUEST_RETRIES.value}/{metrics.REQUEST_HEDGES.value}</code>
+• Сканов дольше интервала: <code>{metrics.SCAN_OVERRUNS.value}</code>
+
+<b>Хосты MEXC EWMA/p95:</b>
+{hosts}
 """
         
         await update.message.reply_text(stats_message, parse_mode='HTML')
     
+    @staticmethod
+    def _target(update: Update) -> Tuple[int, Optional[int]]:
+        """Чат и тема (форум-группы), из которых пришла команда"""
+        message = update.effective_message
+        topic_id = message.message_thread_id if message.is_topic_message else None
+        return update.effective_chat.id, topic_id
+    
+    @staticmethod
+    def _symbols(args) -> list:
+        """BTC -> BTC_USDT, регистр не важен"""
+        return [a.upper() if '_' in a else f"{a.upper()}_USDT" for a in args]
+    
+    @staticmethod
+    async def _authorized(update: Update) -> bool:
+        """Подписки меняют админы (из любого чата) и разрешённые чаты; остальным - отказ"""
+        user = update.effective_user
+        if (user is not None and user.id in config.TELEGRAM_ADMIN_IDS) \
+                or update.effective_chat.id in config.TELEGRAM_ALLOWED_CHATS:
+            return True
+        await update.message.reply_text("⛔ Подписками этого чата управлять нельзя")
+        return False
+    
+    def _update_subscription(self, update: Update, **changes) -> Subscription:
+        """Создать или изменить подписку чата/темы (остальные поля сохраняются)"""
+        chat_id, topic_id = self._target(update)
+        registry = self.monitor.subscriptions
+        current = registry.get(chat_id, topic_id)
+        fields = current.to_dict() if current else {'chat_id': chat_id, 'topic_id': topic_id}
+        fields.update(changes)
+        subscription = Subscription(**fields)
+        registry.upsert(subscription)
+        return subscription
+    
+    @staticmethod
+    def _describe(subscription: Subscription) -> str:
+        allow = ", ".join(sorted(subscription.allow)) or "все"
+        deny = ", ".join(sorted(subscription.deny)) or "нет"
+        return (
+            f"⚠️ Порог: <code>{subscription.min_spread}%</code>\n"
+            f"↕️ Сторона: <code>{subscription.side}</code>\n"
+            f"✅ Пары: <code>{allow}</code>\n"
+            f"🚫 Кроме: <code>{deny}</code>\n"
+            f"🔔 Cooldown: <code>{subscription.cooldown:.0f}с</code>"
+        )
+    
+    async def cmd_subscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /subscribe [порог] [long|short|both]"""
+        if not await self._authorized(update):
+            return
+        changes = {}
+        for arg in context.args:
+            if arg.lower() in SIDES:
+                changes['side'] = arg.lower()
+                continue
+            try:
+                min_spread = float(arg.rstrip('%'))
+            except ValueError:
+                min_spread = math.nan
+            if not config.SUBSCRIPTION_MIN_SPREAD <= min_spread < math.inf:  # NaN тоже не проходит
+                await update.message.reply_text(
+                    f"Использование: /subscribe [порог % от {config.SUBSCRIPTION_MIN_SPREAD}] [long|short|both]")
+                return
+            changes['min_spread'] = min_spread
+        subscription = self._update_subscription(update, **changes)
+        await update.message.reply_text(f"🔔 <b>Подписка сохранена</b>\n\n{self._describe(subscription)}", parse_mode='HTML')
+    
+    async def cmd_unsubscribe(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /unsubscribe"""
+        if not await self._authorized(update):
+            return
+        removed = self.monitor.subscriptions.remove(*self._target(update))
+        await update.message.reply_text("🔕 Подписка удалена" if removed else "Подписки нет")
+    
+    async def cmd_allow(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /allow [пары] - без аргументов снимает ограничение"""
+        if not await self._authorized(update):
+            return
+        subscription = self._update_subscription(update, allow=self._symbols(context.args))
+        await update.message.reply_text(self._describe(subscription), parse_mode='HTML')
+    
+    async def cmd_deny(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /deny [пары] - без аргументов очищает список"""
+        if not await self._authorized(update):
+            return
+        subscription = self._update_subscription(update, deny=self._symbols(context.args))
+        await update.message.reply_text(self._describe(subscription), parse_mode='HTML')
+    
+    async def cmd_cooldown(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /cooldown [сек]"""
+        if not await self._authorized(update):
+            return
+        try:
+            cooldown = float(context.args[0]) if context.args else config.ALERT_COOLDOWN
+        except ValueError:
+            cooldown = math.nan
+        if not config.SUBSCRIPTION_MIN_COOLDOWN <= cooldown < math.inf:
+            await update.message.reply_text(f"Использование: /cooldown [секунды, от {config.SUBSCRIPTION_MIN_COOLDOWN}]")
+            return
+        subscription = self._update_subscription(update, cooldown=cooldown)
+        await update.message.reply_text(self._describe(subscription), parse_mode='HTML')
+    
+    async def cmd_mysub(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /mysub"""
+        subscription = self.monitor.subscriptions.get(*self._target(update))
+        if subscription is None:
+            await update.message.reply_text("Подписки нет. /subscribe - подписаться")
+            return
+        await update.message.reply_text(self._describe(subscription), parse_mode='HTML')
+    
+    @staticmethod
+    def _duration(seconds: float) -> str:
+        if seconds >= 3600:
+            return f"{seconds / 3600:.1f}ч"
+        if seconds >= 60:
+            return f"{seconds / 60:.0f}м"
+        return f"{seconds:.0f}с"
+    
+    async def cmd_top(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /top [N] [z] - N пар с наибольшим |спредом| или |z-score|"""
+        count, by = config.TOP_DEFAULT, 'spread'
+        for arg in context.args:
+            if arg.lower() == 'z':
+                by = 'z'
+                continue
+            try:
+                count = int(arg)
+            except ValueError:
+                await update.message.reply_text("Использование: /top [N] [z]")
+                return
+        stats = self.monitor.state.stats
+        rows = stats.top(max(1, min(count, config.TOP_MAX)), by) if stats else []
+        if not rows:
+            await update.message.reply_text("Данных ещё нет - дождитесь первого скана")
+            return
+        
+        lines = [
+            f"{n}. <b>{row['symbol']}</b> <code>{row['spread_percent']:+.2f}%</code> "
+            f"z <code>{row['zscore']:+.1f}</code> EWMA <code>{row['ewma']:+.2f}%</code>"
+            for n, row in enumerate(rows, 1)
+        ]
+        title = "z-score" if by == 'z' else "спреду"
+        await update.message.reply_text(f"🏆 <b>Топ-{len(rows)} по {title}</b>\n\n" + "\n".join(lines), parse_mode='HTML')
+    
+    async def cmd_symbol(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """Команда /symbol ПАРА"""
+        if not context.args:
+            await update.message.reply_text("Использование: /symbol BTC_USDT")
+            return
+        symbol = self._symbols(context.args[:1])[0]
+        stats = self.monitor.state.stats
+        row = stats.symbol(symbol) if stats else None
+        if row is None:
+            await update.message.reply_text(f"Пара {symbol} не найдена или ещё не сканировалась")
+            return
+        
+        message = f"""
+📈 <b>{row['symbol']}</b>
+
+💰 Последняя цена: <code>{row['last_price']:.6f}</code>
+⚖️ Справедливая цена: <code>{row['fair_price']:.6f}</code>
+📊 Спред: <code>{row['spread_percent']:+.2f}%</code>
+〰️ EWMA: <code>{row['ewma']:+.2f}%</code> ± <code>{row['std']:.2f}</code>
+📐 z-score: <code>{row['zscore']:+.2f}</code>
+⏱ Выше порога сейчас: <code>{self._duration(row['above_now'])}</code> ({row['consecutive_above']} сканов)
+⏳ Выше порога всего: <code>{self._duration(row['above_total'])}</code>
+🔔 Cooldown: <code>{'да' if row['cooldown'] else 'нет'}</code>
+"""
+        await update.message.reply_text(message, parse_mode='HTML')
+    
     def setup_handlers(self, app: Application):
         """Настроить обработчики команд"""
         app.add_handler(CommandHandler("start", self.cmd_start))
         app.add_handler(CommandHandler("status", self.cmd_status))
         app.add_handler(CommandHandler("stats", self.cmd_stats))
+        app.add_handler(CommandHandler("subscribe", self.cmd_subscribe))
+        app.add_handler(CommandHandler("unsubscribe", self.cmd_unsubscribe))
+        app.add_handler(CommandHandler("allow", self.cmd_allow))
+        app.add_handler(CommandHandler("deny", self.cmd_deny))
+        app.add_handler(CommandHandler("cooldown", self.cmd_cooldown))
+        app.add_handler(CommandHandler("mysub", self.cmd_mysub))
+        app.add_handler(CommandHandler("top", self.cmd_top))
+        app.add_handler(CommandHandler("symbol", self.cmd_symbol))
@@ -1,8 +1,11 @@
 """
 Telegram уведомления о спреде цен
 """
+import html
 import requests
-from typing import Dict
+from requests.adapters import HTTPAdapter
+from typing import Dict, List, Optional
+from event_log import events
 import config
 
 
@@ -13,7 +16,14 @@ class TelegramNotifier:
         
         self.bot_token = config.TELEGRAM_BOT_TOKEN
         self.chat_id = config.TELEGRAM_CHAT_ID
-        self.api_url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+        self.api_base = f"{config.TELEGRAM_API_URL}/bot{self.bot_token}"
+        self.api_url = f"{self.api_base}/sendMessage"
+        
+        # Пул keep-alive соединений: без нового TLS-рукопожатия на каждый алерт
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.TELEGRAM_POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
     def format_message(self, alert_data: Dict) -> str:
         """Форматировать сообщение о спреде (Visual Style)"""
@@ -48,38 +58,88 @@ Side: {emoji} <b>{side}</b>
 """
         return message.strip()
     
+    def format_rule_message(self, alert_data: Dict) -> str:
+        """Алерт правила: имя, условие и значения полей, на которые оно смотрит"""
+        # Условие с < и > - экранируется для parse_mode HTML
+        lines = [f"📐 <u>{alert_data['symbol']}</u> <b>{html.escape(alert_data['rule'])}</b>",
+                 f"<code>{html.escape(alert_data['when'])}</code>", ""]
+        for field, value in alert_data['values'].items():
+            lines.append(f"{field}: <code>{value:.6g}</code>")
+        return "\n".join(lines)
+    
+    def format_digest(self, alerts: List[Dict], resolved: Optional[Dict[str, float]] = None) -> str:
+        """
+        Одно сообщение на несколько алертов скана (один алерт - обычный формат)
+        resolved - пары, чей спред вернулся: symbol -> текущий спред
+        """
+        resolved = resolved or {}
+        if len(alerts) == 1:
+            alert_data = alerts[0]
+            message = self.format_message(alert_data)
+            if alert_data['symbol'] in resolved:
+                message += f"\n\n✅ <b>Спред вернулся</b>: <code>{abs(resolved[alert_data['symbol']]):.2f}%</code>"
+            return message
+        
+        lines = [f"🔔 <b>Спреды: {len(alerts)} пар</b>", ""]
+        for alert_data in sorted(alerts, key=lambda a: -abs(a['spread_percent'])):
+            symbol = alert_data['symbol']
+            spread_percent = alert_data['spread_percent']
+            if symbol in resolved:
+                lines.append(f"✅ <s><u>{symbol}</u> {abs(spread_percent):.2f}%</s> → {abs(resolved[symbol]):.2f}%")
+            else:
+                emoji, side = ("🔴", "short") if spread_percent > 0 else ("🟢", "long")
+                lines.append(f"{emoji} <u>{symbol}</u> <b>{abs(spread_percent):.2f}%</b> {side} "
+                             f"(fair <code>{alert_data['fair_price']:.6g}</code>, last <code>{alert_data['last_price']:.6g}</code>)")
+        return "\n".join(lines)
+    
+    def build_payload(self, alert_data: Dict, chat_id=None, topic_id=None, message: Optional[str] = None) -> Dict:
+        """
+        Собрать тело запроса sendMessage
+        chat_id/topic_id - чат и тема подписчика (по умолчанию TELEGRAM_CHAT_ID/TELEGRAM_TOPIC_ID)
+        message - уже отформатированный текст (один на всех подписчиков алерта)
+        """
+        if message is None:
+            message = self.format_message(alert_data)
+        
+        payload = {
+            'chat_id': self.chat_id if chat_id is None else chat_id,
+            'text': message,
+            'parse_mode': 'HTML'
+        }
+        
+        # Если задан ID темы, добавляем его
+        if chat_id is not None:
+            if topic_id:
+                payload['message_thread_id'] = int(topic_id)
+        elif config.TELEGRAM_TOPIC_ID:
+            try:
+                payload['message_thread_id'] = int(config.TELEGRAM_TOPIC_ID)
+            except ValueError:
+                print(f"⚠️ Ошибка: TELEGRAM_TOPIC_ID '{config.TELEGRAM_TOPIC_ID}' не является числом")
+        
+        return payload
+    
+    def post(self, payload: Dict, method: str = 'sendMessage') -> requests.Response:
+        """Отправить готовый payload через пул соединений (method - метод Bot API)"""
+        return self.session.post(
+            f"{self.api_base}/{method}",
+            json=payload,
+            timeout=10
+        )
+    
     def send_alert_sync(self, alert_data: Dict):
         """Отправить уведомление в Telegram (синхронно)"""
         try:
-            message = self.format_message(alert_data)
-            
-            payload = {
-                'chat_id': self.chat_id,
-                'text': message,
-                'parse_mode': 'HTML'
-            }
-            
-            # Если задан ID темы, добавляем его
-            if config.TELEGRAM_TOPIC_ID:
-                try:
-                    payload['message_thread_id'] = int(config.TELEGRAM_TOPIC_ID)
-                except ValueError:
-                    print(f"⚠️ Ошибка: TELEGRAM_TOPIC_ID '{config.TELEGRAM_TOPIC_ID}' не является числом")
-            
-            response = requests.post(
-                self.api_url,
-                json=payload,
-                timeout=10
-            )
+            response = self.post(self.build_payload(alert_data))
             
             try:
                 response.raise_for_status()
-                print(f"✅ Алерт отправлен для {alert_data['symbol']}")
-            except requests.exceptions.HTTPError as e:
-                print(f"❌ Ошибка отправки в Telegram: {e}")
-                print(f"🔍 Детали ошибки: {response.text}")
+                events.emit('alert_sent', symbol=alert_data['symbol'], chat_id=self.chat_id, attempts=1)
+            except requests.exceptions.HTTPError:
+                events.emit('alert_rejected', symbol=alert_data['symbol'], chat_id=self.chat_id,
+                            status=response.status_code, detail=response.text)
                 
         except requests.exceptions.RequestException as e:
-            print(f"❌ Ошибка отправки в Telegram: {e}")
+            events.emit('alert_gave_up', symbol=alert_data['symbol'], chat_id=self.chat_id, attempts=1, error=str(e))
         except Exception as e:
-            print(f"❌ Неожиданная ошибка: {e}")
+            events.emit('alert_error', symbol=alert_data['symbol'], error=repr(e))
@@ -0,0 +1,59 @@
+"""
+Общие заглушки для тестов: MEXC и Telegram из mock_servers.py, config монитора на временной папке
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from event_log import events
+from mock_servers import MockMEXCServer, MockTelegramServer
+
+
+@pytest.fixture
+def mexc_server():
+    server = MockMEXCServer(contracts=200)
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def telegram_server():
+    server = MockTelegramServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def monitor_config(monkeypatch, tmp_path, mexc_server, telegram_server):
+    """config монитора на заглушках: все файлы во временной папке, без метрик и консоли"""
+    settings = {
+        'MEXC_BASE_URL': mexc_server.url,
+        'MEXC_FUTURES_URL': '',
+        'TELEGRAM_API_URL': telegram_server.url,
+        'TELEGRAM_BOT_TOKEN': 'test',
+        'TELEGRAM_CHAT_ID': '-100',
+        'TELEGRAM_TOPIC_ID': '',
+        'INGESTION_MODE': 'rest',
+        'SCAN_INTERVAL': 0.1,
+        'PACING_POLICY': 'fixed',
+        'METRICS_PORT': 0,
+        'SNAPSHOT_RECORD_PATH': None,
+        'CONTRACT_CACHE_PATH': str(tmp_path / 'contracts.json'),
+        'SUBSCRIPTIONS_PATH': str(tmp_path / 'subscriptions.json'),
+        'STATE_JOURNAL_PATH': str(tmp_path / 'state_journal.db'),
+        'EVENT_LOG_PATH': str(tmp_path / 'events.jsonl'),
+        'EVENT_LOG_CONSOLE': False,
+        'ALERT_RULES_PATH': '',
+        'VENUES': [],
+    }
+    for name, value in settings.items():
+        monkeypatch.setattr(config, name, value)
+    monkeypatch.setattr(events, 'path', settings['EVENT_LOG_PATH'])
+    monkeypatch.setattr(events, 'console', False)
+    return tmp_path
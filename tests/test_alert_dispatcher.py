@@ -0,0 +1,83 @@
+"""
+Очередь отправки: лимиты чатов и пауза 429 одного чата не задерживают остальные
+"""
+import config
+from alert_dispatcher import AlertDispatcher
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _alert(symbol: str, spread: float) -> dict:
+    return {'symbol': symbol, 'spread_percent': spread}
+
+
+def _dispatcher(clock: _Clock, max_queue: int = 100) -> AlertDispatcher:
+    return AlertDispatcher(notifier=None, max_queue=max_queue, clock=clock)
+
+
+def _enqueue(dispatcher: AlertDispatcher, chat_id: str, symbol: str, spread: float):
+    assert dispatcher.enqueue(_alert(symbol, spread), {'chat_id': chat_id, 'text': symbol})
+
+
+def _poll_all(dispatcher: AlertDispatcher) -> list:
+    sent = []
+    while True:
+        item, _ = dispatcher._poll()
+        if item is None:
+            return sent
+        sent.append((item[5]['chat_id'], item[6]['symbol']))
+
+
+def test_empty_chat_bucket_does_not_block_other_chats():
+    clock = _Clock()
+    dispatcher = _dispatcher(clock)
+    # Чат A расходует свой burst - его следующий алерт с самым большим спредом ждёт токена
+    for n in range(config.TELEGRAM_CHAT_BURST + 1):
+        _enqueue(dispatcher, 'A', f"A{n}", 50.0)
+    _enqueue(dispatcher, 'B', 'B0', 11.0)
+
+    sent = _poll_all(dispatcher)
+
+    assert ('B', 'B0') in sent
+    assert dispatcher.queue_depth == 1
+    item, wait = dispatcher._poll()
+    assert item is None and wait > 0
+
+
+def test_throttled_chat_does_not_block_other_chats():
+    clock = _Clock()
+    dispatcher = _dispatcher(clock)
+    _enqueue(dispatcher, 'A', 'A0', 50.0)
+    item, _ = dispatcher._poll()
+    # 429 в чате A: пауза и повтор через 30 секунд
+    dispatcher._chat_bucket('A').pause(30)
+    dispatcher._retry(item, 30)
+    _enqueue(dispatcher, 'A', 'A1', 40.0)
+    _enqueue(dispatcher, 'B', 'B0', 11.0)
+
+    assert _poll_all(dispatcher) == [('B', 'B0')]
+    _, wait = dispatcher._poll()
+    assert 0 < wait <= 30
+
+    clock.now += 30
+    assert _poll_all(dispatcher) == [('A', 'A0'), ('A', 'A1')]
+    assert dispatcher.queue_depth == 0
+
+
+def test_full_queue_evicts_weakest_across_chats():
+    clock = _Clock()
+    dispatcher = _dispatcher(clock, max_queue=3)
+    _enqueue(dispatcher, 'A', 'A0', 30.0)
+    _enqueue(dispatcher, 'B', 'B0', 12.0)
+    _enqueue(dispatcher, 'C', 'C0', 20.0)
+    _enqueue(dispatcher, 'C', 'C1', 25.0)  # Вытесняет B0
+    assert not dispatcher.enqueue(_alert('D0', 11.0), {'chat_id': 'D', 'text': 'D0'})  # Слабее всех
+
+    assert dispatcher.dropped == 2
+    assert sorted(_poll_all(dispatcher)) == [('A', 'A0'), ('C', 'C0'), ('C', 'C1')]
@@ -0,0 +1,34 @@
+"""
+Правила алертов: числа вне диапазона float и ошибка вычисления правил в скане
+"""
+import pytest
+
+from alert_rules import AlertRule, RuleEngine, RuleError, parse_rule
+from main import PriceSpreadMonitor
+
+
+@pytest.mark.parametrize('when', ['last > 1e999', 'funding < -1e999%', 'volume > 1e400 * 2'])
+def test_non_finite_literal_is_rejected(when):
+    with pytest.raises(RuleError, match="вне диапазона"):
+        parse_rule(when)
+
+
+def test_rule_failure_does_not_abort_scan(monitor_config, mexc_server, monkeypatch):
+    mexc_server.set_prices({mexc_server.symbols[0]: 25.0})
+    monitor = PriceSpreadMonitor()
+    assert monitor.load_symbols()
+    monitor.confirmer = None
+    monitor.lifecycle = None
+    monitor.rules = RuleEngine(path='', builtin=[AlertRule('any', 'last > 0')])
+
+    def broken_check(*args, **kwargs):
+        raise ZeroDivisionError("float division by zero")
+
+    monkeypatch.setattr(monitor.rules, 'check', broken_check)
+
+    feedback = monitor.scan_all_pairs()
+
+    assert feedback['max_spread'] >= 25.0
+    assert monitor.scan_counter == 1 and monitor.total_alerts == 1
+    assert monitor.state.scan_counter == 1
+    monitor.journal.close()
@@ -0,0 +1,75 @@
+"""
+asyncio-рантайм: подтверждение кандидатов ждёт ответов в пуле потоков, цикл событий не блокируется
+"""
+import asyncio
+import time
+
+import pytest
+
+import config
+from main import PriceSpreadMonitor
+
+
+class _SlowConfirmer:
+    """Отвечает через delay секунд (медленная биржа) и подтверждает всех"""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.rounds = 0
+
+    def confirm(self, alerts, min_spread):
+        self.rounds += 1
+        time.sleep(self.delay)
+        return alerts, []
+
+    def close(self):
+        pass
+
+
+async def _max_stall(coroutine) -> float:
+    """Самая долгая пауза цикла событий, пока выполняется coroutine"""
+    stalls = []
+
+    async def heartbeat():
+        previous = time.perf_counter()
+        while True:
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            stalls.append(now - previous)
+            previous = now
+
+    beat = asyncio.create_task(heartbeat())
+    await coroutine
+    await asyncio.sleep(0.05)  # Пауза, которая закончилась вместе с coroutine, тоже попадает в замер
+    beat.cancel()
+    return max(stalls, default=0.0)
+
+
+@pytest.mark.parametrize('stream_parse', [True, False])
+def test_confirmation_does_not_block_event_loop(monitor_config, mexc_server, monkeypatch, stream_parse):
+    monkeypatch.setattr(config, 'STREAM_PARSE', stream_parse)
+    mexc_server.set_prices({mexc_server.symbols[3]: 25.0})
+    monitor = PriceSpreadMonitor()
+    assert monitor.load_symbols()
+    monitor.confirmer = _SlowConfirmer(0.5)
+
+    stall = asyncio.run(_max_stall(monitor.scan_all_pairs_async()))
+
+    assert monitor.confirmer.rounds == 1
+    assert monitor.scan_counter == 1 and monitor.total_alerts == 1
+    assert stall < 0.3
+    monitor.journal.close()  # Отправка алертов не запускалась - останавливать нечего
+
+
+def test_ws_push_is_confirmed_off_loop(monitor_config, mexc_server):
+    monitor = PriceSpreadMonitor()
+    assert monitor.load_symbols()
+    monitor.confirmer = _SlowConfirmer(0.5)
+    symbol = mexc_server.symbols[5]
+    push = [{'symbol': symbol, 'last_price': 125.0, 'fair_price': 100.0}]
+
+    stall = asyncio.run(_max_stall(monitor.process_price_data_async(push)))
+
+    assert monitor.confirmer.rounds == 1 and monitor.total_alerts == 1
+    assert stall < 0.3
+    monitor.journal.close()  # Отправка алертов не запускалась - останавливать нечего
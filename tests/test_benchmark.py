@@ -0,0 +1,24 @@
+"""
+Бенчмарки в уменьшенном масштабе: каждый раздел benchmark.py запускается без исключений
+"""
+import pytest
+
+import benchmark
+import config
+
+
+@pytest.fixture
+def small_benchmark(monitor_config, monkeypatch):
+    """SCALE=0.01 и возврат настроек config, которые бенчмарки меняют напрямую"""
+    monkeypatch.setattr(benchmark, 'SCALE', 0.01)
+    saved = {name: value for name, value in vars(config).items() if name.isupper()}
+    yield
+    for name, value in saved.items():
+        setattr(config, name, value)
+
+
+@pytest.mark.parametrize('name', sorted(benchmark.BENCHMARKS))
+def test_benchmark_section_runs(name, small_benchmark, capsys):
+    benchmark.BENCHMARKS[name]()
+
+    assert "БЕНЧМАРК" in capsys.readouterr().out
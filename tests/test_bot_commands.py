@@ -0,0 +1,48 @@
+"""
+/top и /symbol: ответы из неизменяемого снимка последнего скана, а не из живых массивов анализатора
+"""
+import asyncio
+from types import SimpleNamespace
+
+from main import PriceSpreadMonitor
+from telegram_bot_commands import TelegramBotCommands
+
+
+class _Message:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def _ask(command, *args) -> str:
+    message = _Message()
+    asyncio.run(command(SimpleNamespace(message=message), SimpleNamespace(args=list(args))))
+    return message.replies[-1]
+
+
+def test_top_and_symbol_read_published_state(monitor_config, mexc_server):
+    monitor = PriceSpreadMonitor()
+    commands = TelegramBotCommands(monitor)
+    assert _ask(commands.cmd_top).startswith("Данных ещё нет")
+
+    hot = mexc_server.symbols[4]
+    mexc_server.set_prices({hot: 25.0})
+    assert monitor.load_symbols()
+    monitor.confirmer = None
+    monitor.lifecycle = None
+    monitor.scan_all_pairs()
+    top, symbol = _ask(commands.cmd_top, '3'), _ask(commands.cmd_symbol, hot)
+    assert f"1. <b>{hot}</b> <code>+25.00%</code>" in top
+    assert "+25.00%" in symbol
+
+    # Скан посередине (следующий снимок уже в массивах анализатора, состояние ещё не опубликовано)
+    mexc_server.set_prices({hot: 3.0})
+    snapshot = monitor.mexc.get_price_snapshot()
+    monitor.analyzer.analyze_batch(None, snapshot.last, snapshot.fair, idx=snapshot.idx)
+    assert abs(monitor.analyzer.current_spread(hot) - 3.0) < 0.01
+
+    assert _ask(commands.cmd_top, '3') == top
+    assert _ask(commands.cmd_symbol, hot).split("⏱")[0] == symbol.split("⏱")[0]
+    monitor.journal.close()
@@ -0,0 +1,40 @@
+"""
+Снятые с торгов пары: состояние забыто, и в следующих сканах они не появляются снова
+"""
+from main import PriceSpreadMonitor
+
+
+def _monitor():
+    monitor = PriceSpreadMonitor()
+    assert monitor.load_symbols()
+    monitor.confirmer = None
+    monitor.lifecycle = None
+    return monitor
+
+
+def test_delisted_pair_is_not_scanned_again(monitor_config, mexc_server):
+    delisted = mexc_server.symbols[7]
+    mexc_server.set_prices({delisted: 25.0})
+    monitor = _monitor()
+    monitor.scan_all_pairs()
+    assert monitor.total_alerts == 1
+    assert monitor.analyzer.symbol_stats(delisted) is not None
+
+    # Новый список контрактов без пары; массовый тикер биржи всё ещё её отдаёт
+    details = monitor.contract_client.get_contract_details()
+    monitor._pending_contracts = [d for d in details if d['symbol'] != delisted]
+    mexc_server.set_prices({delisted: 40.0})  # forget снял cooldown: без фильтра пара алертила бы снова
+    monitor.scan_all_pairs()
+
+    assert delisted not in monitor.symbols
+    assert monitor.total_alerts == 1
+    assert monitor.state.pairs_in_scan == len(mexc_server.symbols) - 1
+    assert monitor.analyzer.symbol_stats(delisted) is None
+    assert all(delisted != row['symbol'] for row in monitor.analyzer.top(5))
+
+    # Пара вернулась в список - снова сканируется
+    monitor._pending_contracts = details
+    monitor.scan_all_pairs()
+    assert monitor.state.pairs_in_scan == len(mexc_server.symbols)
+    assert monitor.total_alerts == 2
+    monitor.journal.close()
@@ -0,0 +1,120 @@
+"""
+Хеджирование запросов: проигравший запрос закрывается, не занимая пул, 4xx не считается успехом хоста
+"""
+import time
+
+import pytest
+
+import config
+from hedged_transport import HedgedTransport
+from mock_servers import MockMEXCServer
+
+TICKER = '/api/v1/contract/ticker'
+
+
+@pytest.fixture
+def hosts(monkeypatch):
+    monkeypatch.setattr(config, 'HEDGE_DEFAULT_DELAY', 0.05)
+    slow, fast = MockMEXCServer(contracts=2000, latency=1.0), MockMEXCServer(contracts=2000)
+    slow.start()
+    fast.start()
+    yield slow, fast
+    slow.stop()
+    fast.stop()
+
+
+def test_losers_are_closed_and_do_not_fill_pool(hosts):
+    slow, fast = hosts
+    transport = HedgedTransport([slow.url, fast.url])
+    slow_endpoint = transport.endpoints[0]
+    transport._available = lambda: list(transport.endpoints)  # Всегда сначала медленный хост
+
+    started = time.perf_counter()
+    for _ in range(10):
+        response = transport.get(TICKER)
+        assert response.status_code == 200 and len(response.json()['data']) == 2000
+        assert slow_endpoint.inflight <= config.HEDGE_POOL_SIZE + 1
+    # Медленный хост держит не больше своих соединений: скан не ждёт освобождения пула
+    assert time.perf_counter() - started < 3.0
+    assert transport.hedge_wins == 10
+
+    deadline = time.monotonic() + 5
+    while slow_endpoint.inflight and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert slow_endpoint.inflight == 0
+    transport.close()
+
+
+def test_saturated_host_is_skipped(hosts):
+    slow, fast = hosts
+    transport = HedgedTransport([slow.url, fast.url])
+    slow_endpoint, fast_endpoint = transport.endpoints
+    slow_endpoint.latency_ewma, fast_endpoint.latency_ewma = 0.0, 0.001  # Медленный хост выглядит быстрым
+
+    for _ in range(5):
+        assert transport.get(TICKER).status_code == 200
+    # Пока заняты все соединения медленного хоста, запросы сразу идут на быстрый
+    assert slow.requests[TICKER] <= config.HEDGE_POOL_SIZE
+    transport.close()
+
+
+def test_client_error_is_not_host_success(hosts):
+    _, fast = hosts
+    transport = HedgedTransport([fast.url])
+    endpoint = transport.endpoints[0]
+    endpoint.failures = config.CIRCUIT_FAILURES - 1
+
+    response = transport.get('/api/v1/contract/unknown')
+
+    assert response.status_code == 404
+    assert endpoint.failures == config.CIRCUIT_FAILURES - 1  # Серия ошибок не сброшена
+    assert len(endpoint.samples) == 0 and endpoint.latency_ewma is None
+    transport.close()
+
+
+def test_loser_cancelled_in_queue_releases_host(hosts, monkeypatch):
+    import threading
+
+    monkeypatch.setattr(config, 'HEDGE_POOL_SIZE', 1)
+    slow, fast = hosts
+    transport = HedgedTransport([slow.url, fast.url])
+    slow_endpoint, fast_endpoint = transport.endpoints
+    transport._available = lambda: list(transport.endpoints)  # Всегда сначала медленный хост
+    busy = threading.Event()
+    submit = transport._pool.submit
+    submit(busy.wait)  # Один из двух потоков пула занят - хедж ждёт в очереди
+
+    def submit_holding_winner(fn, endpoint, *args):
+        future = submit(fn, endpoint, *args)
+        if endpoint is slow_endpoint:
+            # Поток победителя задерживается в колбэке и не успевает взять хедж из очереди до отмены
+            future.add_done_callback(lambda _: time.sleep(0.3))
+        return future
+
+    transport._pool.submit = submit_holding_winner
+    try:
+        assert transport.get(TICKER).status_code == 200
+    finally:
+        busy.set()
+
+    # Хедж на быстрый хост отменён, не начавшись: хост не должен числиться занятым
+    assert transport.hedges == 1 and fast.requests.get(TICKER, 0) == 0
+    assert fast_endpoint.inflight == 0
+    transport.close()
+
+
+def test_hedge_delay_is_below_latency_tail():
+    transport = HedgedTransport(['http://127.0.0.1:1'])
+    endpoint = transport.endpoints[0]
+    assert transport.hedge_delay(endpoint) == config.HEDGE_DEFAULT_DELAY
+
+    endpoint.record_success(0.01, config.HEDGE_LATENCY_ALPHA)
+    # Пока замеров мало - от EWMA, а не через HEDGE_DEFAULT_DELAY
+    assert transport.hedge_delay(endpoint) == max(config.HEDGE_MIN_DELAY, 0.01 * config.HEDGE_EWMA_FACTOR)
+
+    # Хвост ~6% по 400 мс: p95 попадает в хвост, хедж - нет
+    for i in range(200):
+        endpoint.record_success(0.4 if i % 16 == 0 else 0.01, config.HEDGE_LATENCY_ALPHA)
+    assert endpoint.p95() == 0.4
+    assert transport.hedge_delay(endpoint) == config.HEDGE_MIN_DELAY
+    transport.close()
@@ -0,0 +1,132 @@
+"""
+WebSocket поток тикеров на ReplayTickerServer: переподключение с переподпиской, ресинхронизация через REST
+при пропуске и протухании потока, в анализ - только изменившиеся пары
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+import config
+from hedged_transport import HedgedTransport
+from mexc_client import MEXCClient
+from mexc_stream import MEXCTickerStream
+from mock_servers import ReplayTickerServer
+
+TICKER = '/api/v1/contract/ticker'
+
+
+@pytest.fixture
+def fast_stream(monkeypatch):
+    """Короткие таймауты потока, чтобы переподключение и fallback укладывались в доли секунды"""
+    monkeypatch.setattr(config, 'STREAM_RECONNECT_MAX_DELAY', 0.1)
+    monkeypatch.setattr(config, 'STREAM_STALE_TIMEOUT', 5.0)
+    monkeypatch.setattr(config, 'STREAM_GAP_THRESHOLD', 5.0)
+    monkeypatch.setattr(config, 'SCAN_INTERVAL', 0.05)
+    monkeypatch.setattr(config, 'STREAM_RECORD_PATH', None)
+
+
+def _frame(t: float, tickers, ts: int) -> dict:
+    """Кадр в формате записи STREAM_RECORD_PATH"""
+    return {'t': t, 'frame': json.dumps({'channel': 'push.tickers', 'ts': ts, 'data': tickers})}
+
+
+def _ticker(symbol: str, last: float, fair: float) -> dict:
+    return {'symbol': symbol, 'lastPrice': last, 'fairPrice': fair}
+
+
+def _run(mexc_server, frames, until, speed: float = 100.0, drop_after=None, timeout: float = 5.0):
+    """Запустить поток против заглушки до until(stream, server); вернуть поток, заглушку и доставленные пачки"""
+    client = MEXCClient(transport=HedgedTransport([mexc_server.url]))
+    delivered = []
+
+    async def on_update(price_data):
+        delivered.append(sorted(p['symbol'] for p in price_data))
+
+    async def scenario():
+        server = ReplayTickerServer(frames, speed=speed, drop_after=drop_after)
+        await server.start()
+        stream = MEXCTickerStream(client, on_update, url=server.url)
+        task = asyncio.create_task(stream.run())
+        deadline = time.monotonic() + timeout
+        try:
+            while not until(stream, server):
+                assert time.monotonic() < deadline, "поток не дошёл до ожидаемого состояния"
+                await asyncio.sleep(0.02)
+        finally:
+            stream.stop()
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            await server.stop()
+        return stream, server
+
+    stream, server = asyncio.run(scenario())
+    client.transport.close()
+    return stream, server, delivered
+
+
+def test_reconnects_and_resubscribes(mexc_server, fast_stream):
+    symbol = mexc_server.symbols[0]
+    frames = [_frame(i * 0.01, [_ticker(symbol, 1.0 + i, 1.0)], 1000 + i) for i in range(3)]
+
+    stream, server, _ = _run(mexc_server, frames, drop_after=2,
+                             until=lambda stream, server: server.subscriptions >= 2 and stream.pushes >= 4)
+
+    assert stream.reconnects >= 1
+    assert server.connections >= 2
+    # После переподключения - снова подписка и ресинхронизация через REST
+    assert stream.rest_fallbacks >= 2
+
+
+def test_exchange_time_going_back_triggers_rest_resync(mexc_server, fast_stream):
+    symbol = mexc_server.symbols[0]
+    frames = [_frame(0.0, [_ticker(symbol, 2.0, 1.0)], 2000),
+              _frame(0.01, [_ticker(symbol, 3.0, 1.0)], 1000)]  # Время биржи пошло назад - кадры потеряны
+
+    stream, _, _ = _run(mexc_server, frames, until=lambda stream, server: stream.gaps >= 1 and stream.rest_fallbacks >= 2)
+
+    assert stream.gaps == 1
+    assert mexc_server.requests[TICKER] == 2  # При подключении и после пропуска
+
+
+def test_pause_between_pushes_triggers_rest_resync(mexc_server, fast_stream, monkeypatch):
+    monkeypatch.setattr(config, 'STREAM_GAP_THRESHOLD', 0.1)
+    symbol = mexc_server.symbols[0]
+    frames = [_frame(0.0, [_ticker(symbol, 2.0, 1.0)], 1000),
+              _frame(0.3, [_ticker(symbol, 3.0, 1.0)], 1300)]
+
+    stream, _, _ = _run(mexc_server, frames, speed=1.0,
+                        until=lambda stream, server: stream.gaps >= 1 and stream.rest_fallbacks >= 2)
+
+    assert stream.gaps == 1 and stream.reconnects == 0
+
+
+def test_stale_stream_falls_back_to_rest(mexc_server, fast_stream, monkeypatch):
+    monkeypatch.setattr(config, 'STREAM_STALE_TIMEOUT', 0.2)
+    frames = [_frame(0.0, [_ticker(mexc_server.symbols[0], 2.0, 1.0)], 1000)]  # Дальше поток молчит
+
+    stream, _, _ = _run(mexc_server, frames,
+                        until=lambda stream, server: stream.reconnects >= 1 and stream.rest_fallbacks >= 3)
+
+    # Подключение + хотя бы один опрос REST, пока потока нет
+    assert stream.pushes >= 1
+    assert mexc_server.requests[TICKER] >= 3
+
+
+def test_only_changed_pairs_are_delivered(mexc_server, fast_stream):
+    rest = MEXCClient(transport=HedgedTransport([mexc_server.url])).get_all_tickers()
+    first, second, third = mexc_server.symbols[:3]
+    same = lambda symbol: _ticker(symbol, rest[symbol]['lastPrice'], rest[symbol]['fairPrice'])
+    frames = [
+        _frame(0.00, [same(first), _ticker(second, rest[second]['lastPrice'] * 1.1, rest[second]['fairPrice'])], 1000),
+        _frame(0.01, [same(first), _ticker(second, rest[second]['lastPrice'] * 1.1, rest[second]['fairPrice']),
+                      _ticker(third, rest[third]['lastPrice'], rest[third]['fairPrice'] * 0.9)], 1010),
+        _frame(0.02, [same(first)], 1020),
+    ]
+
+    stream, _, delivered = _run(mexc_server, frames, until=lambda stream, server: stream.pushes >= 3)
+
+    # Первая пачка - весь снимок REST при подключении, дальше - только пары с новой ценой
+    assert len(delivered[0]) == len(mexc_server.symbols)
+    assert delivered[1:] == [[second], [third]]
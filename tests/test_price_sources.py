@@ -0,0 +1,163 @@
+"""
+Цены других бирж на MockVenueServer: дедлайн скана и ответ, применённый в следующем, устаревшие цены,
+приведение символов (множитель в имени, VENUE_SYMBOL_OVERRIDES) и ошибки разбора ответа каждой биржи
+"""
+import time
+
+import numpy as np
+import pytest
+
+import config
+from event_log import events
+from mock_servers import MockVenueServer
+from price_sources import VENUE_SOURCES, VenuePrices
+from symbol_table import SymbolTable
+
+PRICES = {'BTC_USDT': 50000.0, 'ETH_USDT': 3000.0}
+
+
+@pytest.fixture
+def venue_server():
+    """Фабрика запущенных заглушек биржи; все останавливаются после теста"""
+    servers = []
+
+    def start(venue, prices=PRICES, **kwargs):
+        server = MockVenueServer(venue, prices, **kwargs)
+        server.start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def failures(monkeypatch):
+    """События request_failed вместо журнала"""
+    emitted = []
+    monkeypatch.setattr(events, 'emit',
+                        lambda event, **fields: emitted.append(fields) if event == 'request_failed' else None)
+    return emitted
+
+
+def _table(*names):
+    table = SymbolTable()
+    return table, table.indices(list(names or PRICES))
+
+
+def _venues(table, server, **kwargs):
+    return VenuePrices([VENUE_SOURCES[server.venue](table, server.url)], table, **kwargs)
+
+
+@pytest.mark.parametrize('venue', sorted(VENUE_SOURCES))
+def test_prices_are_aligned_to_mexc_indices(venue, venue_server):
+    table, idx = _table('ETH_USDT', 'BTC_USDT', 'SOL_USDT')
+    venues = _venues(table, venue_server(venue))
+    venues.submit()
+    venues.collect(time.perf_counter())
+
+    column = venues.columns(idx)[venue]
+    assert column[:2].tolist() == [3000.0, 50000.0]
+    assert np.isnan(column[2])  # Пары нет на бирже
+    venues.close()
+
+
+def test_late_answer_is_applied_in_next_scan(venue_server):
+    table, idx = _table()
+    server = venue_server('okx', latency=0.5)
+    venues = _venues(table, server, deadline=0.1)
+
+    started = time.perf_counter()
+    venues.submit()
+    venues.collect(started)
+    # Скан не ждёт медленную биржу дольше дедлайна
+    assert time.perf_counter() - started < 0.4
+    assert venues.late == 1
+    assert np.isnan(venues.columns(idx)['okx']).all()
+
+    time.sleep(0.6)
+    venues.submit()  # Запрос прошлого скана ещё числится в полёте - второй не уходит
+    venues.collect(time.perf_counter())
+    assert server.requests == 1
+    assert venues.columns(idx)['okx'].tolist() == [50000.0, 3000.0]
+    venues.close()
+
+
+def test_stale_prices_become_nan(venue_server, monkeypatch):
+    monkeypatch.setattr(config, 'VENUE_MAX_AGE', 5)
+    table, idx = _table()
+    venues = _venues(table, venue_server('binance'))
+    venues.submit()
+    venues.collect(time.perf_counter())
+    updated = venues.updated_at['binance']
+
+    assert venues.columns(idx, now=updated + 4)['binance'].tolist() == [50000.0, 3000.0]
+    assert np.isnan(venues.columns(idx, now=updated + 6)['binance']).all()
+    venues.close()
+
+
+@pytest.mark.parametrize('venue', sorted(VENUE_SOURCES))
+def test_multiplier_in_symbol_is_normalized(venue, venue_server):
+    # На MEXC - PEPE_USDT и 1000BONK_USDT; на бирже обе пары с множителем 1000 в имени
+    table, idx = _table('PEPE_USDT', '1000BONK_USDT')
+    venues = _venues(table, venue_server(venue, {'1000PEPE_USDT': 0.012, '1000BONK_USDT': 0.025}))
+    venues.submit()
+    venues.collect(time.perf_counter())
+
+    pepe, bonk = venues.columns(idx)[venue].tolist()
+    assert pepe == pytest.approx(0.000012)  # Цена за 1000 PEPE делится на множитель
+    assert bonk == pytest.approx(0.025)  # Такое имя есть на MEXC - как есть
+    venues.close()
+
+
+def test_symbol_overrides(venue_server, monkeypatch):
+    monkeypatch.setattr(config, 'VENUE_SYMBOL_OVERRIDES', {'okx': {'XBT-USDT-SWAP': 'BTC_USDT'}})
+    table, idx = _table()
+    venues = _venues(table, venue_server('okx', {'XBT_USDT': 51000.0, 'ETH_USDT': 3000.0}))
+    venues.submit()
+    venues.collect(time.perf_counter())
+
+    assert venues.columns(idx)['okx'].tolist() == [51000.0, 3000.0]
+    venues.close()
+
+
+BAD_BODIES = {
+    'binance': [b'{"code": -1121, "msg": "Invalid symbol."}', b'[{"price": "1"}]', b'not json'],
+    'bybit': [b'{"retCode": 10001, "retMsg": "params error"}', b'{"retCode": 0, "result": {}}', b'not json'],
+    'okx': [b'{"code": "50011", "msg": "Too Many Requests"}', b'{"code": "0", "data": [{"last": "1"}]}', b'not json'],
+}
+
+
+@pytest.mark.parametrize('venue,body', [(venue, body) for venue, bodies in BAD_BODIES.items() for body in bodies])
+def test_parse_error_keeps_previous_prices(venue, body, venue_server, failures):
+    table, idx = _table()
+    server = venue_server(venue)
+    venues = _venues(table, server)
+    venues.submit()
+    venues.collect(time.perf_counter())
+    updated = venues.updated_at[venue]
+
+    server._body = body
+    venues.submit()
+    venues.collect(time.perf_counter())
+
+    # Ошибка ответа - событие request_failed и счётчик, снимок прошлого скана не затирается
+    assert venues.failures == 1
+    assert len(failures) == 1 and failures[0]['endpoint'].startswith(venue)
+    assert venues.updated_at[venue] == updated
+    assert venues.columns(idx)[venue].tolist() == [50000.0, 3000.0]
+    venues.close()
+
+
+def test_unparsable_price_is_skipped(venue_server):
+    table, idx = _table()
+    server = venue_server('binance')
+    server._body = b'[{"symbol": "BTCUSDT", "price": "n/a"}, {"symbol": "ETHUSDT", "price": "3000"}]'
+    venues = _venues(table, server)
+    venues.submit()
+    venues.collect(time.perf_counter())
+
+    column = venues.columns(idx)['binance']
+    assert np.isnan(column[0]) and column[1] == 3000.0
+    venues.close()
@@ -0,0 +1,116 @@
+"""
+MonitorRuntime на заглушках MEXC и Bot API: запуск, остановка и отмена задач
+"""
+import asyncio
+import time
+
+import config
+from event_log import events
+from main import PriceSpreadMonitor
+from runtime import MonitorRuntime
+
+
+async def _wait_for(condition, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "условие не выполнилось за отведённое время"
+        await asyncio.sleep(0.05)
+
+
+def _assert_stopped(runtime: MonitorRuntime, monitor: PriceSpreadMonitor):
+    assert runtime.tasks == []
+    assert not monitor.is_running
+    assert not monitor.dispatcher.is_running
+    assert not events.is_running
+    if runtime.application is not None:
+        assert not runtime.application.running
+        assert not runtime.application.updater.running
+
+
+def test_cancel_stops_scan_dispatcher_and_bot(monitor_config, mexc_server, telegram_server):
+    mexc_server.set_prices({'SYM3_USDT': 25.0})
+    monitor = PriceSpreadMonitor()
+    runtime = MonitorRuntime(monitor, enable_bot=True)
+
+    async def scenario():
+        run = asyncio.create_task(runtime.run())
+        await _wait_for(lambda: monitor.scan_counter >= 2 and runtime.application is not None
+                        and runtime.application.running)
+        tasks = list(runtime.tasks)
+        # Алерт всплеска дошёл до заглушки Bot API через задачу отправки
+        await _wait_for(lambda: any('SYM3_USDT' in m.get('text', '') for m in telegram_server.messages))
+
+        run.cancel()
+        await asyncio.wait_for(asyncio.gather(run, return_exceptions=True), timeout=10)
+        return tasks
+
+    tasks = asyncio.run(scenario())
+    assert {task.get_name() for task in tasks} >= {'alert-sender', 'contract-refresh', 'scan-loop'}
+    assert all(task.done() for task in tasks)
+    _assert_stopped(runtime, monitor)
+
+
+def test_stop_request_shuts_down_cleanly(monitor_config):
+    monitor = PriceSpreadMonitor()
+    runtime = MonitorRuntime(monitor, enable_bot=True)
+
+    async def scenario():
+        run = asyncio.create_task(runtime.run())
+        await _wait_for(lambda: monitor.scan_counter >= 1 and runtime.application is not None
+                        and runtime.application.running)
+        tasks = list(runtime.tasks)
+        runtime.stop()
+        await asyncio.wait_for(run, timeout=10)
+        return tasks
+
+    tasks = asyncio.run(scenario())
+    assert all(task.done() for task in tasks)
+    _assert_stopped(runtime, monitor)
+
+
+def test_failing_task_does_not_leave_others_hanging(monitor_config, monkeypatch):
+    # Обновление списка контрактов падает сразу после запуска - остальные задачи должны быть отменены
+    monkeypatch.setattr(config, 'CONTRACT_REFRESH_INTERVAL', 0)
+    monitor = PriceSpreadMonitor()
+    fetch_contracts = monitor.fetch_contracts
+    calls = []
+
+    def broken_fetch():
+        calls.append(1)
+        if len(calls) > 1:  # Первый запрос - загрузка пар при старте
+            raise RuntimeError("detail недоступен")
+        return fetch_contracts()
+
+    monitor.fetch_contracts = broken_fetch
+    runtime = MonitorRuntime(monitor, enable_bot=True)
+
+    async def scenario():
+        run = asyncio.create_task(runtime.run())
+        await _wait_for(lambda: runtime.tasks)
+        tasks = list(runtime.tasks)
+        await asyncio.wait_for(run, timeout=10)
+        return tasks
+
+    tasks = asyncio.run(scenario())
+    failed = [task for task in tasks if not task.cancelled() and task.exception() is not None]
+    assert [task.get_name() for task in failed] == ['contract-refresh']
+    assert all(task.done() for task in tasks)
+    assert next(task for task in tasks if task.get_name() == 'scan-loop').cancelled()
+    _assert_stopped(runtime, monitor)
+
+
+def test_bot_start_failure_keeps_monitoring(monitor_config, monkeypatch):
+    # Bot API недоступен: мониторинг работает без команд и всё равно останавливается чисто
+    monkeypatch.setattr(config, 'TELEGRAM_API_URL', 'http://127.0.0.1:9')
+    monitor = PriceSpreadMonitor()
+    runtime = MonitorRuntime(monitor, enable_bot=True)
+
+    async def scenario():
+        run = asyncio.create_task(runtime.run())
+        await _wait_for(lambda: monitor.scan_counter >= 2, timeout=30)
+        runtime.stop()
+        await asyncio.wait_for(run, timeout=10)
+
+    asyncio.run(scenario())
+    assert runtime.tasks == []
+    assert not monitor.dispatcher.is_running
@@ -0,0 +1,58 @@
+"""
+Планировщик: упавший скан не останавливает цикл
+"""
+import asyncio
+
+from event_log import events
+from scheduler import FixedPacing, FixedRateScheduler
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+
+def _flaky_task(calls: list):
+    def task():
+        calls.append(len(calls))
+        if len(calls) % 2:
+            raise RuntimeError(f"скан #{len(calls)} упал")
+        return {'status': 200, 'max_spread': 0.0}
+    return task
+
+
+def test_failing_scan_is_logged_and_loop_continues(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(events, 'emit', lambda event, **fields: emitted.append((event, fields)))
+    clock = _Clock()
+    calls = []
+    scheduler = FixedRateScheduler(_flaky_task(calls), FixedPacing(1.0), clock=clock, sleep=clock.sleep)
+
+    scheduler.run(lambda: len(calls) < 6)
+
+    assert len(calls) == 6 and scheduler.ticks == 6
+    assert [fields['stage'] for event, fields in emitted if event == 'scan_error'] == ['scan'] * 3
+    assert 'RuntimeError' in emitted[0][1]['error']
+    assert clock.now == 6.0  # Сетка не сбилась
+
+
+def test_failing_async_scan_is_logged_and_loop_continues(monkeypatch):
+    emitted = []
+    monkeypatch.setattr(events, 'emit', lambda event, **fields: emitted.append((event, fields)))
+    calls = []
+    task = _flaky_task(calls)
+
+    async def scan():
+        return task()
+
+    scheduler = FixedRateScheduler(None, FixedPacing(0.001))
+    asyncio.run(scheduler.run_async(scan, lambda: len(calls) < 4))
+
+    assert len(calls) == 4
+    assert sum(event == 'scan_error' for event, _ in emitted) == 2
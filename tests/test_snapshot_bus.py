@@ -0,0 +1,166 @@
+"""
+Шина снимков: читатель копирует слот и отбрасывает снимок, переписанный во время чтения
+"""
+import os
+
+import numpy as np
+import pytest
+
+from snapshot_bus import SnapshotBus
+from symbol_table import SymbolTable
+from ticker_decoder import TickerSnapshot
+
+
+def _snapshot(table: SymbolTable, price: float) -> TickerSnapshot:
+    names = [f"SYM{i}_USDT" for i in range(8)]
+    idx = np.array([table.get_or_add(name) for name in names], dtype=np.int64)
+    last = np.full(len(names), price)
+    return TickerSnapshot(idx, last, last / 2, 0.0, np.zeros(len(names)))
+
+
+@pytest.fixture
+def bus_pair():
+    name = f"test_bus_{os.getpid()}"
+    bus = SnapshotBus.create(name, capacity=16, slots=2)
+    reader = SnapshotBus.attach(name)
+    yield bus, reader
+    reader.close()
+    bus.close()
+
+
+def test_snapshot_is_a_validated_copy(bus_pair):
+    bus, reader = bus_pair
+    table = SymbolTable()
+    bus.publish(_snapshot(table, 10.0), table.names)
+    frame = reader.latest()
+
+    snapshot = reader.to_snapshot(frame, SymbolTable())
+    bus.publish(_snapshot(table, 20.0), table.names)
+    bus.publish(_snapshot(table, 30.0), table.names)  # Кольцо из двух слотов обойдено - слот снимка переписан
+
+    assert snapshot is not None
+    assert np.all(snapshot.last == 10.0) and np.all(snapshot.fair == 5.0)
+
+
+def test_torn_frame_is_dropped(bus_pair):
+    bus, reader = bus_pair
+    table = SymbolTable()
+    bus.publish(_snapshot(table, 10.0), table.names)
+    frame = reader.latest()
+    bus.publish(_snapshot(table, 20.0), table.names)
+    bus.publish(_snapshot(table, 30.0), table.names)
+
+    assert reader.to_snapshot(frame, SymbolTable()) is None
+    assert reader.torn_reads == 1
+
+
+def test_monitor_skips_torn_frame(bus_pair, monitor_config):
+    from main import PriceSpreadMonitor
+
+    bus, reader = bus_pair
+    table = SymbolTable()
+    monitor = PriceSpreadMonitor()
+    monitor.bus = reader
+    analyzed = []
+    monitor.process_snapshot = analyzed.append
+
+    bus.publish(_snapshot(table, 10.0), table.names)
+    frame = reader.latest()
+    bus.publish(_snapshot(table, 20.0), table.names)
+    bus.publish(_snapshot(table, 30.0), table.names)
+    assert monitor.handle_frame(frame, 0) == frame.generation
+    assert analyzed == []
+
+    frame = reader.latest()
+    monitor.handle_frame(frame, frame.generation - 1)
+    assert len(analyzed) == 1 and np.all(analyzed[0].last == 30.0)
+    monitor.bus = None
+    monitor.journal.close()
+
+
+def test_torn_frame_with_foreign_indices_is_dropped(bus_pair):
+    from snapshot_bus import _SEQ
+
+    bus, reader = bus_pair
+    table = SymbolTable()
+    bus.publish(_snapshot(table, 10.0), table.names)
+    frame = reader.latest()
+    # Слот переписывается во время копирования: индексы за пределами известных имён, seq сдвинут
+    bus._idx[frame.slot, 0] = 10 ** 6
+    bus._slot_meta[frame.slot, _SEQ] += 2
+
+    assert reader.to_snapshot(frame, SymbolTable()) is None
+    assert reader.torn_reads == 1
+
+
+def _failing_bus_monitor(bus_pair, monkeypatch):
+    """Монитор на шине, у которого разбор первого снимка падает"""
+    from event_log import events
+    from main import PriceSpreadMonitor
+
+    bus, reader = bus_pair
+    monitor = PriceSpreadMonitor()
+    monitor.bus = reader
+    monitor.is_running = True
+    analyzed, errors = [], []
+    monkeypatch.setattr(events, 'emit', lambda event, **fields: errors.append(fields) if event == 'scan_error' else None)
+
+    def process(snapshot):
+        if not analyzed:
+            analyzed.append(None)
+            raise RuntimeError("разбор снимка упал")
+        analyzed.append(snapshot)
+
+    return monitor, process, analyzed, errors
+
+
+def test_bus_reader_survives_failing_frame(bus_pair, monitor_config, monkeypatch):
+    import threading
+    import time
+
+    bus, _ = bus_pair
+    table = SymbolTable()
+    monitor, process, analyzed, errors = _failing_bus_monitor(bus_pair, monkeypatch)
+    monitor.process_snapshot = process
+    reader = threading.Thread(target=monitor.consume_bus)
+    reader.start()
+    for price in (10.0, 20.0):
+        bus.publish(_snapshot(table, price), table.names)
+        time.sleep(0.2)
+    monitor.is_running = False
+    reader.join(timeout=5)
+
+    assert not reader.is_alive()
+    assert len(analyzed) == 2 and np.all(analyzed[1].last == 20.0)
+    assert errors and errors[0]['stage'] == 'bus'
+    monitor.bus = None
+    monitor.journal.close()
+
+
+def test_async_bus_reader_survives_failing_frame(bus_pair, monitor_config, monkeypatch):
+    import asyncio
+
+    bus, _ = bus_pair
+    table = SymbolTable()
+    monitor, process, analyzed, errors = _failing_bus_monitor(bus_pair, monkeypatch)
+
+    async def process_async(snapshot):
+        process(snapshot)
+
+    monitor.process_snapshot_async = process_async
+
+    async def scenario():
+        reader = asyncio.create_task(monitor.consume_bus_async())
+        for price in (10.0, 20.0):
+            await asyncio.sleep(0.1)
+            bus.publish(_snapshot(table, price), table.names)
+        await asyncio.sleep(0.2)
+        monitor.is_running = False
+        await asyncio.wait_for(reader, 5)
+
+    asyncio.run(scenario())
+
+    assert len(analyzed) == 2 and np.all(analyzed[1].last == 20.0)
+    assert errors and errors[0]['stage'] == 'bus'
+    monitor.bus = None
+    monitor.journal.close()
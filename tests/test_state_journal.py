@@ -0,0 +1,141 @@
+"""
+StateJournal: процесс-писатель убит посреди транзакции - после открытия WAL-базы
+cooldown и счётчики целы, от недописанного скана ничего не осталось
+"""
+import multiprocessing
+import os
+import signal
+import sqlite3
+import time
+
+import pytest
+
+from state_journal import StateJournal
+
+
+class _PausingConnection:
+    """Соединение, которое замирает после первой записи скана pause_scan (транзакция открыта)"""
+
+    def __init__(self, db, pause_scan, ready):
+        self._db = db
+        self._pause_scan = pause_scan
+        self._ready = ready
+
+    def executemany(self, sql, rows):
+        rows = list(rows)
+        result = self._db.executemany(sql, rows)
+        if sql.startswith("INSERT OR REPLACE INTO counters") and ('scan_counter', self._pause_scan) in rows:
+            self._ready.set()
+            time.sleep(60)  # Здесь процесс и убивают
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+
+def _scan_rows(scan):
+    alerts = [(f"SYM{scan}_{i}_USDT", 1000.0 + scan, 10.0 + i) for i in range(3)]
+    routed = [(f"chat:{i}", symbol, at, spread) for i, (symbol, at, spread) in enumerate(alerts)]
+    return alerts, routed
+
+
+def _paused_writer(path, committed, ready):
+    journal = StateJournal(path, compact_interval=1e9)
+    for scan in range(1, committed + 1):
+        alerts, routed = _scan_rows(scan)
+        journal.record_scan(scan, scan * 3, alerts, routed, now=0.0)
+    journal._db = _PausingConnection(journal._db, committed + 1, ready)
+    alerts, routed = _scan_rows(committed + 1)
+    journal.record_scan(committed + 1, (committed + 1) * 3, alerts, routed, now=0.0)
+
+
+def _busy_writer(path, ready):
+    journal = StateJournal(path, compact_interval=1e9)
+    scan = 0
+    while True:
+        scan += 1
+        alerts, routed = _scan_rows(scan)
+        journal.record_scan(scan, scan * 3, alerts, routed, now=0.0)
+        if scan == 20:
+            ready.set()
+
+
+def _kill(process):
+    os.kill(process.pid, signal.SIGKILL)
+    process.join(timeout=10)
+    assert process.exitcode == -signal.SIGKILL
+
+
+@pytest.fixture
+def context():
+    return multiprocessing.get_context('spawn')
+
+
+def test_kill_mid_transaction_keeps_committed_scans(tmp_path, context):
+    path = str(tmp_path / 'journal.db')
+    ready = context.Event()
+    writer = context.Process(target=_paused_writer, args=(path, 5, ready))
+    writer.start()
+    assert ready.wait(timeout=30), "писатель не дошёл до незавершённой транзакции"
+    _kill(writer)
+    # WAL с недописанной транзакцией остался на диске
+    assert os.path.exists(path + '-wal')
+
+    journal = StateJournal(path)
+    try:
+        state = journal.restore()
+    finally:
+        journal.close()
+    assert state.scan_counter == 5
+    assert state.total_alerts == 15
+    expected = sorted(row for scan in range(1, 6) for row in _scan_rows(scan)[0])
+    assert sorted(state.cooldowns) == expected
+    assert len(state.subscriber_cooldowns) == 15
+    # Ни одной записи скана 6 - транзакция откатилась целиком
+    assert not any(symbol.startswith('SYM6_') for symbol, _, _ in state.cooldowns)
+    assert not any(symbol.startswith('SYM6_') for _, symbol, _, _ in state.subscriber_cooldowns)
+
+
+def test_kill_during_continuous_writes_is_consistent(tmp_path, context):
+    path = str(tmp_path / 'journal.db')
+    ready = context.Event()
+    writer = context.Process(target=_busy_writer, args=(path, ready))
+    writer.start()
+    assert ready.wait(timeout=30)
+    time.sleep(0.05)
+    _kill(writer)
+
+    journal = StateJournal(path)
+    try:
+        state = journal.restore()
+        integrity = journal._db.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        journal.close()
+    assert integrity == 'ok'
+    scan = state.scan_counter
+    assert scan >= 20
+    # Счётчики и cooldown из одного и того же последнего скана: скан либо записан целиком, либо нет
+    assert state.total_alerts == scan * 3
+    assert len(state.cooldowns) == scan * 3
+    assert max(int(symbol.split('_')[0][3:]) for symbol, _, _ in state.cooldowns) == scan
+    assert len(state.subscriber_cooldowns) == scan * 3
+
+
+def test_forget_rolls_back_on_error(tmp_path):
+    journal = StateJournal(str(tmp_path / 'journal.db'))
+    try:
+        alerts, routed = _scan_rows(1)
+        journal.record_scan(1, 3, alerts, routed)
+        symbols = [symbol for symbol, _, _ in alerts]
+        # Ошибка на втором DELETE: первый (cooldowns) не должен остаться применённым
+        journal._db.execute("DROP TABLE subscriber_cooldowns")
+        with pytest.raises(sqlite3.Error):
+            journal.forget(symbols)
+        assert not journal._db.in_transaction
+        assert journal._db.execute("SELECT COUNT(*) FROM cooldowns").fetchone()[0] == 3
+        journal._db.executescript("CREATE TABLE subscriber_cooldowns (subscriber TEXT, symbol TEXT, "
+                                  "time REAL, spread REAL, PRIMARY KEY (subscriber, symbol))")
+        journal.forget(symbols)
+        assert journal.restore().cooldowns == []
+    finally:
+        journal.close()
@@ -0,0 +1,78 @@
+"""
+Потоковый разбор ответа: части анализируются по мере загрузки, подтверждение и рассылка - раз за скан
+"""
+import config
+from main import PriceSpreadMonitor
+
+
+class _RecordingConfirmer:
+    """Подтверждает всех кандидатов и запоминает каждый раунд"""
+
+    def __init__(self):
+        self.rounds = []
+
+    def confirm(self, alerts, min_spread):
+        self.rounds.append([a['symbol'] for a in alerts])
+        return alerts, []
+
+    def close(self):
+        pass
+
+
+class _RecordingLifecycle:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, subscription, alerts):
+        self.published.append((subscription.key, [a['symbol'] for a in alerts]))
+
+    def tick(self, current_spread):
+        pass
+
+
+def _streaming_monitor(monkeypatch):
+    monkeypatch.setattr(config, 'STREAM_PARSE', True)
+    monkeypatch.setattr(config, 'STREAM_PARSE_CHUNK_SIZE', 1024)  # Много частей на один ответ
+    monitor = PriceSpreadMonitor()
+    assert monitor.load_symbols()
+    monitor.confirmer = _RecordingConfirmer()
+    return monitor
+
+
+def test_streamed_scan_confirms_and_publishes_once(monitor_config, mexc_server, monkeypatch):
+    # Пары всплеска в начале и в конце списка - попадают в разные части ответа
+    burst = [mexc_server.symbols[1], mexc_server.symbols[-2]]
+    mexc_server.set_prices({symbol: 25.0 for symbol in burst})
+    monitor = _streaming_monitor(monkeypatch)
+    monitor.lifecycle = _RecordingLifecycle()
+    parts = []
+    analyze_part = monitor.analyze_part
+    monitor.analyze_part = lambda scan, part: (parts.append(len(part)), analyze_part(scan, part))
+
+    feedback = monitor.scan_all_pairs()
+
+    assert len(parts) > 1
+    assert sum(parts) == len(mexc_server.symbols)
+    assert len(monitor.confirmer.rounds) == 1
+    assert sorted(monitor.confirmer.rounds[0]) == sorted(burst)
+    assert len(monitor.lifecycle.published) == 1
+    assert sorted(monitor.lifecycle.published[0][1]) == sorted(burst)
+    assert feedback['max_spread'] >= 25.0
+    assert monitor.scan_counter == 1
+    monitor.stop()
+
+
+def test_failing_batch_does_not_abort_download(monitor_config, mexc_server, monkeypatch):
+    monitor = _streaming_monitor(monkeypatch)
+    calls = []
+
+    def on_batch(part):
+        calls.append(len(part))
+        if len(calls) == 1:
+            raise RuntimeError("анализ части упал")
+
+    snapshot = monitor.mexc.stream_price_snapshot(on_batch)
+
+    assert snapshot is not None and len(snapshot) == len(mexc_server.symbols)
+    assert len(calls) > 1
+    monitor.stop()
@@ -0,0 +1,102 @@
+"""
+Подписки: проверка порогов и cooldown, доступ к командам подписки
+"""
+import asyncio
+import math
+from types import SimpleNamespace
+
+import pytest
+
+import config
+from subscriptions import Subscription, SubscriptionRegistry
+from telegram_bot_commands import TelegramBotCommands
+
+
+@pytest.mark.parametrize('field', ['min_spread', 'cooldown'])
+@pytest.mark.parametrize('value', [math.nan, math.inf, -math.inf, 0.0, -5.0, 'nan'])
+def test_subscription_rejects_bad_values(field, value):
+    with pytest.raises(ValueError):
+        Subscription('-1', **{field: value})
+
+
+def test_load_skips_invalid_rows(tmp_path):
+    path = tmp_path / 'subscriptions.json'
+    path.write_text('[{"chat_id": "1", "min_spread": 10.0}, {"chat_id": "2", "min_spread": NaN},'
+                    ' {"chat_id": "3", "min_spread": -5.0}]')
+    registry = SubscriptionRegistry(str(path))
+    assert registry.load()
+    assert list(registry.subscriptions) == ['1:']
+    assert registry.min_threshold == 10.0
+
+
+class _Message:
+    def __init__(self):
+        self.replies = []
+        self.is_topic_message = False
+        self.message_thread_id = None
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def _update(chat_id: int, user_id: int):
+    message = _Message()
+    return SimpleNamespace(message=message, effective_message=message,
+                           effective_chat=SimpleNamespace(id=chat_id), effective_user=SimpleNamespace(id=user_id))
+
+
+def _run(command, update, *args):
+    asyncio.run(command(update, SimpleNamespace(args=list(args))))
+
+
+@pytest.fixture
+def commands(monkeypatch, tmp_path):
+    monkeypatch.setattr(config, 'TELEGRAM_ADMIN_IDS', {42})
+    monkeypatch.setattr(config, 'TELEGRAM_ALLOWED_CHATS', {-100})
+    registry = SubscriptionRegistry(str(tmp_path / 'subscriptions.json'))
+    return TelegramBotCommands(SimpleNamespace(subscriptions=registry))
+
+
+def test_subscribe_rejects_non_finite_and_low_thresholds(commands):
+    for arg in ('nan', 'inf', '-5', '0', str(config.SUBSCRIPTION_MIN_SPREAD / 2)):
+        update = _update(-100, 1)
+        _run(commands.cmd_subscribe, update, arg)
+        assert update.message.replies[-1].startswith("Использование")
+    assert len(commands.monitor.subscriptions) == 0
+
+    for arg in ('nan', '-1', '0'):
+        update = _update(-100, 1)
+        _run(commands.cmd_cooldown, update, arg)
+        assert update.message.replies[-1].startswith("Использование")
+    assert len(commands.monitor.subscriptions) == 0
+
+    _run(commands.cmd_subscribe, _update(-100, 1), '12.5', 'long')
+    assert commands.monitor.subscriptions.min_threshold == 12.5
+
+
+def test_subscription_commands_need_allowed_chat_or_admin(commands):
+    stranger = _update(-555, 1)
+    for command in (commands.cmd_subscribe, commands.cmd_cooldown, commands.cmd_allow, commands.cmd_deny,
+                    commands.cmd_unsubscribe):
+        _run(command, stranger, '20')
+        assert stranger.message.replies[-1].startswith("⛔")
+    assert len(commands.monitor.subscriptions) == 0
+
+    _run(commands.cmd_subscribe, _update(-555, 42), '20')  # Админ - из любого чата
+    assert commands.monitor.subscriptions.get(-555) is not None
+
+
+def test_route_rule_uses_symbol_buckets():
+    registry = SubscriptionRegistry('')
+    registry.upsert(Subscription('1'))  # Все пары, обе стороны
+    registry.upsert(Subscription('2', side='long', allow=['BTC_USDT']))
+    registry.upsert(Subscription('3', side='short', allow=['ETH_USDT']))
+    registry.upsert(Subscription('4', deny=['BTC_USDT']))
+    registry.upsert(Subscription('5', side='short'))
+
+    def chats(symbol):
+        return sorted(s.chat_id for s in registry.route_rule(symbol))
+
+    assert chats('BTC_USDT') == ['1', '2', '5']
+    assert chats('ETH_USDT') == ['1', '3', '4', '5']
+    assert chats('SOL_USDT') == ['1', '4', '5']
@@ -0,0 +1,328 @@
+"""
+Лёгкий разбор ответа /api/v1/contract/ticker
+Из сырых байтов берутся только symbol, lastPrice и fairPrice (и поля, нужные правилам алертов) -
+без json.loads и без словаря на каждый тикер. Результат - struct-of-arrays снимок
+TickerStreamDecoder разбирает ответ кусками по мере загрузки: готовые записи отдаются сразу
+"""
+import json
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from symbol_table import SymbolTable
+
+_SUCCESS_RE = re.compile(rb'"success"\s*:\s*true')
+_SYMBOL_RE = re.compile(rb'"symbol"\s*:\s*"([^"]+)"')
+_NUMBER = rb'\s*:\s*"?(-?[0-9][0-9.eE+-]*)'
+_LAST_RE = re.compile(rb'"lastPrice"' + _NUMBER)
+_FAIR_RE = re.compile(rb'"fairPrice"' + _NUMBER)
+_TIMESTAMP_RE = re.compile(rb'"timestamp"' + _NUMBER)
+
+
+def _field_pattern(name: str):
+    return re.compile(b'"' + name.encode() + b'"' + _NUMBER)
+
+
+class TickerSnapshot:
+    """
+    Снимок цен: idx - индексы в общей SymbolTable, last/fair - float64
+    exchange_ts - время тикера на бирже (ms, NaN если неизвестно)
+    columns - остальные поля тикера по имени MEXC (indexPrice, volume24, ...), NaN - поля нет
+    """
+    __slots__ = ('idx', 'last', 'fair', 'received_at', 'exchange_ts', 'columns')
+
+    def __init__(self, idx: np.ndarray, last: np.ndarray, fair: np.ndarray, received_at: float,
+                 exchange_ts: Optional[np.ndarray] = None, columns: Optional[Dict[str, np.ndarray]] = None):
+        self.idx = idx
+        self.last = last
+        self.fair = fair
+        self.received_at = received_at
+        self.exchange_ts = exchange_ts if exchange_ts is not None else np.full(len(idx), np.nan)
+        self.columns = columns if columns is not None else {}
+
+    def __len__(self) -> int:
+        return len(self.idx)
+
+    @classmethod
+    def concat(cls, parts: List['TickerSnapshot']) -> 'TickerSnapshot':
+        """Склеить части одного ответа (потоковый разбор) в полный снимок"""
+        if len(parts) == 1:
+            return parts[0]
+        names = dict.fromkeys(name for part in parts for name in part.columns)
+        return cls(
+            idx=np.concatenate([p.idx for p in parts]),
+            last=np.concatenate([p.last for p in parts]),
+            fair=np.concatenate([p.fair for p in parts]),
+            received_at=parts[-1].received_at,
+            exchange_ts=np.concatenate([p.exchange_ts for p in parts]),
+            columns={name: np.concatenate([p.column(name) for p in parts]) for name in names}
+        )
+
+    def select(self, mask: np.ndarray) -> 'TickerSnapshot':
+        """Снимок только из пар, отмеченных в mask (булев массив длины снимка)"""
+        return TickerSnapshot(self.idx[mask], self.last[mask], self.fair[mask], self.received_at,
+                              self.exchange_ts[mask], {name: values[mask] for name, values in self.columns.items()})
+
+    def column(self, name: str) -> np.ndarray:
+        """Поле тикера по имени MEXC; поля нет в снимке - NaN"""
+        if name == 'lastPrice':
+            return self.last
+        if name == 'fairPrice':
+            return self.fair
+        values = self.columns.get(name)
+        return values if values is not None else np.full(len(self.idx), np.nan)
+
+    @classmethod
+    def from_price_data(cls, price_data: List[Dict], table: SymbolTable,
+                        fields: Iterable[str] = ()) -> 'TickerSnapshot':
+        """
+        Собрать снимок из списка словарей (формат get_all_price_data / WebSocket push)
+        fields - дополнительные поля тикера, если они есть в словарях (иначе NaN)
+        """
+        count = len(price_data)
+        return cls(
+            idx=table.indices([d['symbol'] for d in price_data]),
+            last=np.fromiter((d['last_price'] for d in price_data), dtype=np.float64, count=count),
+            fair=np.fromiter((d['fair_price'] for d in price_data), dtype=np.float64, count=count),
+            received_at=time.time(),
+            exchange_ts=np.fromiter((d.get('timestamp') or np.nan for d in price_data), dtype=np.float64, count=count),
+            columns={name: np.fromiter((_number(d.get(name)) for d in price_data), dtype=np.float64, count=count)
+                     for name in fields}
+        )
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class TickerDecoder:
+    # Каждое поле - ещё один проход regex по ответу (~половина базового разбора); больше полей
+    # дешевле разобрать одним json.loads (benchmark.py rules: перелом около трёх полей)
+    MAX_REGEX_FIELDS = 3
+
+    def __init__(self, table: SymbolTable):
+        self.table = table
+        # Байтовые имена -> индекс: при неизменном наборе пар символы не декодируются в str
+        self._bytes_index: Dict[bytes, int] = {}
+        self._last_names: List[bytes] = []
+        self._last_indices = np.empty(0, dtype=np.int64)
+        self.fallbacks = 0  # Сколько раз формат не совпал и пришлось разбирать через json
+        self._patterns: Dict[str, re.Pattern] = {}
+        self.fields: tuple = ()
+
+    @property
+    def fields(self) -> tuple:
+        """Дополнительные поля тикера в снимке (правила алертов); каждое - ещё один проход regex"""
+        return self._fields
+
+    @fields.setter
+    def fields(self, names: Iterable[str]):
+        names = tuple(n for n in dict.fromkeys(names) if n not in ('lastPrice', 'fairPrice'))
+        for name in names:
+            if name not in self._patterns:
+                self._patterns[name] = _field_pattern(name)
+        self._fields = names  # Одно присваивание: поток скана видит либо старый, либо новый набор
+
+    def _indices(self, names: List[bytes]) -> np.ndarray:
+        if names == self._last_names:
+            return self._last_indices
+
+        indices = self._lookup(names)
+        self._last_names = names
+        self._last_indices = indices
+        return indices
+
+    @staticmethod
+    def _field(pattern, raw: bytes, starts: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Значения поля, разложенные по записям (NaN, если поля нет)
+        Поле относится к ближайшему symbol перед ним; None - раскладка не подходит
+        """
+        values = np.full(len(starts), np.nan)
+        positions = []
+        numbers = []
+        for match in pattern.finditer(raw):
+            positions.append(match.start())
+            numbers.append(match.group(1))
+        if not numbers:
+            return values
+
+        owner = np.searchsorted(starts, np.array(positions, dtype=np.int64), side='right') - 1
+        if owner[0] < 0 or np.any(owner[1:] == owner[:-1]):
+            # Поле раньше symbol или два значения на одну запись - порядок ключей не тот
+            return None
+        values[owner] = np.array(numbers).astype(np.float64)
+        return values
+
+    def _decode_json(self, raw: bytes, fallback: bool = True) -> Optional[TickerSnapshot]:
+        """Запасной путь: полный json.loads, если раскладка ответа неожиданная (или правилам нужно много полей)"""
+        if fallback:
+            self.fallbacks += 1
+        response = json.loads(raw)
+        if not response.get('success') or 'data' not in response:
+            return None
+
+        fields = self._fields
+        names, last, fair, timestamps = [], [], [], []
+        extra = {name: [] for name in fields}
+        for ticker in response['data']:
+            symbol = ticker.get('symbol')
+            if not symbol:
+                continue
+            try:
+                last_price = float(ticker.get('lastPrice'))
+                fair_price = float(ticker.get('fairPrice'))
+            except (ValueError, TypeError):
+                continue
+            names.append(symbol.encode())
+            last.append(last_price)
+            fair.append(fair_price)
+            timestamps.append(ticker.get('timestamp') or np.nan)
+            for name in fields:
+                extra[name].append(_number(ticker.get(name)))
+        return self._finish(names, np.array(last, dtype=np.float64), np.array(fair, dtype=np.float64),
+                            np.array(timestamps, dtype=np.float64),
+                            {name: np.array(values, dtype=np.float64) for name, values in extra.items()})
+
+    def _lookup(self, names: List[bytes]) -> np.ndarray:
+        """Индексы без кэша списка: куски потокового разбора каждый раз разные"""
+        lookup = self._bytes_index
+        indices = np.empty(len(names), dtype=np.int64)
+        for i, name in enumerate(names):
+            idx = lookup.get(name)
+            if idx is None:
+                idx = self.table.get_or_add(name.decode())
+                lookup[name] = idx
+            indices[i] = idx
+        return indices
+
+    def _finish(self, names: List[bytes], last: np.ndarray, fair: np.ndarray,
+                exchange_ts: np.ndarray, columns: Dict[str, np.ndarray], partial: bool = False) -> TickerSnapshot:
+        idx = self._lookup(names) if partial else self._indices(names)
+        # Те же правила, что в get_all_price_data: обе цены есть и положительны
+        valid = (last > 0) & (fair > 0)
+        if not valid.all():
+            idx, last, fair, exchange_ts = idx[valid], last[valid], fair[valid], exchange_ts[valid]
+            columns = {name: values[valid] for name, values in columns.items()}
+        return TickerSnapshot(idx=idx, last=last, fair=fair, received_at=time.time(), exchange_ts=exchange_ts,
+                              columns=columns)
+
+    def _decode_records(self, raw: bytes, partial: bool = False) -> Optional[TickerSnapshot]:
+        """
+        Записи тикеров в raw по regex (raw - весь ответ или кусок из целых записей)
+        None - раскладка не подходит для regex (поле раньше symbol, два значения на запись)
+        """
+        names = []
+        starts = []
+        for match in _SYMBOL_RE.finditer(raw):
+            starts.append(match.start())
+            names.append(match.group(1))
+        if not names:
+            return None
+
+        starts = np.array(starts, dtype=np.int64)
+        last = self._field(_LAST_RE, raw, starts)
+        fair = self._field(_FAIR_RE, raw, starts)
+        if last is None or fair is None:
+            return None
+        exchange_ts = self._field(_TIMESTAMP_RE, raw, starts)
+        if exchange_ts is None:
+            # Время тикера необязательно - только для метрики tick-to-alert
+            exchange_ts = np.full(len(starts), np.nan)
+        columns = {}
+        for name in self._fields:
+            values = self._field(self._patterns[name], raw, starts)
+            if values is None:
+                return None
+            columns[name] = values
+
+        # NaN (нет поля) отсеивается в _finish сравнением > 0
+        return self._finish(names, last, fair, exchange_ts, columns, partial)
+
+    def decode(self, raw: bytes) -> Optional[TickerSnapshot]:
+        """Разобрать сырой ответ тикеров. None - ответ без success/data"""
+        if not _SUCCESS_RE.search(raw):
+            return None
+        if len(self._fields) > self.MAX_REGEX_FIELDS:
+            return self._decode_json(raw, fallback=False)
+        snapshot = self._decode_records(raw)
+        return snapshot if snapshot is not None else self._decode_json(raw)
+
+    def stream(self) -> 'TickerStreamDecoder':
+        """Разбор одного ответа по кускам (feed на каждый кусок, в конце finish)"""
+        return TickerStreamDecoder(self)
+
+
+class TickerStreamDecoder:
+    """
+    Потоковый разбор ответа тикеров: записи отдаются, как только полностью пришли
+    Запись считается полной, когда после неё начался следующий "symbol" - ключ symbol первый в тикере
+    (на этом же держится и разбор целого ответа). Если раскладка другая, разбор переходит
+    на целый ответ в finish, а уже отданные пары из него исключаются
+    Поля правил разбираются regex даже сверх MAX_REGEX_FIELDS: проходы по кускам идут, пока качается ответ
+    """
+
+    def __init__(self, decoder: TickerDecoder):
+        self.decoder = decoder
+        self._chunks: List[bytes] = []  # Весь ответ - для запасного пути
+        self._pending = b''  # Хвост с неполной записью (пока нет success - всё принятое)
+        self._success = False
+        self._fallback = False
+        self._parts: List[TickerSnapshot] = []
+        self.size = 0  # Байт ответа после распаковки
+
+    def _emit(self, raw: bytes) -> Optional[TickerSnapshot]:
+        snapshot = self.decoder._decode_records(raw, partial=True)
+        if snapshot is None:
+            self._fallback = True
+            return None
+        self._parts.append(snapshot)
+        return snapshot if len(snapshot) else None
+
+    def feed(self, chunk: bytes) -> Optional[TickerSnapshot]:
+        """Очередной кусок ответа (уже распакованный); возвращает записи, ставшие полными"""
+        if not chunk:
+            return None
+        self._chunks.append(chunk)
+        self.size += len(chunk)
+        if self._fallback:
+            return None
+        pending = self._pending + chunk
+        if not self._success:
+            if not _SUCCESS_RE.search(pending):
+                self._pending = pending
+                return None
+            self._success = True
+
+        # Всё до начала последней записи - целые записи; её ключ может быть ещё не дочитан,
+        # тогда граница проходит по предыдущему symbol, а хвост ждёт следующего куска
+        last_start = pending.rfind(b'"symbol"')
+        first = _SYMBOL_RE.search(pending)
+        if first is None or last_start <= first.start():
+            self._pending = pending
+            return None
+        self._pending = pending[last_start:]
+        return self._emit(pending[:last_start])
+
+    def finish(self) -> Tuple[Optional[TickerSnapshot], Optional[TickerSnapshot]]:
+        """Конец ответа: (ещё не отданные записи, полный снимок); полный снимок None - ответ без success/data"""
+        if not self._fallback and self._success:
+            tail = self._emit(self._pending) if self._pending else None
+            self._pending = b''
+            if not self._fallback:
+                return tail, TickerSnapshot.concat(self._parts) if self._parts else None
+
+        snapshot = self.decoder.decode(b''.join(self._chunks))
+        if snapshot is None or not self._parts:
+            return snapshot, snapshot
+        # Пары, отданные до того, как раскладка разошлась, уже проанализированы
+        fresh = ~np.isin(snapshot.idx, np.concatenate([part.idx for part in self._parts]))
+        tail = TickerSnapshot(snapshot.idx[fresh], snapshot.last[fresh], snapshot.fair[fresh],
+                              snapshot.received_at, snapshot.exchange_ts[fresh],
+                              {name: values[fresh] for name, values in snapshot.columns.items()})
+        return tail, snapshot